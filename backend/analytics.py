@@ -0,0 +1,220 @@
+"""Columnar analytics over a slice of a profile's ledger.
+
+A ``LedgerFrame`` is built once from the raw transaction documents of a
+period: every field the reports group by is encoded as a small integer code
+column next to one int64 amount column (minor units of the profile
+currency). Every breakdown is then a single ``np.bincount`` over those
+columns instead of a Python loop with dict lookups per row.
+"""
+from enum import Enum
+from operator import itemgetter
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from money import currency_exponent, normalize_currency
+
+CATEGORY_TYPES = ["needs", "wants", "savings"]
+TRANSACTION_TYPES = ["income", "expense"]
+
+
+def plain(value) -> str:
+    if value is None:
+        return ""
+    return value.value if isinstance(value, Enum) else str(value)
+
+
+def encode(values: Sequence) -> (np.ndarray, List):
+    """Factorize values into (int32 codes, labels) in one pass over a dict"""
+    index = {value: code for code, value in enumerate(dict.fromkeys(values))}
+    codes = np.fromiter(map(index.__getitem__, values), dtype=np.int32, count=len(values))
+    # Enum members and their plain string values hash differently, merge them
+    labels: List[str] = []
+    label_codes: Dict[str, int] = {}
+    remap = np.empty(len(index), dtype=np.int32)
+    for raw, code in index.items():
+        remap[code] = label_codes.setdefault(plain(raw), len(labels))
+        if remap[code] == len(labels):
+            labels.append(plain(raw))
+    return remap[codes], labels
+
+
+def column(documents: List[dict], field: str, default=None) -> List:
+    """One field of every document; C-speed itemgetter unless a document lacks it"""
+    try:
+        return list(map(itemgetter(field), documents))
+    except KeyError:
+        return [doc.get(field, default) for doc in documents]
+
+
+def parse_days(dates: Sequence[str]) -> np.ndarray:
+    """YYYY-MM-DD[Thh:mm...] strings to datetime64[D]; unparseable dates become NaT"""
+    days = np.array(dates, dtype="U10")  # Truncates any time part
+    try:
+        return days.astype("datetime64[D]")
+    except ValueError:
+        parsed = np.empty(len(days), dtype="datetime64[D]")
+        for index, day in enumerate(days):
+            try:
+                parsed[index] = np.datetime64(str(day), "D")
+            except ValueError:
+                parsed[index] = np.datetime64("NaT")
+        return parsed
+
+
+class LedgerFrame:
+    def __init__(self, currency: str, columns: Dict[str, np.ndarray], labels: Dict[str, List]):
+        self.currency = normalize_currency(currency)
+        self.columns = columns
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.columns["amount_minor"])
+
+    @classmethod
+    def from_documents(cls, documents: List[dict], category_map: Dict[str, dict], currency: str, rate_table=None):
+        """Build a frame from transaction documents as stored in Mongo.
+
+        Amounts in other currencies are converted to ``currency`` at their
+        transaction date with ``rate_table`` in one vectorized pass. Rows
+        with an unparseable date are dropped.
+        """
+        currency = normalize_currency(currency)
+        factor = 10 ** currency_exponent(currency)
+
+        try:
+            amount_minor = np.fromiter(map(itemgetter("amount_minor"), documents), dtype=np.int64, count=len(documents))
+        except KeyError:
+            # Rows not yet migrated to minor units still carry a float amount
+            amount_minor = np.array(
+                [doc["amount_minor"] if "amount_minor" in doc else round(doc.get("amount", 0) * factor) for doc in documents],
+                dtype=np.int64
+            )
+        currency_codes, currency_labels = encode(column(documents, "currency"))
+        row_currencies = np.array([normalize_currency(label or currency) for label in currency_labels] or [currency])[currency_codes]
+        day = parse_days(column(documents, "date", ""))
+
+        foreign = row_currencies != currency
+        if foreign.any():
+            if rate_table is None:
+                raise ValueError("A rate table is required to convert foreign-currency rows")
+            valid = foreign & ~np.isnat(day)
+            amount_minor[valid] = rate_table.convert_minor_units(
+                amount_minor[valid], row_currencies[valid], day[valid], currency
+            )
+
+        category_type_codes = {name: code for code, name in enumerate(CATEGORY_TYPES)}
+        category_codes, category_ids = encode(column(documents, "category_id", ""))
+        # -1 marks categories that no longer exist
+        category_type_by_code = np.array([
+            category_type_codes.get(plain(category_map[category_id]["type"]), -1) if category_id in category_map else -1
+            for category_id in category_ids
+        ], dtype=np.int8)
+        member_codes, member_ids = encode(column(documents, "user_id", ""))
+        payment_codes, payment_modes = encode(column(documents, "payment_mode", ""))
+        type_codes, transaction_types = encode(column(documents, "transaction_type"))
+        is_expense = np.array([label == "expense" for label in transaction_types] or [False], dtype=bool)[type_codes]
+
+        keep = ~np.isnat(day)
+        columns = {
+            "amount_minor": amount_minor[keep],
+            "is_expense": is_expense[keep],
+            "category": category_codes[keep],
+            "category_type": category_type_by_code[category_codes[keep]],
+            "member": member_codes[keep],
+            "payment_mode": payment_codes[keep],
+            "day": day[keep],
+        }
+        labels = {
+            "category": category_ids,
+            "category_name": [category_map[cid]["name"] if cid in category_map else "Unknown" for cid in category_ids],
+            "member": member_ids,
+            "payment_mode": payment_modes,
+        }
+        return cls(currency, columns, labels)
+
+    def to_amount(self, minor):
+        return float(minor) / 10 ** currency_exponent(self.currency)
+
+    def _sum_by(self, codes: np.ndarray, size: int, mask: np.ndarray) -> np.ndarray:
+        return np.bincount(codes[mask], weights=self.columns["amount_minor"][mask], minlength=size)
+
+    def _labelled(self, sums: np.ndarray, labels: List) -> Dict[str, float]:
+        return {labels[index]: self.to_amount(total) for index, total in enumerate(sums) if total}
+
+    def totals(self) -> Dict[str, float]:
+        expense = self.columns["is_expense"]
+        amounts = self.columns["amount_minor"]
+        return {
+            "income": self.to_amount(amounts[~expense].sum()),
+            "expense": self.to_amount(amounts[expense].sum()),
+        }
+
+    def cfr_totals(self) -> Dict[str, float]:
+        """Expense totals per category type (needs, wants, savings)"""
+        category_type = self.columns["category_type"]
+        mask = self.columns["is_expense"] & (category_type >= 0)
+        sums = self._sum_by(category_type.astype(np.int32), len(CATEGORY_TYPES), mask)
+        return {name: self.to_amount(sums[index]) for index, name in enumerate(CATEGORY_TYPES)}
+
+    def by_category(self) -> Dict[str, float]:
+        """Expense totals per category name"""
+        sums = self._sum_by(self.columns["category"], len(self.labels["category"]), self.columns["is_expense"])
+        by_name: Dict[str, float] = {}
+        for index, total in enumerate(sums):
+            if total:
+                name = self.labels["category_name"][index]
+                by_name[name] = by_name.get(name, 0.0) + self.to_amount(total)
+        return by_name
+
+    def by_member(self) -> Dict[str, Dict[str, float]]:
+        """Income and expense totals per user id"""
+        size = len(self.labels["member"])
+        expense = self.columns["is_expense"]
+        expenses = self._sum_by(self.columns["member"], size, expense)
+        income = self._sum_by(self.columns["member"], size, ~expense)
+        return {
+            member_id: {"income": self.to_amount(income[index]), "expense": self.to_amount(expenses[index])}
+            for index, member_id in enumerate(self.labels["member"])
+        }
+
+    def by_payment_mode(self) -> Dict[str, float]:
+        """Expense totals per payment mode"""
+        sums = self._sum_by(self.columns["payment_mode"], len(self.labels["payment_mode"]), self.columns["is_expense"])
+        return self._labelled(sums, self.labels["payment_mode"])
+
+    def daily_expenses(self, start: Optional[np.datetime64] = None, end: Optional[np.datetime64] = None):
+        """(days, totals) for every day in [start, end), zero-filled"""
+        day = self.columns["day"]
+        if start is None:
+            start = day.min() if len(day) else np.datetime64("today", "D")
+        if end is None:
+            end = (day.max() + 1) if len(day) else start + 1
+        days = np.arange(start, end, dtype="datetime64[D]")
+        mask = self.columns["is_expense"] & (day >= start) & (day < end)
+        offsets = (day[mask] - start).astype(np.int64)
+        sums = np.bincount(offsets, weights=self.columns["amount_minor"][mask], minlength=len(days))
+        return days, sums
+
+    def by_day(self, start=None, end=None) -> Dict[str, float]:
+        days, sums = self.daily_expenses(start, end)
+        return {str(day): self.to_amount(total) for day, total in zip(days, sums)}
+
+    def rolling_daily_average(self, window: int = 7, start=None, end=None) -> Dict[str, float]:
+        """Trailing ``window``-day average of daily expenses"""
+        if window < 1:
+            raise ValueError("The rolling window must be at least one day")
+        days, sums = self.daily_expenses(start, end)
+        cumulative = np.concatenate([[0.0], np.cumsum(sums)])
+        indices = np.arange(1, len(sums) + 1)
+        lower = np.maximum(indices - window, 0)
+        averages = (cumulative[indices] - cumulative[lower]) / (indices - lower)
+        return {str(day): self.to_amount(average) for day, average in zip(days, averages)}
+
+    def expense_percentiles(self, percentiles: Sequence[float] = (50, 75, 90, 99)) -> Dict[str, float]:
+        """Percentiles of individual expense amounts"""
+        amounts = self.columns["amount_minor"][self.columns["is_expense"]]
+        if not len(amounts):
+            return {f"p{percentile:g}": 0.0 for percentile in percentiles}
+        values = np.percentile(amounts, percentiles)
+        return {f"p{percentile:g}": self.to_amount(value) for percentile, value in zip(percentiles, values)}
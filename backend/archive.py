@@ -0,0 +1,312 @@
+"""Cold storage for old transactions.
+
+Transactions dated before a profile's archive horizon move out of the hot
+``transactions`` collection into per-year ``transactions_archive_<year>``
+collections. Each archived month keeps a summary in ``monthly_summaries``:
+totals per (transaction type, category, member) in minor units of the
+profile currency, plus the days that had transactions. The profile records
+``archived_before`` (the first day that is still hot) and
+``archived_years``, which is all a read needs in order to decide whether it
+must look at the archive at all.
+
+Moving is idempotent: rows are copied before they are deleted, and a re-run
+after a crash skips rows already copied through the unique id index.
+Archived rows are read-only.
+"""
+import heapq
+import logging
+from datetime import date, datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+
+from money import normalize_currency
+from categories import catalogue_query
+from transaction_storage import active_store
+import budgets
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLLECTION_PREFIX = "transactions_archive_"
+DEFAULT_HORIZON_MONTHS = 24
+BATCH_SIZE = 1000
+
+# Fields a monthly summary can be grouped by
+SUMMARY_FIELDS = ("month", "transaction_type", "category_id", "user_id")
+
+# [start, end) bounds covering every date, for reads of a whole ledger
+FULL_RANGE = ("0001", "9999")
+
+
+def collection_name(year: int) -> str:
+    return f"{ARCHIVE_COLLECTION_PREFIX}{year}"
+
+
+def horizon_cutoff(today: date, horizon_months: int) -> str:
+    """First day of the month ``horizon_months`` before today's month"""
+    month_index = today.year * 12 + today.month - 1 - horizon_months
+    return f"{month_index // 12:04d}-{month_index % 12 + 1:02d}-01"
+
+
+def next_month(month: str) -> str:
+    year, month_number = int(month[:4]), int(month[5:7])
+    return f"{year + month_number // 12:04d}-{month_number % 12 + 1:02d}"
+
+
+def month_aligned(bound: str) -> bool:
+    """Whether a YYYY[-MM[-DD]] range bound falls on a month boundary"""
+    return len(bound) <= 7 or bound[8:10] == "01"
+
+
+def years_in_range(years: Sequence[int], start: str, end: str) -> List[int]:
+    """Archived years overlapping the [start, end) date-string range"""
+    return [year for year in years if f"{year:04d}" < end and f"{year + 1:04d}" > start]
+
+
+async def ensure_indexes(db, year: int):
+    archive = db[collection_name(year)]
+    await archive.create_index("id", unique=True)
+    await archive.create_index([("profile_id", ASCENDING), ("date", ASCENDING)])
+
+
+async def find_documents(reader, profile_id: str, archived_years: Sequence[int], start: str, end: str,
+                         projection: Optional[dict] = None, match: Optional[dict] = None,
+                         limit: Optional[int] = None) -> List[dict]:
+    """Transactions of a range from the hot collection and every archive year it overlaps.
+
+    ``match`` adds conditions to the range. Rows are de-duplicated by id (a
+    row is briefly in both while it is being moved) and returned newest
+    first; with ``limit`` only the newest ``limit`` of them.
+    """
+    query = {**(match or {}), "profile_id": profile_id, "date": {"$gte": start, "$lt": end}}
+    if projection is not None and any(value for field, value in projection.items() if field != "_id"):
+        projection = {**projection, "id": 1, "date": 1}
+
+    def newest(cursor):
+        return cursor.sort("date", DESCENDING).limit(limit) if limit else cursor
+
+    store = active_store()
+    documents = await newest(store.collection(reader).find(store.translate(query), projection)).to_list(length=None)
+    years = years_in_range(archived_years, start, end)
+    if not years:
+        documents.sort(key=lambda document: document["date"], reverse=True)
+        return documents
+
+    seen = {document["id"] for document in documents}
+    for year in years:
+        for document in await newest(reader[collection_name(year)].find(query, projection)).to_list(length=None):
+            if document["id"] not in seen:
+                seen.add(document["id"])
+                documents.append(document)
+    documents.sort(key=lambda document: document["date"], reverse=True)
+    return documents[:limit] if limit else documents
+
+
+async def iterate_documents(reader, profile_id: str, archived_years: Sequence[int], start: str, end: str,
+                            projection: Optional[dict] = None) -> AsyncIterator[dict]:
+    """Like ``find_documents`` but streamed oldest first, for exports of any size"""
+    query = {"profile_id": profile_id, "date": {"$gte": start, "$lt": end}}
+    store = active_store()
+    cursors = [
+        reader[collection_name(year)].find(query, projection).sort("date", ASCENDING)
+        for year in years_in_range(archived_years, start, end)
+    ]
+    cursors.append(store.collection(reader).find(store.translate(query), projection).sort("date", ASCENDING))
+
+    # k-way merge of the date-sorted cursors, holding one row per cursor
+    heads = []
+    for index, cursor in enumerate(cursors):
+        document = await anext(cursor, None)
+        if document is not None:
+            heads.append((document["date"], index, document))
+    heapq.heapify(heads)
+    seen = set()
+    while heads:
+        _, index, document = heapq.heappop(heads)
+        if document["id"] not in seen:
+            seen.add(document["id"])
+            yield document
+        following = await anext(cursors[index], None)
+        if following is not None:
+            heapq.heappush(heads, (following["date"], index, following))
+
+
+async def page_documents(reader, profile_id: str, archived_years: Sequence[int], after: Optional[Tuple[str, str]],
+                         limit: int, projection: Optional[dict] = None) -> List[dict]:
+    """Up to ``limit`` transactions after the ``(date, id)`` key ``after``, oldest first.
+
+    Reads the hot collection and the archive years from ``after`` on, each
+    through its (profile_id, date) index, for paging a whole ledger.
+    """
+    query = {"profile_id": profile_id}
+    start = FULL_RANGE[0]
+    if after is not None:
+        start, after_id = after
+        query["date"] = {"$gte": start}
+        query["$or"] = [{"date": {"$gt": start}}, {"id": {"$gt": after_id}}]
+    order = [("date", ASCENDING), ("id", ASCENDING)]
+    store = active_store()
+    cursors = [store.collection(reader).find(store.translate(query), projection)]
+    cursors += [
+        reader[collection_name(year)].find(query, projection)
+        for year in years_in_range(archived_years, start, FULL_RANGE[1])
+    ]
+    documents: Dict[str, dict] = {}
+    for cursor in cursors:
+        for document in await cursor.sort(order).limit(limit).to_list(length=None):
+            documents.setdefault(document["id"], document)
+    return sorted(documents.values(), key=lambda document: (document["date"], document["id"]))[:limit]
+
+
+async def summary_totals(reader, profile_id: str, currency: str, start: str, end: str, group_by: Sequence[str]):
+    """``{key: amount_minor}`` from the monthly summaries of [start, end).
+
+    Returns None when a summary is in another currency than ``currency``
+    (the profile currency changed since archiving); callers then read the
+    archive itself.
+    """
+    unknown = set(group_by) - set(SUMMARY_FIELDS)
+    if unknown:
+        raise ValueError(f"Monthly summaries cannot be grouped by {sorted(unknown)}")
+    summaries = await reader.monthly_summaries.find(
+        {"profile_id": profile_id, "month": {"$gte": start[:7], "$lt": end[:7]}}, {"_id": 0}
+    ).to_list(length=None)
+    totals: Dict[tuple, int] = {}
+    for summary in summaries:
+        if summary["currency"] != currency:
+            return None
+        for group in summary["groups"]:
+            values = {**group, "month": summary["month"]}
+            key = tuple(values.get(field) for field in group_by)
+            totals[key] = totals.get(key, 0) + group["amount_minor"]
+    return totals
+
+
+async def budget_totals(db, profile_id: str, currency: str, archived_before: Optional[str], rate_table):
+    """Budget counter totals ``{(month, key): amount}`` of the archived months.
+
+    Read from the monthly summaries; a month summarized in another currency
+    than ``currency`` is re-read from its archive rows instead.
+    """
+    if not archived_before:
+        return {}
+    categories = await db.categories.find(catalogue_query(profile_id), {"_id": 0, "id": 1, "type": 1}).to_list(length=None)
+    category_types = {category["id"]: category["type"] for category in categories}
+    totals: Dict[tuple, int] = {}
+
+    def add(transaction: dict, category_type: Optional[str]):
+        for month_key, amount in budgets.contributions(transaction, category_type, currency, rate_table).items():
+            totals[month_key] = totals.get(month_key, 0) + amount
+
+    async for summary in db.monthly_summaries.find({"profile_id": profile_id, "month": {"$lt": archived_before[:7]}}):
+        month = summary["month"]
+        if summary["currency"] == currency:
+            for group in summary["groups"]:
+                # One expense standing for the whole group, already in ``currency``
+                add(
+                    {**group, "currency": currency, "date": month},
+                    category_types.get(group["category_id"], group.get("category_type"))
+                )
+            continue
+        archived = db[collection_name(int(month[:4]))].find(
+            {"profile_id": profile_id, "date": {"$gte": month, "$lt": next_month(month)}, "transaction_type": "expense"}
+        )
+        async for transaction in archived:
+            add(transaction, category_types.get(transaction["category_id"]))
+    return totals
+
+
+async def refresh_summary(db, profile_id: str, month: str, currency: str, category_types: Dict[str, str], rate_table):
+    """Recompute one archived month's summary from the archive collection"""
+    totals: Dict[tuple, int] = {}
+    days = set()
+    count = 0
+    archive = db[collection_name(int(month[:4]))]
+    async for transaction in archive.find({"profile_id": profile_id, "date": {"$gte": month, "$lt": next_month(month)}}):
+        key = (transaction["transaction_type"], transaction["category_id"], transaction.get("user_id"))
+        totals[key] = totals.get(key, 0) + budgets.amount_in_currency(transaction, currency, rate_table)
+        if transaction["date"][8:10].isdigit():
+            days.add(int(transaction["date"][8:10]))
+        count += 1
+
+    await db.monthly_summaries.update_one(
+        {"profile_id": profile_id, "month": month},
+        {"$set": {
+            "currency": currency,
+            "groups": [
+                {
+                    "transaction_type": transaction_type,
+                    "category_id": category_id,
+                    "category_type": category_types.get(category_id),
+                    "user_id": user_id,
+                    "amount_minor": amount_minor
+                }
+                for (transaction_type, category_id, user_id), amount_minor in totals.items()
+            ],
+            "days": sorted(days),
+            "count": count,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }},
+        upsert=True
+    )
+
+
+async def archive_profile(db, profile: dict, cutoff: str, rate_table, batch_size: int = BATCH_SIZE, progress=None):
+    """Move a profile's transactions dated before ``cutoff`` into the archive"""
+    profile_id = profile["id"]
+    currency = normalize_currency(profile.get("currency"))
+    store = active_store()
+    hot = store.collection(db)
+    query = store.translate({"profile_id": profile_id, "date": {"$lt": cutoff}})
+    total = await hot.count_documents(query)
+    if not total:
+        return {"moved": 0, "months": 0}
+
+    # Readers fan out to every year listed here, so list the years first;
+    # rows being moved are then visible in one place or the other throughout
+    years = set()
+    async for row in hot.aggregate([
+        {"$match": query}, {"$group": {"_id": {"$substrBytes": ["$date", 0, 4]}}}
+    ]):
+        if row["_id"].isdigit():
+            years.add(int(row["_id"]))
+    for year in years - set(profile.get("archived_years", [])):
+        await ensure_indexes(db, year)
+    await db.profiles.update_one({"id": profile_id}, {"$addToSet": {"archived_years": {"$each": sorted(years)}}})
+
+    moved = 0
+    months = set()
+    while True:
+        batch = await hot.find(query).sort("date", ASCENDING).limit(batch_size).to_list(length=None)
+        if not batch:
+            break
+        by_year: Dict[int, List[dict]] = {}
+        for transaction in batch:
+            by_year.setdefault(int(transaction["date"][:4]), []).append(transaction)
+            months.add(transaction["date"][:7])
+        for year, transactions in by_year.items():
+            try:
+                await db[collection_name(year)].insert_many(transactions, ordered=False)
+            except BulkWriteError as error:
+                # Already copied by an earlier, interrupted run
+                if any(write_error["code"] != 11000 for write_error in error.details.get("writeErrors", [])):
+                    raise
+        await hot.delete_many({"_id": {"$in": [transaction["_id"] for transaction in batch]}})
+        moved += len(batch)
+        if progress:
+            await progress(moved, total, f"Archiving transactions before {cutoff}")
+
+    categories = await db.categories.find(catalogue_query(profile_id), {"_id": 0, "id": 1, "type": 1}).to_list(length=None)
+    category_types = {category["id"]: category["type"] for category in categories}
+    for month in sorted(months):
+        await refresh_summary(db, profile_id, month, currency, category_types, rate_table)
+
+    # Summaries are complete, reads of these months may use them from now on
+    await db.profiles.update_one(
+        {"id": profile_id, "$or": [{"archived_before": None}, {"archived_before": {"$lt": cutoff}}]},
+        {"$set": {"archived_before": cutoff}}
+    )
+    await db.profiles.update_one({"id": profile_id}, {"$inc": {"ledger_version": 1}})
+    logger.info("Archived %s transactions of profile %s before %s", moved, profile_id, cutoff)
+    return {"moved": moved, "months": len(months)}
@@ -0,0 +1,123 @@
+"""Append-only audit log of who changed what.
+
+Routes hand every write of a transaction, profile or family membership to
+``AuditLog.record`` with its actor; a background task drains the queue and
+stores the entries with batched ``insert_many`` calls, so a request only pays
+for an in-memory put. Entries are captured in the routes rather than from a
+change stream because only the request knows the acting user.
+"""
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Derived or internal fields whose changes are not worth recording
+IGNORED_FIELDS = {"_id", "ts", "search_tokens", "ledger_version", "seq", "updated_at"}
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 200
+FLUSH_INTERVAL_SECONDS = 1.0
+
+
+def flatten(document: Optional[dict], prefix: str = "") -> Dict[str, Any]:
+    """Nested dicts to dotted paths, so a diff names the exact field that changed"""
+    flat = {}
+    for key, value in (document or {}).items():
+        if not prefix and key in IGNORED_FIELDS:
+            continue
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            flat.update(flatten(value, f"{path}."))
+        else:
+            flat[path] = value
+    return flat
+
+
+def diff(before: Optional[dict], after: Optional[dict]) -> Dict[str, Dict[str, Any]]:
+    """``{path: {"from": old, "to": new}}`` for every field that differs"""
+    old, new = flatten(before), flatten(after)
+    return {
+        path: {"from": old.get(path), "to": new.get(path)}
+        for path in sorted(old.keys() | new.keys())
+        if old.get(path) != new.get(path)
+    }
+
+
+def action_for(before: Optional[dict], after: Optional[dict]) -> str:
+    if before is None:
+        return "created"
+    if after is None:
+        return "deleted"
+    return "updated"
+
+
+class AuditLog:
+    def __init__(self, db, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL_SECONDS,
+                 queue_size: int = QUEUE_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.written = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def record(self, profile_id: str, entity: str, entity_id: str, actor_id: Optional[str],
+                     before: Optional[dict], after: Optional[dict], action: Optional[str] = None):
+        """Queue one entry; only waits when the writer has fallen a full queue behind"""
+        changes = diff(before, after)
+        if not changes:
+            return
+        await self.queue.put({
+            "id": str(uuid.uuid4()),
+            "profile_id": profile_id,
+            "at": datetime.now(timezone.utc).isoformat(),
+            "entity": entity,
+            "entity_id": entity_id,
+            "action": action or action_for(before, after),
+            "actor_id": actor_id,
+            "changes": changes
+        })
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="audit-writer")
+
+    async def stop(self):
+        """Stop the writer and flush whatever is still queued"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.write(self.drain())
+
+    def drain(self, limit: Optional[int] = None) -> List[dict]:
+        entries = []
+        while not self.queue.empty() and (limit is None or len(entries) < limit):
+            entries.append(self.queue.get_nowait())
+        return entries
+
+    async def write(self, entries: List[dict]):
+        if not entries:
+            return
+        try:
+            await self.db.audit_log.insert_many(entries, ordered=False)
+            self.written += len(entries)
+        except Exception:
+            logger.exception("Writing %s audit entries failed", len(entries))
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            try:
+                # Give the batch a moment to fill up unless it already has
+                if self.queue.qsize() < self.batch_size - 1:
+                    await asyncio.sleep(self.flush_interval)
+            finally:
+                # Also runs when stopped mid-wait, so taken entries are not lost
+                batch += self.drain(self.batch_size - 1)
+                await asyncio.shield(self.write(batch))
@@ -0,0 +1,111 @@
+"""Compare the per-row dashboard loop with the vectorized LedgerFrame.
+
+    python benchmarks/analytics_benchmark.py --rows 100000
+
+Runs entirely in memory on a synthetic ledger, so it measures the Python
+side of the dashboard only (no Mongo round trips).
+"""
+import sys
+import random
+import time
+import uuid
+from pathlib import Path
+
+import typer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analytics import LedgerFrame  # noqa: E402
+
+CATEGORY_TYPES = ["needs", "wants", "savings"]
+PAYMENT_MODES = ["cash", "online", "credit_card", "debit_card"]
+
+
+def synthetic_ledger(rows: int, members: int = 4, categories: int = 21, seed: int = 7):
+    rng = random.Random(seed)
+    category_map = {}
+    for index in range(categories):
+        category_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        category_map[category_id] = {"id": category_id, "name": f"Category {index}", "type": CATEGORY_TYPES[index % 3]}
+    category_ids = list(category_map)
+    member_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(members)]
+
+    documents = []
+    for _ in range(rows):
+        amount_minor = rng.randint(100, 500000)
+        documents.append({
+            "amount_minor": amount_minor,
+            "amount": amount_minor / 100,
+            "currency": "INR",
+            "transaction_type": "expense" if rng.random() < 0.9 else "income",
+            "category_id": rng.choice(category_ids),
+            "user_id": rng.choice(member_ids),
+            "payment_mode": rng.choice(PAYMENT_MODES),
+            "date": f"2024-05-{rng.randint(1, 31):02d}",
+        })
+    return documents, category_map
+
+
+def legacy_loop(documents, category_map):
+    """The per-row loop get_dashboard_summary used before it moved to aggregation"""
+    total_income = sum(t["amount"] for t in documents if t["transaction_type"] == "income")
+    total_expenses = sum(t["amount"] for t in documents if t["transaction_type"] == "expense")
+    actual_spending = {"needs": 0, "wants": 0, "savings": 0}
+    category_wise_spending = {}
+    member_spending = {}
+    payment_mode_spending = {}
+    daily_spending = {}
+    for transaction in documents:
+        if transaction["transaction_type"] == "expense":
+            category = category_map.get(transaction["category_id"])
+            if category:
+                actual_spending[category["type"]] += transaction["amount"]
+                cat_name = category["name"]
+                category_wise_spending[cat_name] = category_wise_spending.get(cat_name, 0) + transaction["amount"]
+            member_spending[transaction["user_id"]] = member_spending.get(transaction["user_id"], 0) + transaction["amount"]
+            mode = transaction["payment_mode"]
+            payment_mode_spending[mode] = payment_mode_spending.get(mode, 0) + transaction["amount"]
+            day = transaction["date"][:10]
+            daily_spending[day] = daily_spending.get(day, 0) + transaction["amount"]
+    return total_income, total_expenses, actual_spending, category_wise_spending
+
+
+def vectorized(documents, category_map):
+    frame = LedgerFrame.from_documents(documents, category_map, "INR")
+    return frame, frame.totals(), frame.cfr_totals(), frame.by_category(), frame.by_member(), frame.by_payment_mode(), frame.by_day()
+
+
+def best_of(repeat, function, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(rows: int = 100000, repeat: int = 5):
+    documents, category_map = synthetic_ledger(rows)
+
+    legacy = best_of(repeat, legacy_loop, documents, category_map)
+    build = best_of(repeat, LedgerFrame.from_documents, documents, category_map, "INR")
+    frame = LedgerFrame.from_documents(documents, category_map, "INR")
+    group_bys = best_of(repeat, lambda: (
+        frame.totals(), frame.cfr_totals(), frame.by_category(), frame.by_member(),
+        frame.by_payment_mode(), frame.by_day()
+    ))
+
+    # Same answers, up to float summation order in the legacy loop
+    _, _, legacy_cfr, _ = legacy_loop(documents, category_map)
+    for category_type, amount in frame.cfr_totals().items():
+        assert abs(legacy_cfr[category_type] - amount) < 0.01 * max(1, amount) / 100, category_type
+
+    typer.echo(f"rows:                      {rows}")
+    typer.echo(f"legacy loop:               {legacy * 1000:8.1f} ms")
+    typer.echo(f"frame build (once):        {build * 1000:8.1f} ms")
+    typer.echo(f"frame group-bys (all six): {group_bys * 1000:8.1f} ms")
+    typer.echo(f"group-bys speedup:         {legacy / group_bys:8.1f}x")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,100 @@
+"""Compare JSON encoding and compression of a large ledger response.
+
+    python benchmarks/response_benchmark.py --rows 50000
+
+Builds the body of /api/transactions/filtered for a synthetic ledger and
+times FastAPI's default path (jsonable_encoder, then json.dumps) against
+orjson, then reports the bytes on the wire uncompressed, gzipped and (when
+the brotli package is installed) brotli-compressed.
+"""
+import sys
+import json
+import gzip
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import typer
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from compression import brotli  # noqa: E402
+from serialization import dumps  # noqa: E402
+
+CATEGORY_TYPES = ["needs", "wants", "savings"]
+PAYMENT_MODES = ["cash", "online", "credit_card", "debit_card"]
+DESCRIPTIONS = ["Groceries", "Rent", "Fuel", "Dinner out", "Electricity bill", "SIP", "Movie", "Pharmacy"]
+
+
+def synthetic_rows(rows: int, seed: int = 7):
+    """Rows shaped like ledger_row output"""
+    rng = random.Random(seed)
+    member_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(4)]
+    for _ in range(rows):
+        amount_minor = rng.randint(100, 500000)
+        index = rng.randrange(21)
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "profile_id": "profile",
+            "user_id": rng.choice(member_ids),
+            "amount": amount_minor / 100,
+            "currency": "INR",
+            "transaction_type": "expense" if rng.random() < 0.9 else "income",
+            "category_id": f"category-{index}",
+            "category_name": f"Category {index}",
+            "category_type": CATEGORY_TYPES[index % 3],
+            "payment_mode": rng.choice(PAYMENT_MODES),
+            "bank_app": None,
+            "person_name": None,
+            "description": rng.choice(DESCRIPTIONS),
+            "date": f"2024-05-{rng.randint(1, 31):02d}",
+            "created_at": datetime(2024, 5, rng.randint(1, 31), rng.randrange(24), tzinfo=timezone.utc),
+        }
+
+
+def standard_encode(content) -> bytes:
+    """What FastAPI's JSONResponse does with a returned dict"""
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def best_of(repeat, function, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main(rows: int = 50000, repeat: int = 5, gzip_level: int = 6, brotli_quality: int = 4):
+    transactions = list(synthetic_rows(rows))
+    content = {"transactions": transactions, "total_count": rows, "filter_applied": {"type": "month", "year": 2024, "month": 5}}
+
+    standard, standard_body = best_of(repeat, standard_encode, content)
+    fast, fast_body = best_of(repeat, dumps, content)
+    assert json.loads(standard_body)["transactions"][0]["amount"] == json.loads(fast_body)["transactions"][0]["amount"]
+
+    typer.echo(f"rows:                    {rows}")
+    typer.echo(f"jsonable_encoder + json: {standard * 1000:8.1f} ms")
+    typer.echo(f"orjson:                  {fast * 1000:8.1f} ms")
+    typer.echo(f"encode speedup:          {standard / fast:8.1f}x")
+
+    compressed_gzip, gzipped = best_of(repeat, lambda: gzip.compress(fast_body, compresslevel=gzip_level))
+    typer.echo(f"uncompressed:            {len(fast_body) / 1024:8.0f} KiB")
+    typer.echo(f"gzip -{gzip_level}:                 {len(gzipped) / 1024:8.0f} KiB "
+               f"({100 * (1 - len(gzipped) / len(fast_body)):.0f}% saved, {compressed_gzip * 1000:.1f} ms)")
+    if brotli is None:
+        typer.echo("brotli:                  not installed")
+        return
+    compressed_brotli, brotlied = best_of(repeat, lambda: brotli.compress(fast_body, quality=brotli_quality))
+    typer.echo(f"brotli q{brotli_quality}:               {len(brotlied) / 1024:8.0f} KiB "
+               f"({100 * (1 - len(brotlied) / len(fast_body)):.0f}% saved, {compressed_brotli * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    typer.run(main)
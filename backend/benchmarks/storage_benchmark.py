@@ -0,0 +1,117 @@
+"""Compare the documents and time-series transaction layouts on a live MongoDB.
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/storage_benchmark.py --rows 500000
+
+Seeds the same synthetic multi-profile ledger into both layouts in a scratch
+database (dropped afterwards), then times the month range scan behind
+/api/transactions/filtered and the grouped month aggregation behind
+/api/dashboard. Needs MongoDB 7.0+ for the time-series layout.
+"""
+import os
+import sys
+import asyncio
+import random
+import time
+import uuid
+from pathlib import Path
+
+import typer
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from transaction_storage import DOCUMENTS, TIMESERIES, get_store  # noqa: E402
+
+PAYMENT_MODES = ["cash", "online", "credit_card", "debit_card"]
+
+
+def random_ids(rng: random.Random, count: int):
+    return [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(count)]
+
+
+def synthetic_transactions(rows: int, profile_ids, seed: int = 7):
+    rng = random.Random(seed)
+    category_ids = random_ids(rng, 21)
+    for _ in range(rows):
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "profile_id": rng.choice(profile_ids),
+            "user_id": "member",
+            "amount_minor": rng.randint(100, 500000),
+            "currency": "INR",
+            "transaction_type": "expense" if rng.random() < 0.9 else "income",
+            "category_id": rng.choice(category_ids),
+            "payment_mode": rng.choice(PAYMENT_MODES),
+            "date": f"{rng.randint(2022, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        }
+
+
+async def seed(db, store, rows: int, profile_ids, batch_size: int = 5000):
+    await store.ensure_indexes(db)
+    batch = []
+    for transaction in synthetic_transactions(rows, profile_ids):
+        batch.append(transaction)
+        if len(batch) >= batch_size:
+            await store.collection(db).insert_many([store.prepare(document) for document in batch], ordered=False)
+            batch = []
+    if batch:
+        await store.collection(db).insert_many([store.prepare(document) for document in batch], ordered=False)
+
+
+async def best_of(repeat, make_call):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await make_call()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+async def run(url: str, rows: int, profiles: int, repeat: int):
+    client = AsyncIOMotorClient(url)
+    db = client[f"storage_benchmark_{uuid.uuid4().hex[:8]}"]
+    profile_ids = random_ids(random.Random(1), profiles)
+    match = {"profile_id": profile_ids[0], "date": {"$gte": "2024-05", "$lt": "2024-06"}}
+    try:
+        for name in (DOCUMENTS, TIMESERIES):
+            store = get_store(name)
+            started = time.perf_counter()
+            await seed(db, store, rows, profile_ids)
+            seeded = time.perf_counter() - started
+            collection = store.collection(db)
+            query = store.translate(match)
+
+            async def range_scan():
+                return await collection.find(query).sort("date", -1).to_list(length=None)
+
+            async def month_aggregate():
+                return await collection.aggregate([
+                    {"$match": query},
+                    {"$group": {
+                        "_id": {"transaction_type": "$transaction_type", "category_id": "$category_id"},
+                        "amount_minor": {"$sum": "$amount_minor"}
+                    }}
+                ]).to_list(length=None)
+
+            stats = await db.command("collStats", store.collection_name)
+            typer.echo(
+                f"{name:>10}: seed {seeded:7.1f} s   range scan {await best_of(repeat, range_scan):7.2f} ms   "
+                f"month aggregate {await best_of(repeat, month_aggregate):7.2f} ms   "
+                f"storage {stats.get('storageSize', 0) / 2 ** 20:7.1f} MiB"
+            )
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+def main(
+    rows: int = 200000,
+    profiles: int = 50,
+    repeat: int = 5,
+    url: str = typer.Option(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), help="MongoDB 7.0+"),
+):
+    asyncio.run(run(url, rows, profiles, repeat))
+
+
+if __name__ == "__main__":
+    typer.run(main)
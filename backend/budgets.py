@@ -0,0 +1,210 @@
+"""Running monthly spend counters and threshold alerts for budget limits.
+
+Counters live in ``budget_counters``, one document per (profile, month,
+key) where key is ``category:<category_id>`` or ``type:<needs|wants|savings>``,
+holding the month's expense total in minor units of the profile currency.
+Every transaction write turns into a handful of ``$inc`` updates, so checking
+a limit never rescans the month.
+
+Counters belong to the profile's ``budget_generation``. A rebuild writes a
+whole new generation next to the live one and swaps it in with one profile
+update, which only matches if no ledger write happened since the rebuild
+started; otherwise it discards its generation and starts over. Writers
+increment the generation they read from the profile after their write, so
+no increment lands between a delete and the inserts that replace it.
+
+Limits are stored in minor units of the profile currency and are converted
+(``convert_limits``) when the currency changes.
+"""
+import uuid
+import asyncio
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from money import minor_to_decimal, normalize_currency, to_minor_units
+from transaction_storage import active_store
+from categories import catalogue_query
+
+DEFAULT_ALERT_THRESHOLDS = [80.0, 100.0]
+REBUILD_ATTEMPTS = 5
+REBUILD_RETRY_SECONDS = 1.0
+
+
+def category_key(category_id: str) -> str:
+    return f"category:{category_id}"
+
+
+def type_key(category_type: str) -> str:
+    return f"type:{category_type}"
+
+
+def crossed_thresholds(before: int, after: int, limit: int, thresholds: List[float]) -> List[float]:
+    """Thresholds (percent of limit) that ``before -> after`` moved up through"""
+    if limit <= 0 or after <= before:
+        return []
+    # Integer cross-multiplication keeps the comparison exact
+    return [
+        threshold for threshold in thresholds
+        if before * 100 < threshold * limit <= after * 100
+    ]
+
+
+def amount_in_currency(transaction: dict, currency: str, rate_table) -> int:
+    """A stored transaction's amount in minor units of ``currency``"""
+    currency = normalize_currency(currency)
+    row_currency = normalize_currency(transaction.get("currency") or currency)
+    if "amount_minor" in transaction:
+        amount_minor = transaction["amount_minor"]
+    else:
+        amount_minor = to_minor_units(transaction.get("amount", 0), row_currency)
+    if row_currency == currency:
+        return amount_minor
+    return int(rate_table.convert_minor_units([amount_minor], [row_currency], [transaction["date"][:10]], currency)[0])
+
+
+def convert_amount_minor(amount_minor: int, from_currency: str, to_currency: str, rate_table, on_date: str) -> int:
+    """An amount in minor units of ``from_currency`` as minor units of ``to_currency``.
+
+    Converted at the rate of ``on_date`` when the rate table knows both
+    currencies, otherwise the same nominal amount with the new exponent.
+    """
+    from_currency, to_currency = normalize_currency(from_currency), normalize_currency(to_currency)
+    if from_currency == to_currency:
+        return amount_minor
+    if rate_table.supports(from_currency) and rate_table.supports(to_currency):
+        return int(rate_table.convert_minor_units([amount_minor], [from_currency], [on_date], to_currency)[0])
+    return to_minor_units(minor_to_decimal(amount_minor, from_currency), to_currency)
+
+
+def convert_limits(limits: dict, from_currency: str, to_currency: str, rate_table, on_date: str) -> dict:
+    """Stored budget limits re-expressed in ``to_currency``"""
+    def convert(amounts: dict) -> dict:
+        return {
+            key: convert_amount_minor(amount, from_currency, to_currency, rate_table, on_date)
+            for key, amount in amounts.items()
+        }
+    return {
+        **limits,
+        "category_limits_minor": convert(limits.get("category_limits_minor", {})),
+        "type_limits_minor": convert(limits.get("type_limits_minor", {}))
+    }
+
+
+def contributions(transaction: Optional[dict], category_type: Optional[str], currency: str, rate_table):
+    """``{(month, key): amount}`` an expense adds to the counters; income adds nothing"""
+    if not transaction or transaction.get("transaction_type") != "expense":
+        return {}
+    amount = amount_in_currency(transaction, currency, rate_table)
+    month = transaction["date"][:7]
+    result = {(month, category_key(transaction["category_id"])): amount}
+    if category_type:
+        result[(month, type_key(category_type))] = amount
+    return result
+
+
+async def apply_deltas(db, profile_id: str, deltas: Dict[Tuple[str, str], int],
+                       generation: Optional[str] = None) -> Dict[Tuple[str, str], Tuple[int, int]]:
+    """Apply ``{(month, key): delta}`` to a counter generation and return ``{(month, key): (before, after)}``"""
+    deltas = {month_key: delta for month_key, delta in deltas.items() if delta}
+
+    async def apply(month: str, key: str, delta: int):
+        counter = await db.budget_counters.find_one_and_update(
+            {"profile_id": profile_id, "generation": generation, "month": month, "key": key},
+            {"$inc": {"spent_minor": delta}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["spent_minor"] - delta, counter["spent_minor"]
+
+    results = await asyncio.gather(*(apply(month, key, delta) for (month, key), delta in deltas.items()))
+    return dict(zip(deltas, results))
+
+
+async def record_alerts(db, profile_id: str, month: str, key: str, thresholds: List[float],
+                        limit_minor: int, spent_minor: int, user_id: Optional[str], transaction_id: Optional[str]):
+    """Store one alert per (month, key, threshold); re-crossing does not repeat it"""
+    now = datetime.now(timezone.utc).isoformat()
+    for threshold in thresholds:
+        await db.budget_alerts.update_one(
+            {"profile_id": profile_id, "month": month, "key": key, "threshold": threshold},
+            {"$setOnInsert": {
+                "id": str(uuid.uuid4()),
+                "limit_minor": limit_minor,
+                "spent_minor": spent_minor,
+                "user_id": user_id,
+                "transaction_id": transaction_id,
+                "created_at": now
+            }},
+            upsert=True
+        )
+
+
+async def month_counters(db, profile_id: str, month: str, generation: Optional[str] = None) -> Dict[str, int]:
+    counters = await db.budget_counters.find(
+        {"profile_id": profile_id, "generation": generation, "month": month}, {"_id": 0, "key": 1, "spent_minor": 1}
+    ).to_list(length=None)
+    return {counter["key"]: counter["spent_minor"] for counter in counters}
+
+
+async def ledger_totals(db, profile_id: str, currency: str, rate_table, archived_before: Optional[str] = None,
+                        archived_totals: Optional[Dict[Tuple[str, str], int]] = None) -> Dict[Tuple[str, str], int]:
+    """``{(month, key): spent}`` of a profile's whole ledger.
+
+    Months before ``archived_before`` are no longer in the hot collection;
+    their totals come in as ``archived_totals`` (see ``archive.budget_totals``).
+    """
+    categories = await db.categories.find(catalogue_query(profile_id), {"_id": 0, "id": 1, "type": 1}).to_list(length=None)
+    category_types = {category["id"]: category["type"] for category in categories}
+
+    totals: Dict[Tuple[str, str], int] = dict(archived_totals or {})
+    query = {"profile_id": profile_id, "transaction_type": "expense"}
+    if archived_before:
+        query["date"] = {"$gte": archived_before}
+    store = active_store()
+    cursor = store.collection(db).find(
+        store.translate(query),
+        {"_id": 0, "amount_minor": 1, "amount": 1, "currency": 1, "transaction_type": 1, "category_id": 1, "date": 1}
+    )
+    async for transaction in cursor:
+        category_type = category_types.get(transaction["category_id"])
+        for month_key, amount in contributions(transaction, category_type, currency, rate_table).items():
+            totals[month_key] = totals.get(month_key, 0) + amount
+    return totals
+
+
+async def rebuild_counters(db, profile_id: str, currency: str, rate_table, archived_before: Optional[str] = None,
+                           archived_totals: Optional[Dict[Tuple[str, str], int]] = None,
+                           ledger_state: Optional[Callable[[], Awaitable[Optional[dict]]]] = None,
+                           attempts: int = REBUILD_ATTEMPTS) -> int:
+    """Recompute a profile's counters from its ledger (backfills and repairs).
+
+    ``ledger_state()`` returns the profile fields every ledger write changes,
+    or None while writes are still in flight; the new generation is swapped
+    in only if they are unchanged. Without it the swap is unconditional,
+    for offline migrations. Returns the number of counters.
+    """
+    for _ in range(attempts):
+        expected = await ledger_state() if ledger_state else {}
+        if expected is None:
+            await asyncio.sleep(REBUILD_RETRY_SECONDS)
+            continue
+
+        totals = await ledger_totals(db, profile_id, currency, rate_table, archived_before, archived_totals)
+        generation = str(uuid.uuid4())
+        documents = [
+            {"profile_id": profile_id, "generation": generation, "month": month, "key": key, "spent_minor": spent_minor}
+            for (month, key), spent_minor in totals.items() if spent_minor
+        ]
+        if documents:
+            await db.budget_counters.insert_many(documents)
+
+        swapped = await db.profiles.update_one({"id": profile_id, **expected}, {"$set": {"budget_generation": generation}})
+        if swapped.matched_count:
+            await db.budget_counters.delete_many({"profile_id": profile_id, "generation": {"$ne": generation}})
+            return len(documents)
+        # The ledger moved on while this generation was built
+        await db.budget_counters.delete_many({"profile_id": profile_id, "generation": generation})
+        await asyncio.sleep(REBUILD_RETRY_SECONDS)
+    raise RuntimeError(f"The ledger of profile {profile_id} kept changing while its budget counters were rebuilt")
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class StampedLRUCache:
+    """Bounded LRU cache whose entries are only valid for a matching stamp.
+
+    The stamp is whatever the cached value was derived from (for example a
+    profile's ledger version), so a hit never needs an explicit
+    invalidation: once the source changes, the stamp no longer matches.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, stamp: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != stamp:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, stamp: Hashable, value: Any):
+        self.entries[key] = (stamp, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        return {"size": len(self.entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,47 @@
+"""Per-profile category catalogues.
+
+Default categories are shared by everyone and have no ``profile_id``.
+Custom categories belong to the master profile that created them, so a
+family sees the defaults plus its own customs and nothing of other
+families. Both halves of the catalogue query use the (profile_id, type)
+index.
+
+Catalogues are cached per profile, stamped with the profile's
+``categories_version``, which creating a custom category bumps. Profiles are
+loaded on every request anyway, so a hit costs no query and another
+worker's change shows up on the next request.
+"""
+from typing import Dict, Optional
+
+from cache import StampedLRUCache
+
+
+def catalogue_query(profile_id: Optional[str]) -> dict:
+    """Defaults plus the customs of ``profile_id`` (just the defaults for None)"""
+    defaults = {"profile_id": None, "is_custom": {"$ne": True}}
+    if profile_id is None:
+        return defaults
+    return {"$or": [defaults, {"profile_id": profile_id}]}
+
+
+def in_catalogue(category: dict, profile_id: Optional[str]) -> bool:
+    """Whether ``catalogue_query(profile_id)`` matches a category"""
+    if category.get("profile_id") is None:
+        return not category.get("is_custom")
+    return category["profile_id"] == profile_id
+
+
+class CategoryCatalogue:
+    def __init__(self, maxsize: int = 1024):
+        self.cache = StampedLRUCache(maxsize)
+
+    async def category_map(self, repository, profile_id: str, version: int) -> Dict[str, dict]:
+        """``{category_id: category}`` for a profile; callers must not modify it"""
+        categories = self.cache.get(profile_id, version)
+        if categories is None:
+            categories = {category["id"]: category for category in await repository.list(profile_id)}
+            self.cache.set(profile_id, version, categories)
+        return categories
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,73 @@
+"""Clever Finance Rule (CFR) policies.
+
+A policy says how a household's income should split across needs, wants
+and savings, how far actual spending may drift before it is flagged, and
+which income the split is based on. ``compile_policy`` turns the stored
+policy into a ``CompiledPolicy`` once; evaluating it for a month is then a
+few multiplications over the per-type totals the database aggregated.
+"""
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+NEEDS, WANTS, SAVINGS = "needs", "wants", "savings"
+CATEGORY_TYPES = (NEEDS, WANTS, SAVINGS)
+
+PROFILE_THEN_ACTUAL = "profile_then_actual"
+PROFILE_ONLY = "profile"
+ACTUAL_ONLY = "actual"
+
+DEFAULT_RATIOS = {NEEDS: 50.0, WANTS: 30.0, SAVINGS: 20.0}
+DEFAULT_TOLERANCE = 5.0
+DEFAULT_FALLBACK_INCOME = 10000.0
+
+
+class CompiledPolicy:
+    def __init__(self, ratios: Tuple[Tuple[str, float], ...], tolerance: float, income_source: str,
+                 fallback_income: Optional[float]):
+        self.ratios = dict(ratios)
+        self.fractions = {category_type: Decimal(str(ratio)) / 100 for category_type, ratio in ratios}
+        self.tolerance = tolerance
+        self.income_source = income_source
+        self.fallback_income = Decimal(str(fallback_income)) if fallback_income else Decimal(0)
+
+    def monthly_income(self, profile_income: Optional[Decimal], actual_income: Decimal) -> Decimal:
+        candidates = {
+            PROFILE_THEN_ACTUAL: [profile_income, actual_income],
+            PROFILE_ONLY: [profile_income],
+            ACTUAL_ONLY: [actual_income],
+        }[self.income_source]
+        for income in candidates:
+            if income and income > 0:
+                return income
+        return self.fallback_income
+
+    def status(self, deviation_percentage: float) -> str:
+        if abs(deviation_percentage) <= self.tolerance:
+            return "within_tolerance"
+        return "overshoot" if deviation_percentage > 0 else "undershoot"
+
+    def evaluate(self, actual_by_type: Dict[str, Decimal], profile_income: Optional[Decimal],
+                 actual_income: Decimal) -> Tuple[Decimal, List[dict]]:
+        """(monthly income used, CFR analysis rows) for one month"""
+        income = self.monthly_income(profile_income, actual_income)
+        analysis = []
+        for category_type in CATEGORY_TYPES:
+            budgeted = income * self.fractions[category_type]
+            actual = actual_by_type.get(category_type, Decimal(0))
+            deviation_percentage = float((actual - budgeted) / budgeted * 100) if budgeted > 0 else 0.0
+            analysis.append({
+                "category_type": category_type,
+                "budgeted_amount": float(budgeted),
+                "actual_amount": float(actual),
+                "deviation_percentage": deviation_percentage,
+                "status": self.status(deviation_percentage),
+                "recommended_percentage": self.ratios[category_type]
+            })
+        return income, analysis
+
+
+@lru_cache(maxsize=256)
+def compile_policy(ratios: Tuple[Tuple[str, float], ...], tolerance: float, income_source: str,
+                   fallback_income: Optional[float]) -> CompiledPolicy:
+    return CompiledPolicy(ratios, tolerance, income_source, fallback_income)
@@ -0,0 +1,110 @@
+"""Response compression.
+
+``CompressionMiddleware`` compresses complete responses of at least
+``minimum_size`` bytes with brotli when the client accepts it and the
+``brotli`` package is installed, otherwise with gzip. Streaming responses
+(the CSV export, the Server-Sent Events feed) pass through untouched:
+compressing them would hold back chunks the client is waiting for.
+"""
+import gzip
+import logging
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip only without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SKIPPED_CONTENT_TYPES = (b"text/event-stream", b"image/", b"application/zip", b"application/gzip")
+
+
+def accepted_encodings(scope) -> set:
+    for name, value in scope.get("headers", ()):
+        if name == b"accept-encoding":
+            return {
+                part.split(";")[0].strip() for part in value.decode("latin-1").lower().split(",")
+                if not part.strip().endswith(";q=0")
+            }
+    return set()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.compressed = {"br": 0, "gzip": 0}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def choose_encoding(self, scope):
+        accepted = accepted_encodings(scope)
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        encoding = self.choose_encoding(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows what kind of response this is
+                start = message
+                return
+
+            headers = dict(start.get("headers", ()))
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or b"content-encoding" in headers
+                or headers.get(b"content-type", b"").startswith(SKIPPED_CONTENT_TYPES)
+            ):
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = self.compress(encoding, body)
+            self.compressed[encoding] += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(compressed)
+            start["headers"] = [
+                (name, value) for name, value in start.get("headers", ())
+                if name not in (b"content-length", b"vary")
+            ] + [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b"Accept-Encoding" if b"vary" not in headers else headers[b"vary"] + b", Accept-Encoding"),
+            ]
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
+
+    def stats(self):
+        return {
+            "compressed": dict(self.compressed),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "brotli_available": brotli is not None
+        }
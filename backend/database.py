@@ -0,0 +1,217 @@
+import os
+import time
+import logging
+from typing import Dict, Optional, Sequence
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pydantic import BaseModel
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from pymongo.read_preferences import (
+    Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+)
+
+from transaction_storage import active_store
+
+logger = logging.getLogger(__name__)
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# Lower bound MongoDB accepts for maxStalenessSeconds
+MIN_MAX_STALENESS_SECONDS = 90
+
+PROFILING_REPORT_TTL_SECONDS = 7 * 24 * 3600
+
+
+class MongoSettings(BaseModel):
+    url: str
+    db_name: str
+    max_pool_size: int = 50
+    min_pool_size: int = 0
+    max_idle_time_ms: Optional[int] = None
+    server_selection_timeout_ms: int = 5000
+    connect_timeout_ms: int = 5000
+    socket_timeout_ms: Optional[int] = 20000
+    analytics_read_preference: str = "primary"
+    analytics_max_staleness_seconds: Optional[int] = None
+    read_your_writes_seconds: int = 10
+    app_name: str = "budget-tracker"
+
+    @classmethod
+    def from_env(cls):
+        """Build settings from MONGO_* environment variables"""
+        def env_int(name, default):
+            value = os.environ.get(name)
+            return int(value) if value else default
+
+        # A socket timeout of 0 disables it, same as in the Mongo URI options
+        socket_timeout_ms = env_int('MONGO_SOCKET_TIMEOUT_MS', 20000) or None
+        # Secondaries may lag up to maxStalenessSeconds, so by default recent
+        # writers stay on the primary for that long
+        max_staleness = env_int('MONGO_ANALYTICS_MAX_STALENESS_SECONDS', None)
+
+        return cls(
+            url=os.environ['MONGO_URL'],
+            db_name=os.environ['DB_NAME'],
+            max_pool_size=env_int('MONGO_MAX_POOL_SIZE', 50),
+            min_pool_size=env_int('MONGO_MIN_POOL_SIZE', 0),
+            max_idle_time_ms=env_int('MONGO_MAX_IDLE_TIME_MS', None),
+            server_selection_timeout_ms=env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+            connect_timeout_ms=env_int('MONGO_CONNECT_TIMEOUT_MS', 5000),
+            socket_timeout_ms=socket_timeout_ms,
+            analytics_read_preference=os.environ.get('MONGO_ANALYTICS_READ_PREFERENCE', "primary"),
+            analytics_max_staleness_seconds=max_staleness,
+            read_your_writes_seconds=env_int('MONGO_READ_YOUR_WRITES_SECONDS', max_staleness or 10),
+        )
+
+    def analytics_read_preference_object(self):
+        if self.analytics_read_preference not in READ_PREFERENCES:
+            raise ValueError(f"Unknown read preference: {self.analytics_read_preference}")
+        mode = READ_PREFERENCES[self.analytics_read_preference]
+        if mode is Primary:
+            return Primary()
+        if self.analytics_max_staleness_seconds is None:
+            return mode()
+        if self.analytics_max_staleness_seconds < MIN_MAX_STALENESS_SECONDS:
+            raise ValueError(f"maxStalenessSeconds must be at least {MIN_MAX_STALENESS_SECONDS}")
+        return mode(max_staleness=self.analytics_max_staleness_seconds)
+
+
+class Database:
+    """Owns the Motor client for one worker process.
+
+    The client is created in the app lifespan rather than at import time so
+    that every worker forked by the launcher gets its own connection pool.
+    Collections are reachable as attributes (``db.users``), same as a Motor
+    database handle, and always go to the primary. Read-only analytic
+    queries should use ``reader(profile_id)`` instead.
+
+    ``event_listeners`` are pymongo monitoring listeners given to the client.
+    """
+
+    def __init__(self, settings: MongoSettings, event_listeners: Sequence = ()):
+        self.settings = settings
+        self.event_listeners = list(event_listeners)
+        self.client: Optional[AsyncIOMotorClient] = None
+        self._analytics_read_preference = settings.analytics_read_preference_object()
+        self._recent_writes: Dict[str, float] = {}
+
+    def connect(self):
+        if self.client is not None:
+            return self.client
+
+        options = {
+            "maxPoolSize": self.settings.max_pool_size,
+            "minPoolSize": self.settings.min_pool_size,
+            "serverSelectionTimeoutMS": self.settings.server_selection_timeout_ms,
+            "connectTimeoutMS": self.settings.connect_timeout_ms,
+            "socketTimeoutMS": self.settings.socket_timeout_ms,
+            "appname": self.settings.app_name,
+        }
+        if self.settings.max_idle_time_ms is not None:
+            options["maxIdleTimeMS"] = self.settings.max_idle_time_ms
+        if self.event_listeners:
+            options["event_listeners"] = self.event_listeners
+
+        self.client = AsyncIOMotorClient(self.settings.url, **options)
+        logger.info(
+            "Connected Mongo client (pid=%s, maxPoolSize=%s, minPoolSize=%s)",
+            os.getpid(), self.settings.max_pool_size, self.settings.min_pool_size
+        )
+        return self.client
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    @property
+    def primary(self):
+        if self.client is None:
+            raise RuntimeError("Database is not connected; it is opened in the app lifespan")
+        return self.client[self.settings.db_name]
+
+    @property
+    def analytics(self):
+        """Database handle for read-only analytic queries"""
+        if self.client is None:
+            raise RuntimeError("Database is not connected; it is opened in the app lifespan")
+        return self.client.get_database(
+            self.settings.db_name,
+            read_preference=self._analytics_read_preference
+        )
+
+    def note_write(self, profile_id: str):
+        """Record that a profile's data was just written from this worker"""
+        now = time.monotonic()
+        self._recent_writes[profile_id] = now
+        if len(self._recent_writes) > 10000:
+            cutoff = now - self.settings.read_your_writes_seconds
+            self._recent_writes = {
+                key: written_at for key, written_at in self._recent_writes.items() if written_at > cutoff
+            }
+
+    def reader(self, profile_id: Optional[str] = None):
+        """Database handle for analytic reads of one profile.
+
+        Reads go to the analytics read preference (usually secondaries),
+        except right after this worker wrote to the profile, when a lagging
+        secondary could hide the write; those reads stay on the primary.
+        """
+        if profile_id is not None:
+            written_at = self._recent_writes.get(profile_id)
+            if written_at is not None and time.monotonic() - written_at < self.settings.read_your_writes_seconds:
+                return self.primary
+        return self.analytics
+
+    def __getitem__(self, name):
+        return self.primary[name]
+
+    def __getattr__(self, name):
+        # Only reached for names that are not attributes of Database itself
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.primary[name]
+
+    async def ensure_indexes(self):
+        db = self.primary
+        await db.users.create_index("id", unique=True)
+        await db.users.create_index("email")
+        await db.profiles.create_index("id", unique=True)
+        await db.profiles.create_index("user_id")
+        await db.categories.create_index("id", unique=True)
+        await db.categories.create_index([("profile_id", ASCENDING), ("type", ASCENDING)])
+        await db.family_memberships.create_index(
+            [("master_profile_id", ASCENDING), ("email", ASCENDING)], unique=True
+        )
+        await db.family_memberships.create_index([("master_profile_id", ASCENDING), ("user_id", ASCENDING)])
+        await active_store().ensure_indexes(db)
+        # Counters are unique per generation; the index from before generations is in the way
+        try:
+            await db.budget_counters.drop_index("profile_id_1_month_1_key_1")
+        except OperationFailure:
+            pass
+        await db.budget_counters.create_index(
+            [("profile_id", ASCENDING), ("generation", ASCENDING), ("month", ASCENDING), ("key", ASCENDING)], unique=True
+        )
+        await db.budget_alerts.create_index(
+            [("profile_id", ASCENDING), ("month", ASCENDING), ("key", ASCENDING), ("threshold", ASCENDING)], unique=True
+        )
+        await db.recurring_transactions.create_index("id", unique=True)
+        await db.recurring_transactions.create_index("profile_id")
+        await db.recurring_transactions.create_index([("active", ASCENDING), ("next_run_date", ASCENDING)])
+        await db.jobs.create_index("id", unique=True)
+        await db.jobs.create_index([("status", ASCENDING), ("run_after", ASCENDING)])
+        await db.jobs.create_index([("profile_id", ASCENDING), ("created_at", ASCENDING)])
+        await db.audit_log.create_index([("profile_id", ASCENDING), ("at", DESCENDING), ("id", DESCENDING)])
+        await db.audit_log.create_index([("profile_id", ASCENDING), ("entity_id", ASCENDING), ("at", DESCENDING)])
+        await db.monthly_summaries.create_index([("profile_id", ASCENDING), ("month", ASCENDING)], unique=True)
+        await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+        await db.profiling_reports.create_index("created_at", expireAfterSeconds=PROFILING_REPORT_TTL_SECONDS)
+        await db.profiling_reports.create_index("id", unique=True)
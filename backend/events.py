@@ -0,0 +1,123 @@
+"""Per-profile live ledger events.
+
+Family members sharing a master profile subscribe to its channel (served as
+Server-Sent Events) and receive every transaction create/update/delete with
+the month's refreshed totals, instead of polling the ledger.
+
+The broker is in-process. With one API worker, or sticky routing, the write
+routes publish to it directly. With several workers set
+``EVENTS_SOURCE=changestream``: every worker then tails the transactions
+change stream (replica set required) and publishes what any worker wrote.
+"""
+import json
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+ROUTES = "routes"
+CHANGE_STREAM = "changestream"
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class EventBroker:
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self.dropped = 0
+
+    def subscribe(self, profile_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(profile_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, profile_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(profile_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[profile_id]
+
+    def has_subscribers(self, profile_id: str) -> bool:
+        return profile_id in self.subscribers
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self.subscribers.values())
+
+    def publish(self, profile_id: str, event: dict):
+        """Hand an event to every subscriber of a profile without waiting on any"""
+        for queue in self.subscribers.get(profile_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client must not hold back the others; it is told
+                # to resync from the REST endpoints instead
+                self.dropped += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+
+# on_change(action, before, after) with action "created", "updated" or "deleted"
+ChangeHandler = Callable[[str, Optional[dict], Optional[dict]], Awaitable[None]]
+
+ACTIONS = {"insert": "created", "update": "updated", "replace": "updated", "delete": "deleted"}
+
+
+class ChangeStreamFeed:
+    """Tails ``transactions`` and turns each change into (action, before, after).
+
+    Deletes only carry the pre-image when the collection has
+    ``changeStreamPreAndPostImages`` enabled; without it they are skipped.
+    """
+
+    def __init__(self, db, on_change: ChangeHandler, collection_name: str = "transactions", retry_seconds: float = 5):
+        self.db = db
+        self.collection_name = collection_name
+        self.on_change = on_change
+        self.retry_seconds = retry_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="transaction-change-stream")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        resume_token = None
+        while True:
+            try:
+                async with self.db[self.collection_name].watch(
+                    full_document="updateLookup",
+                    full_document_before_change="whenAvailable",
+                    resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        action = ACTIONS.get(change["operationType"])
+                        before = change.get("fullDocumentBeforeChange")
+                        after = change.get("fullDocument") if action != "deleted" else None
+                        if action is None or (before is None and after is None):
+                            continue
+                        try:
+                            await self.on_change(action, before, after)
+                        except Exception:
+                            logger.exception("Publishing a transaction change failed")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Transaction change stream failed, retrying in %ss", self.retry_seconds)
+                await asyncio.sleep(self.retry_seconds)
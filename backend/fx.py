@@ -0,0 +1,124 @@
+import os
+import csv
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from money import currency_exponent, normalize_currency
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+RATE_RELOAD_CHECK_SECONDS = 60
+
+
+class MissingRateError(ValueError):
+    pass
+
+
+class RateTable:
+    """Exchange rates indexed by currency and as-of date.
+
+    Each currency keeps two sorted NumPy arrays, the dates a rate was
+    published and the rate on that date, expressed as units of the currency
+    per one unit of ``base``. A lookup for a day uses the latest rate
+    published on or before it (or the earliest rate for days before the
+    table starts), so converting a whole column of dates is one
+    ``searchsorted`` per currency.
+    """
+
+    def __init__(self, base: str, series: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        self.base = normalize_currency(base)
+        self.series = series
+
+    @classmethod
+    def from_csv(cls, path, base: str = "USD"):
+        """Load a ``date,currency,rate`` file; lines starting with # are ignored"""
+        rows: Dict[str, list] = {}
+        with open(path, newline="") as rate_file:
+            lines = (line for line in rate_file if line.strip() and not line.startswith("#"))
+            for row in csv.DictReader(lines):
+                currency = normalize_currency(row["currency"])
+                rows.setdefault(currency, []).append((row["date"][:10], float(row["rate"])))
+
+        series = {}
+        for currency, points in rows.items():
+            points.sort()
+            dates = np.array([point[0] for point in points], dtype="datetime64[D]")
+            rates = np.array([point[1] for point in points], dtype=np.float64)
+            series[currency] = (dates, rates)
+        return cls(base, series)
+
+    def supports(self, currency: Optional[str]) -> bool:
+        currency = normalize_currency(currency)
+        return currency == self.base or currency in self.series
+
+    def rates_at(self, currency: str, dates: np.ndarray) -> np.ndarray:
+        """Units of ``currency`` per unit of base on each of ``dates``"""
+        currency = normalize_currency(currency)
+        if currency == self.base:
+            return np.ones(len(dates), dtype=np.float64)
+        if currency not in self.series:
+            raise MissingRateError(f"No exchange rate for {currency}")
+        rate_dates, rates = self.series[currency]
+        positions = np.searchsorted(rate_dates, dates, side="right") - 1
+        return rates[np.clip(positions, 0, len(rates) - 1)]
+
+    def convert_minor_units(self, amounts_minor, currencies, dates, target: str) -> np.ndarray:
+        """Convert minor-unit amounts in mixed currencies into ``target`` minor units.
+
+        ``amounts_minor``, ``currencies`` and ``dates`` are parallel
+        sequences; dates are YYYY-MM-DD strings or datetime64 values.
+        """
+        target = normalize_currency(target)
+        amounts_minor = np.asarray(amounts_minor, dtype=np.float64)
+        currencies = np.asarray([normalize_currency(currency) for currency in currencies])
+        dates = np.asarray(dates, dtype="datetime64[D]")
+
+        target_rates = self.rates_at(target, dates)
+        converted = np.empty(len(amounts_minor), dtype=np.float64)
+        for currency in np.unique(currencies):
+            mask = currencies == currency
+            source_rates = self.rates_at(currency, dates[mask])
+            major = amounts_minor[mask] / 10 ** currency_exponent(currency)
+            converted[mask] = major * (target_rates[mask] / source_rates)
+
+        return np.rint(converted * 10 ** currency_exponent(target)).astype(np.int64)
+
+
+_rate_table: Optional[RateTable] = None
+_rate_table_mtime: Optional[float] = None
+_rate_table_checked_at = 0.0
+
+
+def rates_file_path():
+    return Path(os.environ.get('FX_RATES_FILE', ROOT_DIR / 'fx_rates.csv'))
+
+
+def get_rate_table() -> RateTable:
+    """Cached rate table, reloaded when the rates file changes on disk"""
+    global _rate_table, _rate_table_mtime, _rate_table_checked_at
+
+    now = time.monotonic()
+    if _rate_table is not None and now - _rate_table_checked_at < RATE_RELOAD_CHECK_SECONDS:
+        return _rate_table
+    _rate_table_checked_at = now
+
+    path = rates_file_path()
+    base = os.environ.get('FX_BASE_CURRENCY', "USD")
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        if _rate_table is None:
+            logger.warning("Exchange rate file %s not found, only same-currency totals are available", path)
+            _rate_table = RateTable(base, {})
+        return _rate_table
+
+    if _rate_table is None or mtime != _rate_table_mtime:
+        _rate_table = RateTable.from_csv(path, base)
+        _rate_table_mtime = mtime
+        logger.info("Loaded exchange rates for %s currencies from %s", len(_rate_table.series), path)
+    return _rate_table
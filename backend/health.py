@@ -0,0 +1,154 @@
+"""Saturation signals of one worker, for probes and autoscaling.
+
+``PoolStats`` follows Motor's connection pools through pymongo's pool
+events (connections open, checked out, failed checkouts), ``LoopLagMonitor``
+measures how late the event loop wakes a sleeping task, and
+``InFlightMiddleware`` counts the requests being served. The app's
+``/api/admin/stats`` route reports them alongside its caches and queues.
+"""
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connections per server address, updated from the pool events"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.servers: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, address, field: str, delta: int = 1):
+        with self.lock:
+            server = self.servers.setdefault(
+                f"{address[0]}:{address[1]}",
+                {"open": 0, "checked_out": 0, "checkouts": 0, "checkout_failures": 0, "cleared": 0}
+            )
+            server[field] += delta
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count(event.address, "cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count(event.address, "open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count(event.address, "open", -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._count(event.address, "checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._count(event.address, "checked_out")
+        self._count(event.address, "checkouts")
+
+    def connection_checked_in(self, event):
+        self._count(event.address, "checked_out", -1)
+
+    def stats(self, max_pool_size: Optional[int] = None):
+        with self.lock:
+            servers = {address: dict(counts) for address, counts in self.servers.items()}
+        if max_pool_size:
+            for counts in servers.values():
+                counts["utilization"] = counts["checked_out"] / max_pool_size
+        return servers
+
+
+class LoopLagMonitor:
+    """Samples how much later than asked a ``sleep(interval)`` returns"""
+
+    def __init__(self, interval: float = 0.5, window: int = 120):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def stats(self):
+        samples = list(self.samples)
+        if not samples:
+            return {"last_ms": None, "max_ms": None, "avg_ms": None, "window_seconds": 0}
+        return {
+            "last_ms": samples[-1] * 1000,
+            "max_ms": max(samples) * 1000,
+            "avg_ms": sum(samples) / len(samples) * 1000,
+            "window_seconds": len(samples) * self.interval
+        }
+
+
+class RequestGauge:
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+        self.served = 0
+
+    def stats(self):
+        return {"in_flight": self.in_flight, "peak": self.peak, "served": self.served}
+
+
+class InFlightMiddleware:
+    """Counts HTTP requests on ``gauge`` while the app serves them"""
+
+    def __init__(self, app, gauge: RequestGauge):
+        self.app = app
+        self.gauge = gauge
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.gauge.in_flight += 1
+        self.gauge.peak = max(self.gauge.peak, self.gauge.in_flight)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.gauge.in_flight -= 1
+            self.gauge.served += 1
+
+
+def middleware_instance(app, middleware_class):
+    """The instance of ``middleware_class`` in a started app's middleware stack"""
+    node = getattr(app, "middleware_stack", None)
+    while node is not None:
+        if isinstance(node, middleware_class):
+            return node
+        node = getattr(node, "app", None)
+    return None
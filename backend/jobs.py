@@ -0,0 +1,192 @@
+"""Mongo-backed background jobs.
+
+A job is a document in the ``jobs`` collection naming a registered handler
+and its params. Workers (asyncio tasks in the app lifespan, or a separate
+``worker.py`` process) claim queued jobs with a lease, run the handler and
+store its result. A failed run is retried with exponential backoff until
+``max_attempts``; a worker that dies mid-run leaves an expired lease, and the
+job is picked up again by another worker.
+"""
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+DEFAULT_MAX_ATTEMPTS = 3
+LEASE_SECONDS = 60
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 300
+
+# progress(done, total, message) records progress and renews the job's lease
+Progress = Callable[[int, Optional[int], Optional[str]], Awaitable[None]]
+Handler = Callable[[dict, Progress], Awaitable[Any]]
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+def backoff_seconds(attempts: int) -> float:
+    return min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+
+
+class JobQueue:
+    def __init__(self, db, concurrency: int = 2, poll_interval: float = 5):
+        self.db = db
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, Handler] = {}
+        self.worker_id = str(uuid.uuid4())
+        self._tasks: List[asyncio.Task] = []
+        self._wake = asyncio.Event()
+
+    def register(self, job_type: str):
+        """Decorator registering the handler for ``job_type``"""
+        def decorator(handler: Handler):
+            self.handlers[job_type] = handler
+            return handler
+        return decorator
+
+    async def enqueue(self, job_type: str, params: Optional[dict] = None, profile_id: Optional[str] = None,
+                      user_id: Optional[str] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> dict:
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        now = utc_now().isoformat()
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "params": params or {},
+            "profile_id": profile_id,
+            "user_id": user_id,
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "run_after": now,
+            "lease_until": None,
+            "progress": {"done": 0, "total": None, "message": None},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None
+        }
+        await self.db.jobs.insert_one(job)
+        job.pop("_id", None)
+        self._wake.set()
+        return job
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"job-worker-{index}") for index in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        while True:
+            try:
+                job = await self.claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Claiming a job failed")
+                job = None
+            if job is not None:
+                await self.execute(job)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def claim(self) -> Optional[dict]:
+        """Take the oldest runnable job: queued and due, or running with an expired lease"""
+        now = utc_now()
+        job = await self.db.jobs.find_one_and_update(
+            {
+                "type": {"$in": list(self.handlers)},
+                "$or": [
+                    {"status": QUEUED, "run_after": {"$lte": now.isoformat()}},
+                    {"status": RUNNING, "lease_until": {"$lt": now.isoformat()}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "worker": self.worker_id,
+                    "lease_until": (now + timedelta(seconds=LEASE_SECONDS)).isoformat(),
+                    "updated_at": now.isoformat()
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_after", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+        if job is not None:
+            job.pop("_id", None)
+        return job
+
+    async def execute(self, job: dict):
+        async def progress(done: int, total: Optional[int] = None, message: Optional[str] = None):
+            now = utc_now()
+            await self.db.jobs.update_one(
+                {"id": job["id"], "worker": self.worker_id},
+                {"$set": {
+                    "progress": {"done": done, "total": total, "message": message},
+                    "lease_until": (now + timedelta(seconds=LEASE_SECONDS)).isoformat(),
+                    "updated_at": now.isoformat()
+                }}
+            )
+
+        try:
+            result = await self.handlers[job["type"]](job, progress)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back without spending an attempt
+            await self.db.jobs.update_one(
+                {"id": job["id"], "worker": self.worker_id},
+                {"$set": {"status": QUEUED, "lease_until": None}, "$inc": {"attempts": -1}}
+            )
+            raise
+        except Exception as error:
+            logger.exception("Job %s (%s) failed on attempt %s", job["id"], job["type"], job["attempts"])
+            await self.fail(job, error)
+            return
+
+        now = utc_now().isoformat()
+        await self.db.jobs.update_one(
+            {"id": job["id"], "worker": self.worker_id},
+            {"$set": {
+                "status": SUCCEEDED,
+                "result": result,
+                "error": None,
+                "lease_until": None,
+                "updated_at": now,
+                "finished_at": now
+            }}
+        )
+
+    async def fail(self, job: dict, error: Exception):
+        now = utc_now()
+        update = {"error": f"{type(error).__name__}: {error}", "lease_until": None, "updated_at": now.isoformat()}
+        if job["attempts"] < job["max_attempts"]:
+            update["status"] = QUEUED
+            update["run_after"] = (now + timedelta(seconds=backoff_seconds(job["attempts"]))).isoformat()
+        else:
+            update["status"] = FAILED
+            update["finished_at"] = now.isoformat()
+        await self.db.jobs.update_one({"id": job["id"], "worker": self.worker_id}, {"$set": update})
@@ -0,0 +1,329 @@
+"""Data migrations for the Budget Tracker database.
+
+    python migrate.py money
+    python migrate.py search-tokens
+    python migrate.py budget-counters
+    python migrate.py archive --horizon-months 24
+    python migrate.py transaction-storage --to timeseries
+    python migrate.py family-memberships
+    python migrate.py category-owners
+
+Every migration is idempotent and can be re-run after a partial failure.
+"""
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+import typer
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from database import Database, MongoSettings  # noqa: E402
+from money import currency_exponent, normalize_currency  # noqa: E402
+from search import build_search_tokens  # noqa: E402
+from fx import get_rate_table  # noqa: E402
+import budgets  # noqa: E402
+import archive  # noqa: E402
+import transaction_storage  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Transactions older than this many whole months are moved to the archive
+ARCHIVE_HORIZON_MONTHS = int(os.environ.get('ARCHIVE_HORIZON_MONTHS', archive.DEFAULT_HORIZON_MONTHS))
+
+cli = typer.Typer(help="Budget Tracker data migrations")
+
+
+async def migrate_money(db):
+    """Move float amounts to integer minor units.
+
+    ``transactions.amount`` becomes ``amount_minor`` plus the ``currency`` it
+    is expressed in, and ``profiles.monthly_income`` becomes
+    ``monthly_income_minor``. The conversion runs server side as an update
+    pipeline, one update per profile.
+    """
+    migrated_profiles = 0
+    migrated_transactions = 0
+
+    async for profile in db.profiles.find({}, {"id": 1, "currency": 1, "monthly_income": 1}):
+        currency = normalize_currency(profile.get("currency"))
+        factor = 10 ** currency_exponent(currency)
+
+        if "monthly_income" in profile:
+            await db.profiles.update_one({"id": profile["id"]}, [
+                {"$set": {"monthly_income_minor": {"$cond": [
+                    {"$eq": [{"$ifNull": ["$monthly_income", None]}, None]},
+                    None,
+                    {"$toLong": {"$round": [{"$multiply": ["$monthly_income", factor]}, 0]}}
+                ]}}},
+                {"$unset": "monthly_income"}
+            ])
+            migrated_profiles += 1
+
+        result = await db.transactions.update_many(
+            {"profile_id": profile["id"], "amount_minor": {"$exists": False}},
+            [
+                {"$set": {
+                    "amount_minor": {"$toLong": {"$round": [{"$multiply": ["$amount", factor]}, 0]}},
+                    "currency": currency
+                }},
+                {"$unset": "amount"}
+            ]
+        )
+        migrated_transactions += result.modified_count
+
+    logger.info("Migrated %s profiles and %s transactions to minor units", migrated_profiles, migrated_transactions)
+    return {"profiles": migrated_profiles, "transactions": migrated_transactions}
+
+
+async def migrate_search_tokens(db, batch_size=1000, profile_id=None, progress=None):
+    """Build ``search_tokens`` for transactions stored before search existed.
+
+    With ``profile_id`` every transaction of that profile is rebuilt instead.
+    ``progress(done, total, message)`` is awaited after every batch.
+    """
+    categories = await db.categories.find({}, {"id": 1, "name": 1}).to_list(length=None)
+    category_names = {category["id"]: category["name"] for category in categories}
+
+    query = {"profile_id": profile_id} if profile_id else {"search_tokens": {"$exists": False}}
+    transactions = transaction_storage.active_store().collection(db)
+    total = await transactions.count_documents(query) if progress else None
+    scanned = 0
+    updated = 0
+    batch = []
+
+    async def flush():
+        nonlocal updated, batch
+        updated += (await transactions.bulk_write(batch, ordered=False)).modified_count
+        batch = []
+        if progress:
+            await progress(scanned, total, "Building search tokens")
+
+    cursor = transactions.find(query, {"id": 1, "description": 1, "person_name": 1, "bank_app": 1, "category_id": 1})
+    async for transaction in cursor:
+        tokens = build_search_tokens(transaction, category_names.get(transaction.get("category_id")))
+        batch.append(UpdateOne({"_id": transaction["_id"]}, {"$set": {"search_tokens": tokens}}))
+        scanned += 1
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+
+    logger.info("Built search tokens for %s transactions", updated)
+    return {"transactions": updated}
+
+
+async def migrate_budget_counters(db):
+    """Rebuild every profile's running budget counters from its ledger"""
+    counters = 0
+    rate_table = get_rate_table()
+    async for profile in db.profiles.find({"is_master": {"$ne": False}}, {"id": 1, "currency": 1, "archived_before": 1}):
+        currency = normalize_currency(profile.get("currency"))
+        archived_totals = await archive.budget_totals(db, profile["id"], currency, profile.get("archived_before"), rate_table)
+        counters += await budgets.rebuild_counters(
+            db, profile["id"], currency, rate_table, profile.get("archived_before"), archived_totals
+        )
+    logger.info("Rebuilt %s budget counters", counters)
+    return {"counters": counters}
+
+
+async def migrate_archive(db, horizon_months=ARCHIVE_HORIZON_MONTHS):
+    """Move every master profile's transactions older than the horizon to the archive"""
+    cutoff = archive.horizon_cutoff(datetime.now(timezone.utc).date(), horizon_months)
+    rate_table = get_rate_table()
+    moved = 0
+    async for profile in db.profiles.find({"is_master": {"$ne": False}}):
+        moved += (await archive.archive_profile(db, profile, cutoff, rate_table))["moved"]
+    logger.info("Archived %s transactions dated before %s", moved, cutoff)
+    return {"cutoff": cutoff, "transactions": moved}
+
+
+async def migrate_transaction_storage(db, source_name, target_name, batch_size=1000):
+    """Copy every transaction from one storage layout into another.
+
+    Rows already in the target are skipped, so an interrupted copy can be
+    resumed. The source collection is left in place; switch
+    TRANSACTION_STORAGE once the copy is done, and drop it after checking.
+    """
+    source = transaction_storage.get_store(source_name)
+    target = transaction_storage.get_store(target_name)
+    if source.collection_name == target.collection_name:
+        raise ValueError("Source and target layouts are the same")
+    await target.ensure_indexes(db)
+
+    copied = 0
+    batch = []
+    async for transaction in source.collection(db).find({}, {"_id": 0, "ts": 0}):
+        batch.append(transaction)
+        if len(batch) >= batch_size:
+            copied += len(await target.insert_new(db, batch))
+            batch = []
+    if batch:
+        copied += len(await target.insert_new(db, batch))
+
+    logger.info("Copied %s transactions from %s to %s", copied, source.collection_name, target.collection_name)
+    return {"from": source.collection_name, "to": target.collection_name, "transactions": copied}
+
+
+async def migrate_family_memberships(db):
+    """Move the ``family_members`` array embedded in profiles to ``family_memberships``.
+
+    Each member becomes one document keyed by (master_profile_id, email);
+    the array is removed from the profile once its members are stored.
+    """
+    migrated_profiles = 0
+    memberships = 0
+    now = datetime.now(timezone.utc).isoformat()
+    async for profile in db.profiles.find({"family_members": {"$exists": True}}, {"id": 1, "family_members": 1}):
+        for member in profile["family_members"] or []:
+            result = await db.family_memberships.update_one(
+                {"master_profile_id": profile["id"], "email": member["email"]},
+                {"$setOnInsert": {"created_at": now, **member, "master_profile_id": profile["id"]}},
+                upsert=True
+            )
+            memberships += 1 if result.upserted_id is not None else 0
+        await db.profiles.update_one({"id": profile["id"]}, {"$unset": {"family_members": ""}})
+        migrated_profiles += 1
+
+    logger.info("Moved %s family memberships out of %s profiles", memberships, migrated_profiles)
+    return {"profiles": migrated_profiles, "memberships": memberships}
+
+
+async def repoint_category(db, profile_id, archive_collections, old_id, new_id):
+    """Move every reference a profile holds to one category over to another id"""
+    await transaction_storage.active_store().collection(db).update_many(
+        {"profile_id": profile_id, "category_id": old_id}, {"$set": {"category_id": new_id}}
+    )
+    for name in archive_collections:
+        await db[name].update_many({"profile_id": profile_id, "category_id": old_id}, {"$set": {"category_id": new_id}})
+    await db.monthly_summaries.update_many(
+        {"profile_id": profile_id, "groups.category_id": old_id},
+        {"$set": {"groups.$[group].category_id": new_id}},
+        array_filters=[{"group.category_id": old_id}]
+    )
+    await db.recurring_transactions.update_many(
+        {"profile_id": profile_id, "transaction.category_id": old_id}, {"$set": {"transaction.category_id": new_id}}
+    )
+    for collection in (db.budget_counters, db.budget_alerts):
+        await collection.update_many(
+            {"profile_id": profile_id, "key": budgets.category_key(old_id)},
+            {"$set": {"key": budgets.category_key(new_id)}}
+        )
+    limit_path = "budget_limits.category_limits_minor"
+    await db.profiles.update_one(
+        {"id": profile_id, f"{limit_path}.{old_id}": {"$exists": True}},
+        {"$rename": {f"{limit_path}.{old_id}": f"{limit_path}.{new_id}"}}
+    )
+    await db.profiles.update_one({"id": profile_id}, {"$inc": {"ledger_version": 1}})
+
+
+async def migrate_category_owners(db):
+    """Give custom categories created before categories had owners an owning profile.
+
+    A legacy custom category belongs to the profiles that use it (in
+    transactions, archived transactions, recurring templates or budget
+    limits). The first keeps it; every other profile gets its own copy under
+    a new id, with its references moved over. Unused legacy categories stay
+    unowned, which hides them from every catalogue.
+    """
+    hot = transaction_storage.active_store().collection(db)
+    archive_collections = [
+        name for name in await db.primary.list_collection_names() if name.startswith(archive.ARCHIVE_COLLECTION_PREFIX)
+    ]
+    owned = 0
+    copies = 0
+    unused = 0
+    async for category in db.categories.find({"is_custom": True, "profile_id": None}, {"_id": 0}):
+        category_id = category["id"]
+        owners = set(await hot.distinct("profile_id", {"category_id": category_id}))
+        for name in archive_collections:
+            owners.update(await db[name].distinct("profile_id", {"category_id": category_id}))
+        owners.update(await db.recurring_transactions.distinct("profile_id", {"transaction.category_id": category_id}))
+        owners.update(await db.profiles.distinct(
+            "id", {f"budget_limits.category_limits_minor.{category_id}": {"$exists": True}}
+        ))
+        if not owners:
+            unused += 1
+            continue
+
+        first, *others = sorted(owners)
+        await db.categories.update_one({"id": category_id}, {"$set": {"profile_id": first}})
+        owned += 1
+        for profile_id in others:
+            copy = {**category, "id": str(uuid.uuid4()), "profile_id": profile_id}
+            await db.categories.insert_one(copy)
+            await repoint_category(db, profile_id, archive_collections, category_id, copy["id"])
+            copies += 1
+        await db.profiles.update_many({"id": {"$in": sorted(owners)}}, {"$inc": {"categories_version": 1}})
+
+    logger.info("Assigned %s custom categories to owners, made %s copies, left %s unused", owned, copies, unused)
+    return {"owned": owned, "copies": copies, "unused": unused}
+
+
+def run_migration(migration):
+    async def runner():
+        db = Database(MongoSettings.from_env())
+        db.connect()
+        try:
+            return await migration(db)
+        finally:
+            db.close()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    result = asyncio.run(runner())
+    typer.echo(result)
+
+
+@cli.command()
+def money():
+    """Store transaction amounts and monthly income as integer minor units"""
+    run_migration(migrate_money)
+
+
+@cli.command("search-tokens")
+def search_tokens():
+    """Backfill the prefix search tokens of existing transactions"""
+    run_migration(migrate_search_tokens)
+
+
+@cli.command("budget-counters")
+def budget_counters():
+    """Rebuild the monthly spend counters behind budget alerts"""
+    run_migration(migrate_budget_counters)
+
+
+@cli.command("family-memberships")
+def family_memberships():
+    """Move family members embedded in profiles into their own collection"""
+    run_migration(migrate_family_memberships)
+
+
+@cli.command("category-owners")
+def category_owners():
+    """Assign custom categories created before categories had owners to their profiles"""
+    run_migration(migrate_category_owners)
+
+
+@cli.command("archive")
+def archive_transactions(horizon_months: int = typer.Option(ARCHIVE_HORIZON_MONTHS, min=1)):
+    """Move transactions older than the horizon into per-year archive collections"""
+    run_migration(lambda db: migrate_archive(db, horizon_months))
+
+
+@cli.command("transaction-storage")
+def transaction_storage_layout(
+    to: str = typer.Option(..., help="Target layout: documents or timeseries"),
+    source: str = typer.Option(transaction_storage.DOCUMENTS, "--from", help="Layout to copy from"),
+):
+    """Copy transactions into another storage layout"""
+    run_migration(lambda db: migrate_transaction_storage(db, source, to))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,38 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+
+# ISO 4217 minor unit exponents; every currency not listed here uses 2
+CURRENCY_EXPONENTS = {
+    "BIF": 0, "CLP": 0, "DJF": 0, "GNF": 0, "ISK": 0, "JPY": 0, "KMF": 0,
+    "KRW": 0, "PYG": 0, "RWF": 0, "UGX": 0, "UYI": 0, "VND": 0, "VUV": 0,
+    "XAF": 0, "XOF": 0, "XPF": 0,
+    "BHD": 3, "IQD": 3, "JOD": 3, "KWD": 3, "LYD": 3, "OMR": 3, "TND": 3,
+}
+
+DEFAULT_CURRENCY = "INR"
+
+
+def normalize_currency(currency: Optional[str]) -> str:
+    return (currency or DEFAULT_CURRENCY).strip().upper()
+
+
+def currency_exponent(currency: Optional[str]) -> int:
+    return CURRENCY_EXPONENTS.get(normalize_currency(currency), 2)
+
+
+def to_minor_units(amount, currency: Optional[str]) -> int:
+    """Convert an API amount (float, str or Decimal) to integer minor units"""
+    # Going through str keeps 100.1 as 100.1 instead of its binary expansion
+    value = Decimal(str(amount)).scaleb(currency_exponent(currency))
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def minor_to_decimal(minor: int, currency: Optional[str]) -> Decimal:
+    return Decimal(int(minor)).scaleb(-currency_exponent(currency))
+
+
+def from_minor_units(minor: Optional[int], currency: Optional[str]) -> Optional[float]:
+    """Convert stored minor units back to the float amount used by the API"""
+    if minor is None:
+        return None
+    return float(minor_to_decimal(minor, currency))
@@ -0,0 +1,242 @@
+"""On-demand profiling of single requests.
+
+``ProfilingMiddleware`` profiles a request when it carries the admin
+``X-Profile`` header or is picked by the sampling rate. The report holds a
+statistical profile of the request (pyinstrument when installed and
+chosen, cProfile otherwise), every Mongo command the request issued with
+its duration, and the time spent in pydantic, and is stored in
+``profiling_reports`` for the admin routes to return later.
+
+Mongo commands are attributed through ``CommandRecorder``, a pymongo
+command listener: the report being built lives in a context variable, which
+Motor carries into the executor threads that run the commands.
+
+cProfile sees everything that runs on the event loop while the request is
+in flight, including other requests, so only one request per worker is
+profiled with it at a time. pyinstrument follows the request's own task.
+"""
+import io
+import time
+import uuid
+import random
+import secrets
+import cProfile
+import logging
+import pstats
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import monitoring
+
+try:
+    import pyinstrument
+except ImportError:  # Optional; cProfile is always there
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+CPROFILE = "cprofile"
+PYINSTRUMENT = "pyinstrument"
+
+PROFILE_HEADER = b"x-profile"
+# Functions listed in a cProfile report, by cumulative time
+PROFILE_LINES = 40
+# Commands kept per report; a runaway request does not produce a huge document
+MAX_COMMANDS = 500
+
+current_report: ContextVar[Optional["Report"]] = ContextVar("current_profiling_report", default=None)
+
+
+class Report:
+    def __init__(self, method: str, path: str, query: str, trigger: str):
+        self.id = str(uuid.uuid4())
+        self.method = method
+        self.path = path
+        self.query = query
+        self.trigger = trigger
+        self.commands = []
+        self.commands_dropped = 0
+        self.pending = {}
+
+    def command_started(self, event):
+        self.pending[(event.connection_id, event.request_id)] = (
+            event.command_name, event.command.get(event.command_name), event.database_name
+        )
+
+    def command_finished(self, event, ok: bool):
+        started = self.pending.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        if len(self.commands) >= MAX_COMMANDS:
+            self.commands_dropped += 1
+            return
+        command_name, collection, database_name = started
+        self.commands.append({
+            "command": command_name,
+            "collection": collection if isinstance(collection, str) else None,
+            "database": database_name,
+            "duration_ms": event.duration_micros / 1000,
+            "ok": ok
+        })
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Adds the commands of a request being profiled to its report; no-op otherwise"""
+
+    def started(self, event):
+        report = current_report.get()
+        if report is not None:
+            report.command_started(event)
+
+    def succeeded(self, event):
+        report = current_report.get()
+        if report is not None:
+            report.command_finished(event, True)
+
+    def failed(self, event):
+        report = current_report.get()
+        if report is not None:
+            report.command_finished(event, False)
+
+
+def is_pydantic(location: str) -> bool:
+    return "pydantic" in location
+
+
+def cprofile_summary(profiler: cProfile.Profile):
+    """Top functions as text, and the seconds spent in pydantic's own code"""
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_LINES)
+    # Self time, so nested pydantic frames are not counted twice; the C
+    # validators show up as builtins named after pydantic_core
+    pydantic_seconds = sum(
+        entry[2] for (filename, _, function_name), entry in stats.stats.items()
+        if is_pydantic(filename) or is_pydantic(function_name)
+    )
+    return buffer.getvalue(), pydantic_seconds
+
+
+def pyinstrument_pydantic_seconds(frame) -> float:
+    if frame is None:
+        return 0.0
+    if is_pydantic(frame.file_path or ""):
+        return frame.time
+    return sum(pyinstrument_pydantic_seconds(child) for child in frame.children)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling opted-in or sampled requests.
+
+    ``token`` is the admin token the ``X-Profile`` header must carry; without
+    one only sampling can turn profiling on. Paths in ``skip_paths`` (such
+    as long-lived streams) are never profiled.
+    """
+
+    def __init__(self, app, db, token: Optional[str] = None, sample_rate: float = 0.0,
+                 profiler: str = CPROFILE, skip_paths=()):
+        if profiler not in (CPROFILE, PYINSTRUMENT):
+            raise ValueError(f"Unknown profiler: {profiler}")
+        if profiler == PYINSTRUMENT and pyinstrument is None:
+            logger.warning("pyinstrument is not installed, profiling with cProfile")
+            profiler = CPROFILE
+        self.app = app
+        self.db = db
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.profiler = profiler
+        self.skip_paths = set(skip_paths)
+        self.cprofile_busy = False
+        self.profiled = 0
+        self.skipped_busy = 0
+
+    def trigger(self, scope) -> Optional[str]:
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            return None
+        if self.token is not None:
+            for name, value in scope.get("headers", ()):
+                if name == PROFILE_HEADER:
+                    # Compared in constant time, it is a credential
+                    if secrets.compare_digest(value, self.token):
+                        return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        trigger = self.trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+        if self.profiler == CPROFILE and self.cprofile_busy:
+            self.skipped_busy += 1
+            await self.app(scope, receive, send)
+            return
+
+        report = Report(scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"), trigger)
+        status = None
+
+        async def recording_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", []).append((b"x-profile-id", report.id.encode()))
+            await send(message)
+
+        token = current_report.set(report)
+        started = time.perf_counter()
+        if self.profiler == CPROFILE:
+            self.cprofile_busy = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = pyinstrument.Profiler(async_mode="enabled")
+            profiler.start()
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            if self.profiler == CPROFILE:
+                profiler.disable()
+                self.cprofile_busy = False
+                profile_text, pydantic_seconds = cprofile_summary(profiler)
+            else:
+                session = profiler.stop()
+                profile_text = profiler.output_text()
+                pydantic_seconds = pyinstrument_pydantic_seconds(session.root_frame())
+            duration = time.perf_counter() - started
+            current_report.reset(token)
+            self.profiled += 1
+            await self.save(report, status, duration, profile_text, pydantic_seconds)
+
+    async def save(self, report: Report, status, duration: float, profile_text: str, pydantic_seconds: float):
+        document = {
+            "id": report.id,
+            "created_at": datetime.now(timezone.utc),
+            "method": report.method,
+            "path": report.path,
+            "query": report.query,
+            "trigger": report.trigger,
+            "status": status,
+            "duration_ms": duration * 1000,
+            "profiler": self.profiler,
+            "profile": profile_text,
+            "pydantic_ms": pydantic_seconds * 1000,
+            "mongo_ms": sum(command["duration_ms"] for command in report.commands),
+            "mongo_commands": report.commands,
+            "mongo_commands_dropped": report.commands_dropped
+        }
+        try:
+            await self.db.profiling_reports.insert_one(document)
+        except Exception:
+            logger.exception("Could not store profiling report %s", report.id)
+            return
+        logger.info("Profiled %s %s in %.1f ms (report %s)", report.method, report.path, duration * 1000, report.id)
+
+    def stats(self):
+        return {
+            "profiler": self.profiler,
+            "sample_rate": self.sample_rate,
+            "profiled": self.profiled,
+            "skipped_busy": self.skipped_busy
+        }
@@ -0,0 +1,254 @@
+"""Slow-query log for every Mongo command the app issues.
+
+``SlowQueryLog`` is a pymongo command listener. Commands that take longer
+than ``threshold_ms`` are logged with the shape of their filter (values
+replaced by 1, so no user data reaches the log) and the number of
+documents they returned, and aggregated per call site: the route that
+issued them (``CallSiteMiddleware`` keeps the request's scope in a context
+variable, which Motor carries into its executor threads), the command, the
+collection and the filter shape.
+
+With ``explain`` on, the first slow occurrence of each call site is also
+explained with ``executionStats``, which adds the documents and keys
+examined and the winning plan's stages (a ``COLLSCAN`` there is the
+unindexed query to fix). Explain runs the query again, so it stays off
+unless asked for.
+"""
+import json
+import asyncio
+import logging
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Where each command keeps its filter
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+MONITORED_COMMANDS = set(FILTER_FIELDS) | {"insert", "getMore"}
+EXPLAINABLE_COMMANDS = set(FILTER_FIELDS)
+# Fields of a command that explain does not accept
+NOT_EXPLAINABLE_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "writeConcern"}
+# Call sites kept; later new ones are only logged
+MAX_CALL_SITES = 1000
+
+current_scope: ContextVar[Optional[dict]] = ContextVar("current_request_scope", default=None)
+
+
+def shape(value: Any) -> Any:
+    """A filter with its values replaced by 1, keeping fields and operators"""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and all(isinstance(item, dict) for item in value):
+        return [shape(item) for item in value]
+    return 1
+
+
+def filter_shape(command_name: str, command: dict) -> Any:
+    field = FILTER_FIELDS.get(command_name)
+    if field is None:
+        return None
+    value = command.get(field)
+    if command_name == "aggregate":
+        # The pipeline's stages, with the shape of its leading $match
+        stages = [next(iter(stage), None) for stage in value or ()]
+        first_match = value[0]["$match"] if value and "$match" in value[0] else None
+        return {"match": shape(first_match) if first_match is not None else None, "stages": stages}
+    if command_name in ("update", "delete"):
+        statements = value or ()
+        return shape(statements[0].get("q", {})) if statements else None
+    return shape(value or {})
+
+
+def returned_count(command_name: str, reply: dict) -> Optional[int]:
+    cursor = reply.get("cursor")
+    if cursor is not None:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if command_name in ("count", "update", "delete", "insert"):
+        return reply.get("n")
+    if command_name == "distinct":
+        return len(reply.get("values", ()))
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") is not None else 0
+    return None
+
+
+def call_site() -> str:
+    scope = current_scope.get()
+    if scope is None:
+        return "background"
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        return f"{endpoint.__module__}.{endpoint.__qualname__}"
+    return f"{scope.get('method')} {scope.get('path')}"
+
+
+def find_key(document: Any, key: str) -> Any:
+    """First value stored under ``key`` anywhere in a nested explain output"""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        children = document.values()
+    elif isinstance(document, list):
+        children = document
+    else:
+        return None
+    for child in children:
+        found = find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def plan_stages(plan: Any) -> list:
+    """Stage names of a winning plan, outermost first"""
+    stages = []
+    while isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"] + (f" {plan['indexName']}" if "indexName" in plan else ""))
+        plan = plan.get("inputStage") or plan.get("queryPlan") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+
+def explain_summary(explain: dict) -> Dict[str, Any]:
+    stats = find_key(explain, "executionStats") or {}
+    return {
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+        "plan": plan_stages(find_key(explain, "winningPlan")),
+    }
+
+
+class CallSiteMiddleware:
+    """Keeps the request's scope in ``current_scope`` for the query log.
+
+    The router adds the matched endpoint to the same scope dict, so by the
+    time the route queries Mongo the call site is known.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = 100, explain: bool = False):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.lock = threading.Lock()
+        self.pending: Dict[tuple, tuple] = {}
+        self.call_sites: Dict[tuple, Dict[str, Any]] = {}
+        self.client = None
+        self.loop = None
+
+    def start(self, client):
+        """Lets first occurrences be explained on ``client`` from the running loop"""
+        self.client = client
+        self.loop = asyncio.get_running_loop()
+
+    def started(self, event):
+        if event.command_name in MONITORED_COMMANDS:
+            with self.lock:
+                self.pending[(event.connection_id, event.request_id)] = (event.command, call_site())
+
+    def succeeded(self, event):
+        self.finished(event, event.reply)
+
+    def failed(self, event):
+        self.finished(event, None)
+
+    def finished(self, event, reply: Optional[dict]):
+        with self.lock:
+            started = self.pending.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+
+        command, site = started
+        command_name = event.command_name
+        collection = command.get(command_name) if command_name != "getMore" else command.get("collection")
+        shape_of_filter = filter_shape(command_name, command)
+        returned = returned_count(command_name, reply) if reply is not None else None
+        logger.warning(
+            "Slow %s on %s took %.1f ms at %s, returned %s, filter %s",
+            command_name, collection, duration_ms, site, returned, json.dumps(shape_of_filter, default=str)
+        )
+
+        key = (site, command_name, collection, json.dumps(shape_of_filter, sort_keys=True, default=str))
+        with self.lock:
+            entry = self.call_sites.get(key)
+            first = entry is None
+            if first:
+                if len(self.call_sites) >= MAX_CALL_SITES:
+                    return
+                entry = self.call_sites[key] = {
+                    "call_site": site,
+                    "command": command_name,
+                    "collection": collection,
+                    "filter": shape_of_filter,
+                    "count": 0,
+                    "failures": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "returned": 0,
+                    "explain": None,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_at"] = datetime.now(timezone.utc)
+            if reply is None:
+                entry["failures"] += 1
+            elif returned is not None:
+                entry["returned"] += returned
+
+        if first and self.explain and reply is not None and command_name in EXPLAINABLE_COMMANDS and self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self.explain_first(entry, event.database_name, command), self.loop)
+
+    async def explain_first(self, entry: Dict[str, Any], database_name: str, command: dict):
+        explainable = {
+            key: value for key, value in command.items()
+            if not key.startswith("$") and key not in NOT_EXPLAINABLE_FIELDS
+        }
+        try:
+            explain = await self.client[database_name].command(
+                {"explain": explainable, "verbosity": "executionStats"}
+            )
+        except Exception as error:
+            logger.warning("Could not explain slow %s at %s: %s", entry["command"], entry["call_site"], error)
+            return
+        entry["explain"] = explain_summary(explain)
+        logger.warning(
+            "Explained slow %s on %s at %s: %s", entry["command"], entry["collection"], entry["call_site"], entry["explain"]
+        )
+
+    def stats(self):
+        with self.lock:
+            entries = [dict(entry) for entry in self.call_sites.values()]
+        for entry in entries:
+            entry["avg_ms"] = entry["total_ms"] / entry["count"]
+        entries.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        return {"threshold_ms": self.threshold_ms, "explain": self.explain, "call_sites": entries}
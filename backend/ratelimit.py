@@ -0,0 +1,231 @@
+"""Token-bucket throttling of the credential routes.
+
+``/api/login`` verifies a bcrypt hash and ``/api/signup`` computes one, each
+costing tens of milliseconds of CPU, so an unthrottled client can saturate
+a worker. ``RateLimitMiddleware`` checks buckets per client IP and per
+submitted email before the request reaches the route, and answers excess
+attempts with 429 and ``Retry-After`` without doing any hash work.
+
+Buckets live in this process (``MemoryBucketStore``) or, so that every
+worker and host shares them, in Mongo (``MongoBucketStore``, one document per
+bucket updated atomically, expired by a TTL index). The memory store limits
+each worker on its own, so with N workers a client gets up to N times the
+configured attempts; use the Mongo store to enforce the limit across workers.
+
+The per-IP key is the TCP peer unless ``trusted_proxies`` is set. Behind a
+proxy every client has the proxy's address and shares one bucket, so set it to
+the number of proxies in front of the app: each appends the address it saw to
+``X-Forwarded-For``, and the client is the entry that many places from the
+right. Entries further left are whatever the client sent and are never used.
+"""
+import json
+import math
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+IP = "ip"
+EMAIL = "email"
+
+# Credential request bodies are tiny; anything larger is not parsed for an email
+MAX_BODY_BYTES = 64 * 1024
+
+
+class Rule:
+    """``capacity`` attempts in a burst, refilled at ``per_minute`` per minute"""
+
+    def __init__(self, scope: str, capacity: int, per_minute: float):
+        if scope not in (IP, EMAIL):
+            raise ValueError(f"Unknown rate limit scope: {scope}")
+        self.scope = scope
+        self.capacity = capacity
+        self.rate = per_minute / 60  # tokens per second
+
+    def idle_seconds(self) -> float:
+        """How long an untouched bucket takes to fill up again"""
+        return self.capacity / self.rate
+
+
+class MemoryBucketStore:
+    """Buckets of this process, least recently used dropped beyond ``maxsize``"""
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rule: Rule, now: float) -> Tuple[bool, float]:
+        """Take one token; returns (allowed, tokens left)"""
+        tokens, updated_at = self.buckets.get(key, (rule.capacity, now))
+        tokens = min(rule.capacity, tokens + (now - updated_at) * rule.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > self.maxsize:
+            self.buckets.popitem(last=False)
+        return allowed, tokens
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class MongoBucketStore:
+    """Buckets shared by every worker, in ``rate_limits``.
+
+    The refill and the take happen in one pipeline update, so concurrent
+    attempts from different workers cannot both spend the last token.
+    """
+
+    def __init__(self, db, collection_name: str = "rate_limits"):
+        self.db = db
+        self.collection_name = collection_name
+
+    async def take(self, key: str, rule: Rule, now: float) -> Tuple[bool, float]:
+        refilled = {"$min": [rule.capacity, {"$add": [
+            {"$ifNull": ["$tokens", rule.capacity]},
+            {"$multiply": [{"$max": [0, {"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}]}, rule.rate]}
+        ]}]}
+        bucket = await self.db[self.collection_name].find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "updated_at": now,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=rule.idle_seconds())
+                }},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return bucket["allowed"], bucket["tokens"]
+
+
+class RateLimiter:
+    def __init__(self, store, rules: Dict[str, List[Rule]]):
+        self.store = store
+        self.rules = rules
+        self.allowed: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+        self.errors = 0
+
+    async def check(self, path: str, identities: Dict[str, Optional[str]]) -> Optional[float]:
+        """None when the attempt may proceed, otherwise seconds until it may be retried"""
+        now = time.time()
+        for rule in self.rules.get(path, ()):
+            identity = identities.get(rule.scope)
+            if not identity:
+                continue
+            try:
+                allowed, tokens = await self.store.take(f"{path}|{rule.scope}|{identity}", rule, now)
+            except Exception:
+                # Throttling must never take logins down with it
+                self.errors += 1
+                logger.exception("Rate limit store failed, letting the request through")
+                return None
+            metric = f"{path} {rule.scope}"
+            if not allowed:
+                self.rejected[metric] = self.rejected.get(metric, 0) + 1
+                return (1 - tokens) / rule.rate
+            self.allowed[metric] = self.allowed.get(metric, 0) + 1
+        return None
+
+    def stats(self):
+        return {"allowed": dict(self.allowed), "rejected": dict(self.rejected), "errors": self.errors}
+
+
+def submitted_email(body: bytes) -> Optional[str]:
+    if not body or len(body) > MAX_BODY_BYTES:
+        return None
+    try:
+        email = json.loads(body).get("email")
+    except (ValueError, AttributeError):
+        return None
+    return email.strip().lower() if isinstance(email, str) else None
+
+
+def forwarded_for(scope) -> List[str]:
+    """``X-Forwarded-For`` entries of all such headers, left to right"""
+    entries = []
+    for name, value in scope.get("headers", ()):
+        if name == b"x-forwarded-for":
+            entries.extend(entry.strip() for entry in value.decode("latin-1").split(","))
+    return [entry for entry in entries if entry]
+
+
+def client_ip(scope, trusted_proxies: int = 0) -> Optional[str]:
+    """Address of the client, skipping ``trusted_proxies`` proxy hops"""
+    if trusted_proxies > 0:
+        entries = forwarded_for(scope)
+        if entries:
+            # Fewer entries than hops: the left-most one was still written by a proxy
+            return entries[-min(trusted_proxies, len(entries))]
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying ``limiter`` to POSTs of its configured paths.
+
+    The body is read here to find the email and then replayed to the app.
+    ``trusted_proxies`` is the number of proxies in front of the app whose
+    ``X-Forwarded-For`` entries are believed (see ``client_ip``).
+    """
+
+    def __init__(self, app, limiter: RateLimiter, trusted_proxies: int = 0):
+        self.app = app
+        self.limiter = limiter
+        self.trusted_proxies = trusted_proxies
+        self.warned_untrusted_proxy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.limiter.rules:
+            await self.app(scope, receive, send)
+            return
+
+        messages = []
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        ip = client_ip(scope, self.trusted_proxies)
+        if not self.trusted_proxies and not self.warned_untrusted_proxy and forwarded_for(scope):
+            self.warned_untrusted_proxy = True
+            logger.warning(
+                "Credential requests arrive through a proxy but RATE_LIMIT_TRUSTED_PROXIES is 0, "
+                "so all clients share the per-IP bucket of %s", ip
+            )
+        retry_after = await self.limiter.check(scope["path"], {IP: ip, EMAIL: submitted_email(body)})
+        if retry_after is not None:
+            logger.warning("Throttled %s from %s", scope["path"], ip)
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(max(1, math.ceil(retry_after))).encode())
+                ]
+            })
+            await send({"type": "http.response.body", "body": b'{"detail":"Too many attempts, try again later"}'})
+            return
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        await self.app(scope, replay, send)
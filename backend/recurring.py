@@ -0,0 +1,206 @@
+"""Recurring transaction templates and the scheduler that materializes them.
+
+A template stores a transaction body plus a rule (daily, weekly, monthly or
+yearly every ``interval`` periods from ``start_date``) and the index of the
+next occurrence that has not been materialized yet. The scheduler runs in
+the app lifespan: it claims due templates with a short lease, so several
+workers can run it side by side, and materializes every missed occurrence
+up to today in one batched insert. Occurrence ids are derived from the
+template id and date, which makes re-running a batch after a crash a no-op.
+A template whose run fails keeps its lease for a growing back-off, so the
+rest of the due templates still run and it is retried later.
+"""
+import uuid
+import asyncio
+import logging
+import calendar
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+DAILY = "daily"
+WEEKLY = "weekly"
+MONTHLY = "monthly"
+YEARLY = "yearly"
+
+OCCURRENCE_NAMESPACE = uuid.UUID("6f1c7a0e-4b0b-4d51-9d51-5f3f0f7c9a21")
+MAX_OCCURRENCES_PER_BATCH = 366
+LEASE_SECONDS = 120
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 6 * 60 * 60
+
+
+def occurrence_id(template_id: str, occurrence_date: str) -> str:
+    return str(uuid.uuid5(OCCURRENCE_NAMESPACE, f"{template_id}:{occurrence_date}"))
+
+
+def add_months(start: date, months: int, day_of_month: Optional[int] = None) -> date:
+    """Shift by whole months, clamping the day to the length of the target month"""
+    month_index = start.year * 12 + start.month - 1 + months
+    year, month = month_index // 12, month_index % 12 + 1
+    day = min(day_of_month or start.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def occurrence_date(rule: dict, index: int) -> date:
+    """Date of the ``index``-th (0-based) occurrence of a rule"""
+    start = date.fromisoformat(rule["start_date"])
+    interval = rule.get("interval", 1)
+    frequency = rule["frequency"]
+    if frequency == DAILY:
+        return start + timedelta(days=index * interval)
+    if frequency == WEEKLY:
+        return start + timedelta(weeks=index * interval)
+    if frequency == MONTHLY:
+        return add_months(start, index * interval, rule.get("day_of_month"))
+    if frequency == YEARLY:
+        return add_months(start, index * interval * 12, rule.get("day_of_month"))
+    raise ValueError(f"Unknown frequency: {frequency}")
+
+
+def due_occurrences(rule: dict, next_index: int, today: date, limit: int = MAX_OCCURRENCES_PER_BATCH):
+    """(index, date) of occurrences from ``next_index`` that are due by ``today``"""
+    end_date = date.fromisoformat(rule["end_date"]) if rule.get("end_date") else None
+    due = []
+    index = next_index
+    while len(due) < limit:
+        when = occurrence_date(rule, index)
+        if when > today or (end_date and when > end_date):
+            break
+        due.append((index, when))
+        index += 1
+    return due
+
+
+def next_run_date(rule: dict, next_index: int) -> Optional[str]:
+    """Date the template is due next, or None when the rule has ended"""
+    when = occurrence_date(rule, next_index)
+    if rule.get("end_date") and when > date.fromisoformat(rule["end_date"]):
+        return None
+    return when.isoformat()
+
+
+def retry_delay(failures: int) -> float:
+    """Seconds before a template that failed ``failures`` times in a row is retried"""
+    return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(0, failures - 1))
+
+
+MaterializeCallback = Callable[[dict, List[date]], Awaitable[int]]
+
+
+class RecurringScheduler:
+    def __init__(self, db, materialize: MaterializeCallback, interval_seconds: float = 60):
+        self.db = db
+        self.materialize = materialize
+        self.interval_seconds = interval_seconds
+        self.worker_id = str(uuid.uuid4())
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="recurring-scheduler")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Run a pass now instead of waiting for the next interval"""
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Recurring transaction pass failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def claim_due(self, today: date):
+        now = datetime.now(timezone.utc)
+        return await self.db.recurring_transactions.find_one_and_update(
+            {
+                "active": True,
+                "next_run_date": {"$lte": today.isoformat()},
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now.isoformat()}}]
+            },
+            {"$set": {"lease_until": (now + timedelta(seconds=LEASE_SECONDS)).isoformat(), "leased_by": self.worker_id}},
+            sort=[("next_run_date", 1), ("id", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def run_due(self) -> int:
+        """Materialize every due occurrence of every template; returns rows inserted"""
+        today = datetime.now(timezone.utc).date()
+        inserted = 0
+        while True:
+            template = await self.claim_due(today)
+            if template is None:
+                return inserted
+            try:
+                inserted += await self.run_template(template, today)
+            except asyncio.CancelledError:
+                await self.release(template, {})
+                raise
+            except Exception as error:
+                await self.back_off(template, error)
+            else:
+                await self.release(template, {"failures": 0, "last_error": None})
+
+    async def release(self, template: dict, fields: dict):
+        await self.db.recurring_transactions.update_one(
+            {"id": template["id"], "leased_by": self.worker_id},
+            {"$set": {"lease_until": None, "leased_by": None, **fields}}
+        )
+
+    async def back_off(self, template: dict, error: Exception):
+        """Keep a failed template leased until its retry time so the pass moves on"""
+        failures = template.get("failures", 0) + 1
+        delay = retry_delay(failures)
+        logger.exception(
+            "Recurring transaction %s failed (%s in a row), retrying in %ss", template["id"], failures, delay
+        )
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        await self.db.recurring_transactions.update_one(
+            {"id": template["id"], "leased_by": self.worker_id},
+            {"$set": {
+                "lease_until": retry_at.isoformat(),
+                "leased_by": None,
+                "failures": failures,
+                "last_error": repr(error)
+            }}
+        )
+
+    async def run_template(self, template: dict, today: date) -> int:
+        due = due_occurrences(template["rule"], template["next_index"], today)
+        inserted = await self.materialize(template, [when for _, when in due]) if due else 0
+
+        next_index = due[-1][0] + 1 if due else template["next_index"]
+        upcoming = next_run_date(template["rule"], next_index)
+        await self.db.recurring_transactions.update_one(
+            # Only advance from the index this pass started at
+            {"id": template["id"], "next_index": template["next_index"]},
+            {"$set": {
+                "next_index": next_index,
+                "next_run_date": upcoming,
+                "active": upcoming is not None,
+                "last_run_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+        if inserted:
+            logger.info("Materialized %s occurrence(s) of recurring transaction %s", inserted, template["id"])
+        return inserted
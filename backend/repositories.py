@@ -0,0 +1,650 @@
+"""Storage-agnostic access to users, profiles, categories and transactions.
+
+Each backend implements the same four repositories over plain dicts shaped
+like the stored Mongo documents (without ``_id``):
+
+``MongoRepositories``
+    Motor, used by the API. Transactions go through the active
+    ``transaction_storage`` layout.
+``SqliteRepositories``
+    An embedded SQLite file. Each entity is a JSON document plus indexed
+    key columns.
+``MemoryRepositories``
+    Plain dicts.
+
+The API reads and writes users, profiles and categories, and creates,
+updates and deletes transactions, only through these repositories. It
+always runs on ``MongoRepositories``: ledger totals, the archive, sync,
+budgets, jobs and change streams use Motor directly, and transaction reads
+go through ``archive`` to see archived years. The SQLite and in-memory
+backends keep the contract honest and run in the tests; they are not a
+deployment option for the API.
+
+All backends pass the contract tests in ``tests/test_repositories.py``.
+Updates replace top-level fields, like a ``$set`` without dotted paths.
+Transaction date ranges compare ``date`` strings, so ``start``/``end`` may be
+any ``YYYY[-MM[-DD]]`` prefix.
+"""
+import re
+import copy
+import json
+import asyncio
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from transaction_storage import active_store
+from categories import catalogue_query, in_catalogue
+
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class DuplicateIdError(Exception):
+    """An entity with the same id is already stored"""
+
+
+def check_group_by(group_by: Sequence[str]):
+    # Field names end up in SQL and aggregation expressions
+    for field in group_by:
+        if not FIELD_NAME.match(field):
+            raise ValueError(f"Cannot group transactions by {field!r}")
+
+
+def date_query(profile_id: str, start: Optional[str], end: Optional[str]) -> dict:
+    query = {"profile_id": profile_id}
+    date_range = {}
+    if start:
+        date_range["$gte"] = start
+    if end:
+        date_range["$lt"] = end
+    if date_range:
+        query["date"] = date_range
+    return query
+
+
+def without_id(document: Optional[dict]) -> Optional[dict]:
+    if document is not None:
+        document.pop("_id", None)
+    return document
+
+
+# Mongo
+
+class MongoUserRepository:
+    def __init__(self, db):
+        self.db = db
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        return await self.db.users.find_one({"id": user_id}, {"_id": 0})
+
+    async def get_many(self, user_ids: Iterable[str]) -> List[dict]:
+        return await self.db.users.find({"id": {"$in": list(user_ids)}}, {"_id": 0}).to_list(length=None)
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return await self.db.users.find_one({"email": email}, {"_id": 0})
+
+    async def create(self, user: dict):
+        try:
+            await self.db.users.insert_one(dict(user))
+        except DuplicateKeyError:
+            raise DuplicateIdError(user["id"])
+
+    async def update(self, user_id: str, changes: dict) -> Optional[dict]:
+        return without_id(await self.db.users.find_one_and_update(
+            {"id": user_id}, {"$set": changes}, return_document=ReturnDocument.AFTER
+        ))
+
+    async def delete(self, user_id: str) -> bool:
+        return (await self.db.users.delete_one({"id": user_id})).deleted_count > 0
+
+
+class MongoProfileRepository:
+    def __init__(self, db):
+        self.db = db
+
+    async def get(self, profile_id: str) -> Optional[dict]:
+        return await self.db.profiles.find_one({"id": profile_id}, {"_id": 0})
+
+    async def get_by_user(self, user_id: str) -> Optional[dict]:
+        return await self.db.profiles.find_one({"user_id": user_id}, {"_id": 0})
+
+    async def create(self, profile: dict):
+        try:
+            await self.db.profiles.insert_one(dict(profile))
+        except DuplicateKeyError:
+            raise DuplicateIdError(profile["id"])
+
+    async def update(self, profile_id: str, changes: dict) -> Optional[dict]:
+        return without_id(await self.db.profiles.find_one_and_update(
+            {"id": profile_id}, {"$set": changes}, return_document=ReturnDocument.AFTER
+        ))
+
+    async def increment(self, profile_id: str, field: str, amount: int = 1):
+        await self.db.profiles.update_one({"id": profile_id}, {"$inc": {field: amount}})
+
+
+class MongoCategoryRepository:
+    def __init__(self, db):
+        self.db = db
+
+    async def list(self, profile_id: Optional[str] = None) -> List[dict]:
+        """The shared defaults plus the custom categories of ``profile_id``"""
+        return await self.db.categories.find(catalogue_query(profile_id), {"_id": 0}).to_list(length=None)
+
+    async def get(self, category_id: str) -> Optional[dict]:
+        return await self.db.categories.find_one({"id": category_id}, {"_id": 0})
+
+    async def count(self) -> int:
+        return await self.db.categories.count_documents({})
+
+    async def create(self, category: dict):
+        try:
+            await self.db.categories.insert_one(dict(category))
+        except DuplicateKeyError:
+            raise DuplicateIdError(category["id"])
+
+
+class MongoTransactionRepository:
+    def __init__(self, db, store=None):
+        self.db = db
+        self.store = store or active_store()
+
+    @property
+    def collection(self):
+        return self.store.collection(self.db)
+
+    async def get(self, transaction_id: str, profile_id: Optional[str] = None) -> Optional[dict]:
+        query = {"id": transaction_id}
+        if profile_id is not None:
+            query["profile_id"] = profile_id
+        return await self.collection.find_one(query, {"_id": 0, "ts": 0})
+
+    async def create(self, transaction: dict):
+        document = dict(transaction)
+        if await self.store.insert_new(self.db, [document]) == []:
+            raise DuplicateIdError(transaction["id"])
+
+    async def create_many(self, transactions: List[dict]) -> List[dict]:
+        """Store the transactions whose id is new; returns those"""
+        inserted = await self.store.insert_new(self.db, [dict(transaction) for transaction in transactions])
+        for document in inserted:
+            document.pop("_id", None)
+            document.pop("ts", None)
+        return inserted
+
+    async def update(self, transaction_id: str, changes: dict, profile_id: Optional[str] = None) -> Optional[dict]:
+        query = {"id": transaction_id}
+        if profile_id is not None:
+            query["profile_id"] = profile_id
+        document = without_id(await self.store.update(self.db, query, dict(changes)))
+        if document is not None:
+            document.pop("ts", None)
+        return document
+
+    async def delete(self, transaction_id: str, profile_id: Optional[str] = None) -> Optional[dict]:
+        query = {"id": transaction_id}
+        if profile_id is not None:
+            query["profile_id"] = profile_id
+        document = without_id(await self.store.delete(self.db, query))
+        if document is not None:
+            document.pop("ts", None)
+        return document
+
+    async def list(self, profile_id: str, start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+        """A profile's transactions in [start, end), newest first"""
+        return await self.collection.find(
+            self.store.translate(date_query(profile_id, start, end)), {"_id": 0, "ts": 0}
+        ).sort([("date", DESCENDING), ("id", ASCENDING)]).to_list(length=None)
+
+    async def totals(self, profile_id: str, start: Optional[str], end: Optional[str],
+                     group_by: Sequence[str]) -> Dict[tuple, int]:
+        """Sum of ``amount_minor`` per distinct ``group_by`` values"""
+        check_group_by(group_by)
+        rows = await self.collection.aggregate([
+            {"$match": self.store.translate(date_query(profile_id, start, end))},
+            {"$group": {
+                "_id": {field: f"${field}" for field in group_by},
+                "amount_minor": {"$sum": "$amount_minor"}
+            }}
+        ]).to_list(length=None)
+        return {tuple(row["_id"].get(field) for field in group_by): row["amount_minor"] for row in rows}
+
+
+class MongoRepositories:
+    def __init__(self, db, store=None):
+        self.users = MongoUserRepository(db)
+        self.profiles = MongoProfileRepository(db)
+        self.categories = MongoCategoryRepository(db)
+        self.transactions = MongoTransactionRepository(db, store)
+
+    async def close(self):
+        pass  # The Motor client belongs to the caller
+
+
+# SQLite
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, email TEXT, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE TABLE IF NOT EXISTS profiles (id TEXT PRIMARY KEY, user_id TEXT, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS profiles_user_id ON profiles (user_id);
+CREATE TABLE IF NOT EXISTS categories (
+    id TEXT PRIMARY KEY, profile_id TEXT, type TEXT, is_custom INTEGER NOT NULL DEFAULT 0, data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS categories_profile_type ON categories (profile_id, type);
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY, profile_id TEXT NOT NULL, date TEXT NOT NULL, data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_profile_date ON transactions (profile_id, date);
+"""
+
+
+@contextmanager
+def sqlite_transaction(connection: sqlite3.Connection):
+    # The connection is in autocommit mode, so transactions are explicit
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+class SqliteConnection:
+    """One SQLite connection shared by the repositories.
+
+    Statements run in a worker thread so the event loop never blocks on
+    disk; the lock serializes them, which is also what SQLite does anyway
+    for writers.
+    """
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SQLITE_SCHEMA)
+        self.lock = threading.Lock()
+
+    def _run(self, work):
+        with self.lock:
+            return work(self.connection)
+
+    async def run(self, work):
+        return await asyncio.to_thread(self._run, work)
+
+    async def fetch_one(self, sql: str, parameters: Sequence = ()) -> Optional[dict]:
+        row = await self.run(lambda connection: connection.execute(sql, parameters).fetchone())
+        return json.loads(row[0]) if row else None
+
+    async def fetch_all(self, sql: str, parameters: Sequence = ()) -> List[dict]:
+        rows = await self.run(lambda connection: connection.execute(sql, parameters).fetchall())
+        return [json.loads(row[0]) for row in rows]
+
+    async def insert(self, table: str, columns: Dict[str, object], document: dict):
+        names = [*columns, "data"]
+        values = [*columns.values(), json.dumps(document)]
+        sql = f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+        try:
+            await self.run(lambda connection: connection.execute(sql, values))
+        except sqlite3.IntegrityError:
+            raise DuplicateIdError(document["id"])
+
+    async def modify(self, table: str, key_columns: Sequence[str], where: str, parameters: Sequence, change):
+        """Read-modify-write one row atomically; ``change`` edits the document in place"""
+        def work(connection):
+            with sqlite_transaction(connection):
+                row = connection.execute(f"SELECT data FROM {table} WHERE {where}", parameters).fetchone()
+                if row is None:
+                    return None
+                document = json.loads(row[0])
+                change(document)
+                assignments = ", ".join(f"{column} = ?" for column in [*key_columns, "data"])
+                connection.execute(
+                    f"UPDATE {table} SET {assignments} WHERE id = ?",
+                    [*(document.get(column) for column in key_columns), json.dumps(document), document["id"]]
+                )
+                return document
+        return await self.run(work)
+
+    def close(self):
+        self.connection.close()
+
+
+class SqliteUserRepository:
+    def __init__(self, connection: SqliteConnection):
+        self.connection = connection
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        return await self.connection.fetch_one("SELECT data FROM users WHERE id = ?", (user_id,))
+
+    async def get_many(self, user_ids: Iterable[str]) -> List[dict]:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return []
+        return await self.connection.fetch_all(
+            f"SELECT data FROM users WHERE id IN ({', '.join('?' * len(user_ids))})", user_ids
+        )
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return await self.connection.fetch_one("SELECT data FROM users WHERE email = ? LIMIT 1", (email,))
+
+    async def create(self, user: dict):
+        await self.connection.insert("users", {"id": user["id"], "email": user.get("email")}, user)
+
+    async def update(self, user_id: str, changes: dict) -> Optional[dict]:
+        return await self.connection.modify(
+            "users", ["email"], "id = ?", (user_id,), lambda document: document.update(changes)
+        )
+
+    async def delete(self, user_id: str) -> bool:
+        cursor = await self.connection.run(
+            lambda connection: connection.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        )
+        return cursor.rowcount > 0
+
+
+class SqliteProfileRepository:
+    def __init__(self, connection: SqliteConnection):
+        self.connection = connection
+
+    async def get(self, profile_id: str) -> Optional[dict]:
+        return await self.connection.fetch_one("SELECT data FROM profiles WHERE id = ?", (profile_id,))
+
+    async def get_by_user(self, user_id: str) -> Optional[dict]:
+        return await self.connection.fetch_one("SELECT data FROM profiles WHERE user_id = ? LIMIT 1", (user_id,))
+
+    async def create(self, profile: dict):
+        await self.connection.insert("profiles", {"id": profile["id"], "user_id": profile.get("user_id")}, profile)
+
+    async def update(self, profile_id: str, changes: dict) -> Optional[dict]:
+        return await self.connection.modify(
+            "profiles", ["user_id"], "id = ?", (profile_id,), lambda document: document.update(changes)
+        )
+
+    async def increment(self, profile_id: str, field: str, amount: int = 1):
+        def change(document):
+            document[field] = document.get(field, 0) + amount
+        await self.connection.modify("profiles", ["user_id"], "id = ?", (profile_id,), change)
+
+
+class SqliteCategoryRepository:
+    def __init__(self, connection: SqliteConnection):
+        self.connection = connection
+
+    async def list(self, profile_id: Optional[str] = None) -> List[dict]:
+        return await self.connection.fetch_all(
+            "SELECT data FROM categories WHERE (profile_id IS NULL AND NOT is_custom) OR profile_id = ? ORDER BY rowid",
+            (profile_id,)
+        )
+
+    async def get(self, category_id: str) -> Optional[dict]:
+        return await self.connection.fetch_one("SELECT data FROM categories WHERE id = ?", (category_id,))
+
+    async def count(self) -> int:
+        return await self.connection.run(
+            lambda connection: connection.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+        )
+
+    async def create(self, category: dict):
+        await self.connection.insert("categories", {
+            "id": category["id"],
+            "profile_id": category.get("profile_id"),
+            "type": category.get("type"),
+            "is_custom": bool(category.get("is_custom"))
+        }, category)
+
+
+class SqliteTransactionRepository:
+    def __init__(self, connection: SqliteConnection):
+        self.connection = connection
+
+    @staticmethod
+    def where(profile_id: str, start: Optional[str], end: Optional[str]):
+        clauses, parameters = ["profile_id = ?"], [profile_id]
+        if start:
+            clauses.append("date >= ?")
+            parameters.append(start)
+        if end:
+            clauses.append("date < ?")
+            parameters.append(end)
+        return " AND ".join(clauses), parameters
+
+    async def get(self, transaction_id: str, profile_id: Optional[str] = None) -> Optional[dict]:
+        document = await self.connection.fetch_one("SELECT data FROM transactions WHERE id = ?", (transaction_id,))
+        if document is None or (profile_id is not None and document["profile_id"] != profile_id):
+            return None
+        return document
+
+    async def create(self, transaction: dict):
+        await self.connection.insert("transactions", {
+            "id": transaction["id"], "profile_id": transaction["profile_id"], "date": transaction["date"]
+        }, transaction)
+
+    async def create_many(self, transactions: List[dict]) -> List[dict]:
+        def work(connection):
+            inserted = []
+            with sqlite_transaction(connection):
+                for transaction in transactions:
+                    cursor = connection.execute(
+                        "INSERT OR IGNORE INTO transactions (id, profile_id, date, data) VALUES (?, ?, ?, ?)",
+                        (transaction["id"], transaction["profile_id"], transaction["date"], json.dumps(transaction))
+                    )
+                    if cursor.rowcount:
+                        inserted.append(transaction)
+            return inserted
+        return await self.connection.run(work)
+
+    async def _modify(self, transaction_id: str, profile_id: Optional[str], change):
+        where, parameters = "id = ?", [transaction_id]
+        if profile_id is not None:
+            where += " AND profile_id = ?"
+            parameters.append(profile_id)
+        return await self.connection.modify("transactions", ["profile_id", "date"], where, parameters, change)
+
+    async def update(self, transaction_id: str, changes: dict, profile_id: Optional[str] = None) -> Optional[dict]:
+        return await self._modify(transaction_id, profile_id, lambda document: document.update(changes))
+
+    async def delete(self, transaction_id: str, profile_id: Optional[str] = None) -> Optional[dict]:
+        where, parameters = "id = ?", [transaction_id]
+        if profile_id is not None:
+            where += " AND profile_id = ?"
+            parameters.append(profile_id)
+
+        def work(connection):
+            with sqlite_transaction(connection):
+                row = connection.execute(f"SELECT data FROM transactions WHERE {where}", parameters).fetchone()
+                if row is None:
+                    return None
+                connection.execute(f"DELETE FROM transactions WHERE {where}", parameters)
+                return json.loads(row[0])
+        return await self.connection.run(work)
+
+    async def list(self, profile_id: str, start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+        where, parameters = self.where(profile_id, start, end)
+        return await self.connection.fetch_all(
+            f"SELECT data FROM transactions WHERE {where} ORDER BY date DESC, id", parameters
+        )
+
+    async def totals(self, profile_id: str, start: Optional[str], end: Optional[str],
+                     group_by: Sequence[str]) -> Dict[tuple, int]:
+        check_group_by(group_by)
+        where, parameters = self.where(profile_id, start, end)
+        keys = [f"json_extract(data, '$.{field}')" for field in group_by]
+        sql = f"SELECT {', '.join([*keys, ''])}SUM(json_extract(data, '$.amount_minor')) FROM transactions WHERE {where}"
+        if keys:
+            sql += f" GROUP BY {', '.join(keys)}"
+        rows = await self.connection.run(lambda connection: connection.execute(sql, parameters).fetchall())
+        return {tuple(row[:-1]): row[-1] for row in rows if row[-1] is not None}
+
+
+class SqliteRepositories:
+    def __init__(self, path: str = ":memory:"):
+        self.connection = SqliteConnection(path)
+        self.users = SqliteUserRepository(self.connection)
+        self.profiles = SqliteProfileRepository(self.connection)
+        self.categories = SqliteCategoryRepository(self.connection)
+        self.transactions = SqliteTransactionRepository(self.connection)
+
+    async def close(self):
+        self.connection.close()
+
+
+# In memory
+
+class MemoryTable:
+    """Documents by id; copies go in and out so callers cannot alias stored state"""
+
+    def __init__(self):
+        self.documents: Dict[str, dict] = {}
+
+    def get(self, document_id: str) -> Optional[dict]:
+        document = self.documents.get(document_id)
+        return copy.deepcopy(document) if document is not None else None
+
+    def find(self, predicate) -> List[dict]:
+        return [copy.deepcopy(document) for document in self.documents.values() if predicate(document)]
+
+    def insert(self, document: dict):
+        if document["id"] in self.documents:
+            raise DuplicateIdError(document["id"])
+        self.documents[document["id"]] = copy.deepcopy(document)
+
+    def update(self, document_id: str, changes: dict) -> Optional[dict]:
+        if document_id not in self.documents:
+            return None
+        self.documents[document_id].update(copy.deepcopy(changes))
+        return self.get(document_id)
+
+
+class MemoryUserRepository:
+    def __init__(self):
+        self.table = MemoryTable()
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        return self.table.get(user_id)
+
+    async def get_many(self, user_ids: Iterable[str]) -> List[dict]:
+        user_ids = set(user_ids)
+        return self.table.find(lambda user: user["id"] in user_ids)
+
+    async def get_by_email(self, email: str) -> Optional[dict]:
+        return next(iter(self.table.find(lambda user: user.get("email") == email)), None)
+
+    async def create(self, user: dict):
+        self.table.insert(user)
+
+    async def update(self, user_id: str, changes: dict) -> Optional[dict]:
+        return self.table.update(user_id, changes)
+
+    async def delete(self, user_id: str) -> bool:
+        return self.table.documents.pop(user_id, None) is not None
+
+
+class MemoryProfileRepository:
+    def __init__(self):
+        self.table = MemoryTable()
+
+    async def get(self, profile_id: str) -> Optional[dict]:
+        return self.table.get(profile_id)
+
+    async def get_by_user(self, user_id: str) -> Optional[dict]:
+        return next(iter(self.table.find(lambda profile: profile.get("user_id") == user_id)), None)
+
+    async def create(self, profile: dict):
+        self.table.insert(profile)
+
+    async def update(self, profile_id: str, changes: dict) -> Optional[dict]:
+        return self.table.update(profile_id, changes)
+
+    async def increment(self, profile_id: str, field: str, amount: int = 1):
+        profile = self.table.documents.get(profile_id)
+        if profile is not None:
+            profile[field] = profile.get(field, 0) + amount
+
+
+class MemoryCategoryRepository:
+    def __init__(self):
+        self.table = MemoryTable()
+
+    async def list(self, profile_id: Optional[str] = None) -> List[dict]:
+        return self.table.find(lambda category: in_catalogue(category, profile_id))
+
+    async def get(self, category_id: str) -> Optional[dict]:
+        return self.table.get(category_id)
+
+    async def count(self) -> int:
+        return len(self.table.documents)
+
+    async def create(self, category: dict):
+        self.table.insert(category)
+
+
+class MemoryTransactionRepository:
+    def __init__(self):
+        self.table = MemoryTable()
+
+    def owned(self, transaction_id: str, profile_id: Optional[str]) -> bool:
+        document = self.table.documents.get(transaction_id)
+        return document is not None and (profile_id is None or document["profile_id"] == profile_id)
+
+    def in_range(self, profile_id: str, start: Optional[str], end: Optional[str]):
+        return lambda document: (
+            document["profile_id"] == profile_id
+            and (not start or document["date"] >= start)
+            and (not end or document["date"] < end)
+        )
+
+    async def get(self, transaction_id: str, profile_id: Optional[str] = None) -> Optional[dict]:
+        return self.table.get(transaction_id) if self.owned(transaction_id, profile_id) else None
+
+    async def create(self, transaction: dict):
+        self.table.insert(transaction)
+
+    async def create_many(self, transactions: List[dict]) -> List[dict]:
+        inserted = []
+        for transaction in transactions:
+            if transaction["id"] not in self.table.documents:
+                self.table.insert(transaction)
+                inserted.append(transaction)
+        return inserted
+
+    async def update(self, transaction_id: str, changes: dict, profile_id: Optional[str] = None) -> Optional[dict]:
+        return self.table.update(transaction_id, changes) if self.owned(transaction_id, profile_id) else None
+
+    async def delete(self, transaction_id: str, profile_id: Optional[str] = None) -> Optional[dict]:
+        if not self.owned(transaction_id, profile_id):
+            return None
+        return self.table.documents.pop(transaction_id)
+
+    async def list(self, profile_id: str, start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+        documents = self.table.find(self.in_range(profile_id, start, end))
+        documents.sort(key=lambda document: document["id"])
+        documents.sort(key=lambda document: document["date"], reverse=True)
+        return documents
+
+    async def totals(self, profile_id: str, start: Optional[str], end: Optional[str],
+                     group_by: Sequence[str]) -> Dict[tuple, int]:
+        check_group_by(group_by)
+        totals: Dict[tuple, int] = {}
+        for document in self.table.documents.values():
+            if self.in_range(profile_id, start, end)(document):
+                key = tuple(document.get(field) for field in group_by)
+                totals[key] = totals.get(key, 0) + document.get("amount_minor", 0)
+        return totals
+
+
+class MemoryRepositories:
+    def __init__(self):
+        self.users = MemoryUserRepository()
+        self.profiles = MemoryProfileRepository()
+        self.categories = MemoryCategoryRepository()
+        self.transactions = MemoryTransactionRepository()
+
+    async def close(self):
+        pass
+
@@ -0,0 +1,109 @@
+"""Multi-worker launcher for the Budget Tracker API.
+
+    python run.py --workers 4
+    python run.py --server gunicorn --workers 4 --pool-budget 200
+
+Each worker opens its own Motor client in the app lifespan. When a pool
+budget is given it is split across the workers, so the total number of
+Mongo connections stays bounded no matter how many workers are started.
+
+Workers do not share memory, so more than one worker needs JWT_SECRET_KEY
+set; otherwise each worker signs tokens with its own random key and rejects
+the tokens of the others.
+"""
+import os
+import multiprocessing
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+import typer
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+class ServerKind(str, Enum):
+    UVICORN = "uvicorn"
+    GUNICORN = "gunicorn"
+
+
+def default_workers():
+    return int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+
+def split_pool_budget(pool_budget: int, workers: int):
+    """Per-worker (maxPoolSize, minPoolSize) for a total connection budget"""
+    max_pool_size = max(1, pool_budget // workers)
+    min_pool_size = min(max_pool_size, int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)))
+    return max_pool_size, min_pool_size
+
+
+def run_gunicorn(host: str, port: int, workers: int, timeout: int):
+    from gunicorn.app.base import BaseApplication
+
+    class GunicornApp(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            self.cfg.set("timeout", timeout)
+            self.cfg.set("graceful_timeout", timeout)
+            # Fork first, import the app in each worker so no Motor client is shared
+            self.cfg.set("preload_app", False)
+
+        def load(self):
+            from server import app
+            return app
+
+    GunicornApp().run()
+
+
+def main(
+    host: str = typer.Option("0.0.0.0", envvar="HOST"),
+    port: int = typer.Option(8001, envvar="PORT"),
+    workers: Optional[int] = typer.Option(None, help="Defaults to WEB_CONCURRENCY or the CPU count"),
+    server: ServerKind = typer.Option(ServerKind.UVICORN),
+    pool_budget: Optional[int] = typer.Option(
+        None, envvar="MONGO_POOL_BUDGET", help="Total Mongo connections shared by all workers"
+    ),
+    timeout: int = typer.Option(60, help="Worker timeout in seconds (gunicorn only)"),
+):
+    workers = workers or default_workers()
+
+    if workers > 1 and not os.environ.get('JWT_SECRET_KEY'):
+        typer.echo(
+            f"JWT_SECRET_KEY must be set to run {workers} workers: "
+            "tokens signed by one worker are checked by the others",
+            err=True,
+        )
+        raise typer.Exit(code=1)
+    if workers > 1 and os.environ.get('RATE_LIMIT_BACKEND', 'memory') != 'mongo':
+        typer.echo(
+            f"Note: rate limit buckets are per worker, so credential limits allow {workers}x "
+            "the configured attempts; set RATE_LIMIT_BACKEND=mongo to share them",
+            err=True,
+        )
+
+    if pool_budget:
+        max_pool_size, min_pool_size = split_pool_budget(pool_budget, workers)
+        # Workers inherit the environment, MongoSettings.from_env picks these up
+        os.environ['MONGO_MAX_POOL_SIZE'] = str(max_pool_size)
+        os.environ['MONGO_MIN_POOL_SIZE'] = str(min_pool_size)
+
+    typer.echo(
+        f"Starting {workers} {server.value} worker(s) on {host}:{port} "
+        f"(maxPoolSize={os.environ.get('MONGO_MAX_POOL_SIZE', 'default')} per worker)"
+    )
+
+    os.chdir(ROOT_DIR)
+    if server == ServerKind.GUNICORN:
+        run_gunicorn(host, port, workers, timeout)
+    else:
+        import uvicorn
+        uvicorn.run("server:app", host=host, port=port, workers=workers, app_dir=str(ROOT_DIR))
+
+
+if __name__ == "__main__":
+    typer.run(main)
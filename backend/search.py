@@ -0,0 +1,64 @@
+"""Prefix search over transactions.
+
+Each transaction stores ``search_tokens``: every prefix (edge n-gram) of the
+words in its description, person name, bank/app and category name. With a
+multikey index on (profile_id, search_tokens) a query like "amaz ref" is an
+indexed ``$all`` lookup for the prefixes "amaz" and "ref", and ranking only
+looks at the rows that matched.
+"""
+import re
+from typing import Dict, List, Optional
+
+SEARCH_FIELDS = ("description", "person_name", "bank_app", "category_name")
+MIN_PREFIX_LENGTH = 1
+MAX_PREFIX_LENGTH = 15
+
+# Exact word matches outrank prefix matches; names outrank free text
+FIELD_WEIGHTS = {"person_name": 3.0, "category_name": 2.0, "bank_app": 2.0, "description": 1.0}
+EXACT_MATCH_BONUS = 2.0
+
+WORD_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return WORD_PATTERN.findall(text.lower())
+
+
+def build_search_tokens(transaction: dict, category_name: Optional[str]) -> List[str]:
+    """Sorted, de-duplicated prefixes of every searchable word of a transaction"""
+    fields = dict(transaction, category_name=category_name)
+    prefixes = set()
+    for field in SEARCH_FIELDS:
+        for word in tokenize(fields.get(field)):
+            for length in range(MIN_PREFIX_LENGTH, min(len(word), MAX_PREFIX_LENGTH) + 1):
+                prefixes.add(word[:length])
+    return sorted(prefixes)
+
+
+def query_terms(query: str) -> List[str]:
+    """Words of a search query, clipped to the longest indexed prefix"""
+    terms = []
+    for word in tokenize(query):
+        term = word[:MAX_PREFIX_LENGTH]
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def score(transaction: dict, category_name: Optional[str], terms: List[str]) -> float:
+    """Relevance of a matched transaction; every term is known to match somewhere"""
+    fields = dict(transaction, category_name=category_name)
+    words: Dict[str, List[str]] = {field: tokenize(fields.get(field)) for field in SEARCH_FIELDS}
+    total = 0.0
+    for term in terms:
+        best = 0.0
+        for field, field_words in words.items():
+            for word in field_words:
+                if word == term:
+                    best = max(best, FIELD_WEIGHTS[field] * EXACT_MATCH_BONUS)
+                elif word.startswith(term):
+                    best = max(best, FIELD_WEIGHTS[field] * len(term) / len(word))
+        total += best
+    return total
@@ -0,0 +1,36 @@
+"""JSON encoding of API responses with orjson.
+
+``ORJSONResponse`` is the app's default response class. orjson encodes
+datetimes, dates, UUIDs, enums (also as dict keys) and numpy values itself;
+``default`` covers the rest of what routes return (pydantic models,
+Decimals, sets). Routes that return a response object directly skip
+FastAPI's ``jsonable_encoder`` pass as well, which is most of the encoding
+cost of large lists.
+"""
+from decimal import Decimal
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+# UTC datetimes end in "Z", as pydantic writes them
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z
+
+
+def default(value):
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=default, option=OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -1,39 +1,201 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from contextlib import asynccontextmanager
 import os
 import logging
+import asyncio
+import csv
+import io
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
+from decimal import Decimal
 from enum import Enum
 import jwt
 from passlib.context import CryptContext
 import secrets
+import numpy as np
+
+from database import Database, MongoSettings
+from transaction_storage import active_store
+from repositories import MongoRepositories
+from money import (
+    normalize_currency, to_minor_units, from_minor_units, minor_to_decimal, currency_exponent
+)
+from fx import get_rate_table, MissingRateError
+from analytics import LedgerFrame
+from search import build_search_tokens, query_terms, score as search_score
+import budgets
+import categories
+import cfr
+import recurring
+import jobs
+import events
+import audit
+import archive
+import ratelimit
+import singleflight
+import compression
+import profiling
+import querylog
+import health
+import sync
+from serialization import ORJSONResponse
+from migrate import migrate_search_tokens, ARCHIVE_HORIZON_MONTHS
+from cache import StampedLRUCache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Mongo commands slower than this many milliseconds are logged; 0 turns the log off
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+# Also explain the first slow command of each call site (runs it once more)
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'false').lower() == 'true'
+
+slow_query_log = querylog.SlowQueryLog(SLOW_QUERY_MS, explain=SLOW_QUERY_EXPLAIN)
+
+# Connections per Mongo server, from the pool events
+pool_stats = health.PoolStats()
+
+# MongoDB connection (opened per worker in the app lifespan)
+db = Database(
+    MongoSettings.from_env(),
+    event_listeners=[profiling.CommandRecorder(), pool_stats] + ([slow_query_log] if SLOW_QUERY_MS > 0 else [])
+)
+# Layout of the transactions collection (TRANSACTION_STORAGE)
+transaction_store = active_store()
+# Users, profiles, categories and transactions behind the repository interface
+repos = MongoRepositories(db, transaction_store)
 
 # Security setup
-SECRET_KEY = secrets.token_urlsafe(32)
+# Tokens must verify on every worker, so multi-worker deployments set JWT_SECRET_KEY;
+# without it a single worker signs with a key that changes on each restart
+SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or secrets.token_urlsafe(32)
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 DEFAULT_FAMILY_PASSWORD = "Artheeti1"
+SEARCH_CANDIDATE_LIMIT = 1000
+# Longest range /api/dashboard/breakdown reports, which builds a daily series over it
+BREAKDOWN_MAX_DAYS = 3 * 366
+DASHBOARD_CACHE_SIZE = int(os.environ.get('DASHBOARD_CACHE_SIZE', 4096))
+CATEGORY_CACHE_SIZE = int(os.environ.get('CATEGORY_CACHE_SIZE', 4096))
+# How long a request waits on a computation shared with concurrent identical requests
+SINGLE_FLIGHT_TIMEOUT_SECONDS = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT_SECONDS', 30))
+RECURRING_SCHEDULER_ENABLED = os.environ.get('RECURRING_SCHEDULER_ENABLED', 'true').lower() == 'true'
+RECURRING_INTERVAL_SECONDS = float(os.environ.get('RECURRING_INTERVAL_SECONDS', 60))
+# Job worker tasks per web process; 0 leaves jobs to separate worker.py processes
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_POLL_INTERVAL_SECONDS = float(os.environ.get('JOB_POLL_INTERVAL_SECONDS', 5))
+# Where live ledger events come from: the write routes of this worker, or a change stream
+EVENTS_SOURCE = os.environ.get('EVENTS_SOURCE', events.ROUTES)
+EVENTS_HEARTBEAT_SECONDS = float(os.environ.get('EVENTS_HEARTBEAT_SECONDS', 15))
+# Credential attempts per minute (also the burst size); 0 turns a limit off.
+# With the memory backend each worker enforces these separately, so N workers allow N times as many
+LOGIN_RATE_LIMIT_PER_IP = int(os.environ.get('LOGIN_RATE_LIMIT_PER_IP', 20))
+LOGIN_RATE_LIMIT_PER_EMAIL = int(os.environ.get('LOGIN_RATE_LIMIT_PER_EMAIL', 5))
+SIGNUP_RATE_LIMIT_PER_IP = int(os.environ.get('SIGNUP_RATE_LIMIT_PER_IP', 5))
+# Where buckets live: "memory" (per worker) or "mongo" (shared by all workers)
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+# Proxies in front of the app (e.g. 1 behind an ingress); the client IP is taken that many
+# X-Forwarded-For entries from the right. 0 uses the TCP peer, which behind a proxy puts
+# every client in one per-IP bucket
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', 0))
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get('COMPRESSION_MINIMUM_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 4))
+# Token for the admin routes and the X-Profile header; unset turns both off
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN') or None
+# Share of requests profiled without being asked to, e.g. 0.001
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILER = os.environ.get('PROFILER', profiling.CPROFILE)
+# How long /readyz waits for the Mongo ping
+READINESS_TIMEOUT_SECONDS = float(os.environ.get('READINESS_TIMEOUT_SECONDS', 2))
+# A sync number whose write has not landed after this long is given up on
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', 60))
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 1000))
+SYNC_PUSH_MAX_TRANSACTIONS = int(os.environ.get('SYNC_PUSH_MAX_TRANSACTIONS', 500))
+# Deletes are kept this long; clients that last synced earlier must start again from 0
+SYNC_TOMBSTONE_RETENTION_DAYS = float(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', sync.DEFAULT_RETENTION_DAYS))
+
+# Dashboard summaries per (profile, month), stamped with the profile's ledger version
+dashboard_cache = StampedLRUCache(DASHBOARD_CACHE_SIZE)
+
+# Category catalogue per profile, stamped with the profile's categories version
+category_catalogue = categories.CategoryCatalogue(CATEGORY_CACHE_SIZE)
+
+# Concurrent identical reads of a family share one computation
+request_flights = singleflight.SingleFlight(SINGLE_FLIGHT_TIMEOUT_SECONDS)
+
+# Live ledger events for connected family members of this worker
+event_broker = events.EventBroker()
+
+# Who changed what, written in batches off the request path
+audit_log = audit.AuditLog(db)
+
+# Per-profile change numbers and tombstones behind /api/sync
+sync_log = sync.SyncLog(db, transaction_store, SYNC_SETTLE_SECONDS, SYNC_TOMBSTONE_RETENTION_DAYS)
+
+# Saturation signals reported by /api/admin/stats
+loop_lag = health.LoopLagMonitor()
+request_gauge = health.RequestGauge()
+
+def rate_limit_rules(*limits):
+    return [ratelimit.Rule(scope, per_minute, per_minute) for scope, per_minute in limits if per_minute > 0]
+
+# Throttles the routes that do bcrypt work, before they do it
+rate_limiter = ratelimit.RateLimiter(
+    ratelimit.MongoBucketStore(db) if RATE_LIMIT_BACKEND == "mongo" else ratelimit.MemoryBucketStore(),
+    {
+        "/api/login": rate_limit_rules(
+            (ratelimit.IP, LOGIN_RATE_LIMIT_PER_IP), (ratelimit.EMAIL, LOGIN_RATE_LIMIT_PER_EMAIL)
+        ),
+        "/api/change-password": rate_limit_rules((ratelimit.IP, LOGIN_RATE_LIMIT_PER_IP)),
+        "/api/signup": rate_limit_rules((ratelimit.IP, SIGNUP_RATE_LIMIT_PER_IP)),
+    }
+)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db.connect()
+    slow_query_log.start(db.client)
+    await db.ensure_indexes()
+    await sync_log.ensure_indexes()
+    await initialize_categories()
+    audit_log.start()
+    if RECURRING_SCHEDULER_ENABLED:
+        recurring_scheduler.start()
+    if JOB_WORKERS:
+        job_queue.start()
+    if EVENTS_SOURCE == events.CHANGE_STREAM:
+        transaction_change_feed.start()
+    loop_lag.start()
+    # Indexes and default categories exist from here on
+    app.state.started_at = datetime.now(timezone.utc)
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        await loop_lag.stop()
+        await transaction_change_feed.stop()
+        await job_queue.stop()
+        await recurring_scheduler.stop()
+        await audit_log.stop()
+        db.close()
+
 # Create the main app without a prefix
-app = FastAPI(title="Budget Tracker API")
+app = FastAPI(title="Budget Tracker API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -66,6 +228,17 @@ class PaymentMode(str, Enum):
     CREDIT_CARD = "credit_card"
     DEBIT_CARD = "debit_card"
 
+class RecurrenceFrequency(str, Enum):
+    DAILY = recurring.DAILY
+    WEEKLY = recurring.WEEKLY
+    MONTHLY = recurring.MONTHLY
+    YEARLY = recurring.YEARLY
+
+class IncomeSource(str, Enum):
+    PROFILE_THEN_ACTUAL = cfr.PROFILE_THEN_ACTUAL  # Profile income, else the month's recorded income
+    PROFILE = cfr.PROFILE_ONLY
+    ACTUAL = cfr.ACTUAL_ONLY
+
 class FilterType(str, Enum):
     DAY = "day"
     WEEK = "week" 
@@ -116,14 +289,32 @@ class Token(BaseModel):
     user: Dict[str, Any]
 
 # Profile Models
+class CFRPolicy(BaseModel):
+    ratios: Dict[CategoryType, float] = {
+        CategoryType.NEEDS: cfr.DEFAULT_RATIOS[cfr.NEEDS],
+        CategoryType.WANTS: cfr.DEFAULT_RATIOS[cfr.WANTS],
+        CategoryType.SAVINGS: cfr.DEFAULT_RATIOS[cfr.SAVINGS]
+    }  # percent of monthly income
+    tolerance_percentage: float = cfr.DEFAULT_TOLERANCE
+    income_source: IncomeSource = IncomeSource.PROFILE_THEN_ACTUAL
+    fallback_income: Optional[float] = cfr.DEFAULT_FALLBACK_INCOME  # Used when no income is known
+
+class BudgetLimits(BaseModel):
+    category_limits: Dict[str, float] = {}  # category_id -> monthly limit
+    type_limits: Dict[CategoryType, float] = {}
+    alert_thresholds: List[float] = budgets.DEFAULT_ALERT_THRESHOLDS  # percent of the limit
+
 class FamilyMember(BaseModel):
+    # Stored in family_memberships, one document per (master profile, email)
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    master_profile_id: str
     user_id: Optional[str] = None  # Reference to User when account is created
     email: EmailStr
     first_name: str
     last_name: str
     relation: FamilyRelation
     is_registered: bool = False
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Profile(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -138,8 +329,15 @@ class Profile(BaseModel):
     account_type: AccountType
     is_master: bool = True
     master_profile_id: Optional[str] = None
-    family_members: List[FamilyMember] = []
     monthly_income: Optional[float] = None
+    budget_limits: BudgetLimits = Field(default_factory=BudgetLimits)
+    cfr_policy: CFRPolicy = Field(default_factory=CFRPolicy)
+    ledger_version: int = 0  # Bumped on every transaction write
+    categories_version: int = 0  # Bumped whenever the profile's custom categories change
+    members_version: int = 0  # Bumped whenever a family membership of the profile is written
+    budget_generation: Optional[str] = None  # Generation of the live budget counters
+    archived_before: Optional[str] = None  # Transactions dated before this live in the archive
+    archived_years: List[int] = []
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ProfileCreate(BaseModel):
@@ -167,6 +365,7 @@ class Category(BaseModel):
     name: str
     type: CategoryType
     is_custom: bool = False
+    profile_id: Optional[str] = None  # Owning master profile of a custom category
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Transaction(BaseModel):
@@ -181,6 +380,8 @@ class Transaction(BaseModel):
     bank_app: Optional[str] = None
     description: Optional[str] = None
     date: str
+    currency: Optional[str] = None  # Defaults to the profile currency
+    recurring_id: Optional[str] = None  # Template this occurrence was materialized from
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class TransactionCreate(BaseModel):
@@ -192,6 +393,13 @@ class TransactionCreate(BaseModel):
     bank_app: Optional[str] = None
     description: Optional[str] = None
     date: str
+    currency: Optional[str] = None
+
+class SyncPushTransaction(TransactionCreate):
+    id: str  # Generated by the client, so a retried push does not duplicate
+
+class SyncPush(BaseModel):
+    transactions: List[SyncPushTransaction]
 
 class TransactionUpdate(BaseModel):
     amount: Optional[float] = None
@@ -202,6 +410,48 @@ class TransactionUpdate(BaseModel):
     bank_app: Optional[str] = None
     description: Optional[str] = None
     date: Optional[str] = None
+    currency: Optional[str] = None
+
+class RecurringTransactionCreate(BaseModel):
+    amount: float
+    transaction_type: TransactionType
+    category_id: str
+    person_name: Optional[str] = None
+    payment_mode: PaymentMode
+    bank_app: Optional[str] = None
+    description: Optional[str] = None
+    currency: Optional[str] = None
+    frequency: RecurrenceFrequency
+    interval: int = Field(default=1, ge=1)
+    start_date: str  # YYYY-MM-DD, the first occurrence
+    end_date: Optional[str] = None
+    day_of_month: Optional[int] = Field(default=None, ge=1, le=31)  # Monthly/yearly; clamped to short months
+
+class RecurringTransaction(RecurringTransactionCreate):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    profile_id: str
+    user_id: str
+    active: bool = True
+    next_run_date: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class JobCreate(BaseModel):
+    type: str
+    params: Dict[str, Any] = {}
+
+class Job(BaseModel):
+    id: str
+    type: str
+    params: Dict[str, Any] = {}
+    status: str
+    attempts: int
+    max_attempts: int
+    progress: Dict[str, Any]
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
+    finished_at: Optional[str] = None
 
 class CFRAnalysis(BaseModel):
     category_type: CategoryType
@@ -226,6 +476,247 @@ def prepare_for_mongo(data):
                 data[key] = value.isoformat()
     return data
 
+def transaction_to_mongo(transaction_data: dict, currency: str):
+    """Store the amount as integer minor units of the transaction currency"""
+    data = prepare_for_mongo(transaction_data)
+    currency = normalize_currency(data.get("currency") or currency)
+    data["amount_minor"] = to_minor_units(data.pop("amount"), currency)
+    data["currency"] = currency
+    return data
+
+def transaction_from_mongo(data):
+    if "amount_minor" in data:
+        data["amount"] = from_minor_units(data["amount_minor"], data.get("currency"))
+    return data
+
+def budget_limits_to_mongo(limits: dict, currency: str):
+    return {
+        "category_limits_minor": {
+            category_id: to_minor_units(limit, currency) for category_id, limit in limits["category_limits"].items()
+        },
+        "type_limits_minor": {
+            CategoryType(category_type).value: to_minor_units(limit, currency)
+            for category_type, limit in limits["type_limits"].items()
+        },
+        "alert_thresholds": sorted(set(limits["alert_thresholds"]))
+    }
+
+def budget_limits_from_mongo(limits: dict, currency: str):
+    return {
+        "category_limits": {
+            category_id: from_minor_units(limit, currency) for category_id, limit in limits.get("category_limits_minor", {}).items()
+        },
+        "type_limits": {
+            category_type: from_minor_units(limit, currency) for category_type, limit in limits.get("type_limits_minor", {}).items()
+        },
+        "alert_thresholds": limits.get("alert_thresholds", budgets.DEFAULT_ALERT_THRESHOLDS)
+    }
+
+def cfr_policy_to_mongo(policy: dict, currency: str):
+    data = {
+        "ratios": {CategoryType(category_type).value: ratio for category_type, ratio in policy["ratios"].items()},
+        "tolerance_percentage": policy["tolerance_percentage"],
+        "income_source": IncomeSource(policy["income_source"]).value
+    }
+    fallback_income = policy.get("fallback_income")
+    data["fallback_income_minor"] = to_minor_units(fallback_income, currency) if fallback_income is not None else None
+    return data
+
+def cfr_policy_from_mongo(policy: dict, currency: str):
+    data = dict(policy)
+    if "fallback_income_minor" in data:
+        data["fallback_income"] = from_minor_units(data.pop("fallback_income_minor"), currency)
+    return data
+
+def compiled_cfr_policy(profile: Profile):
+    policy = profile.cfr_policy
+    return cfr.compile_policy(
+        tuple(sorted((CategoryType(category_type).value, ratio) for category_type, ratio in policy.ratios.items())),
+        policy.tolerance_percentage,
+        IncomeSource(policy.income_source).value,
+        policy.fallback_income
+    )
+
+def profile_to_mongo(profile_data: dict):
+    data = prepare_for_mongo(profile_data)
+    if "monthly_income" in data:
+        income = data.pop("monthly_income")
+        data["monthly_income_minor"] = to_minor_units(income, data.get("currency")) if income is not None else None
+    if "budget_limits" in data:
+        data["budget_limits"] = budget_limits_to_mongo(data["budget_limits"], data.get("currency"))
+    if "cfr_policy" in data:
+        data["cfr_policy"] = cfr_policy_to_mongo(data["cfr_policy"], data.get("currency"))
+    return data
+
+def profile_from_mongo(data):
+    if "monthly_income_minor" in data:
+        data["monthly_income"] = from_minor_units(data["monthly_income_minor"], data.get("currency"))
+    if "budget_limits" in data:
+        data["budget_limits"] = budget_limits_from_mongo(data["budget_limits"], data.get("currency"))
+    if "cfr_policy" in data:
+        data["cfr_policy"] = cfr_policy_from_mongo(data["cfr_policy"], data.get("currency"))
+    return data
+
+def month_bounds(month: str):
+    """Return the [start, end) date-string bounds of a YYYY-MM month"""
+    try:
+        month_start = datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid month, expected YYYY-MM")
+    next_month = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    # Dates are stored as YYYY-MM-DD or full ISO strings, both sort lexicographically
+    return month_start.strftime("%Y-%m"), next_month.strftime("%Y-%m")
+
+def resolve_date_range(month: Optional[str], start_date: Optional[str], end_date: Optional[str],
+                       max_days: Optional[int] = None):
+    """[start, end) date-string bounds from either a month or an inclusive date range"""
+    if start_date or end_date:
+        if not (start_date and end_date):
+            raise HTTPException(status_code=400, detail="start_date and end_date must be given together")
+        try:
+            start = datetime.strptime(start_date, "%Y-%m-%d")
+            end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+        if end <= start:
+            raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+        if max_days is not None and (end - start).days > max_days:
+            raise HTTPException(status_code=400, detail=f"The date range must not exceed {max_days} days")
+        return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+    return month_bounds(month or datetime.now(timezone.utc).strftime("%Y-%m"))
+
+def filter_date_range(
+    filter_type: FilterType,
+    year: int,
+    month: Optional[int] = None,
+    week: Optional[int] = None,
+    day: Optional[int] = None
+):
+    """[start, end) date-string bounds for the year/month/week/day filters.
+
+    Weeks are weeks of the month: week 1 is days 1-7, week 5 days 29 onwards.
+    A filter missing its month (or week/day) falls back to the whole year.
+    """
+    try:
+        if not month or (filter_type == FilterType.WEEK and not week) or (filter_type == FilterType.DAY and not day):
+            return f"{year:04d}", f"{year + 1:04d}"
+        month_start = datetime(year, month, 1)
+        month_end = shift_month(month_start, 1)
+        if filter_type == FilterType.WEEK:
+            start = month_start + timedelta(days=7 * (week - 1))
+            end = min(start + timedelta(days=7), month_end)
+        elif filter_type == FilterType.DAY:
+            start = datetime(year, month, day)
+            end = start + timedelta(days=1)
+        else:
+            start, end = month_start, month_end
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date filter")
+    return start.strftime("%Y-%m-%d"), max(start, end).strftime("%Y-%m-%d")
+
+async def category_map_for(profile: Profile):
+    """``{category_id: category}`` of the profile's catalogue; do not modify it"""
+    return await category_catalogue.category_map(repos.categories, profile.id, profile.categories_version)
+
+async def transaction_search_tokens(transaction: dict, profile: Profile):
+    category = (await category_map_for(profile)).get(transaction.get("category_id"))
+    return build_search_tokens(transaction, category["name"] if category else None)
+
+def ledger_row(transaction: dict, category_map: dict):
+    """Flatten a stored transaction for list views, with its category attached"""
+    clean_transaction = {
+        "id": transaction["id"],
+        "amount": transaction_from_mongo(transaction)["amount"],
+        "currency": transaction.get("currency"),
+        "transaction_type": transaction["transaction_type"],
+        "category_id": transaction["category_id"],
+        "person_name": transaction.get("person_name", ""),
+        "payment_mode": transaction["payment_mode"],
+        "bank_app": transaction.get("bank_app", ""),
+        "description": transaction.get("description", ""),
+        "date": transaction["date"],
+        "created_at": transaction["created_at"]
+    }
+    
+    # Add category information
+    category = category_map.get(transaction["category_id"])
+    clean_transaction["category_name"] = category["name"] if category else "Unknown"
+    clean_transaction["category_type"] = category["type"] if category else "unknown"
+    return clean_transaction
+
+def plain_value(value):
+    return value.value if isinstance(value, Enum) else value
+
+def shift_month(month_start: datetime, months: int):
+    month_index = month_start.year * 12 + month_start.month - 1 + months
+    return month_start.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
+def validate_transaction_currency(currency: Optional[str], profile: Profile):
+    """Reject currencies the rate table cannot convert into the profile currency"""
+    if currency is None or normalize_currency(currency) == normalize_currency(profile.currency):
+        return
+    rate_table = get_rate_table()
+    if not rate_table.supports(currency) or not rate_table.supports(profile.currency):
+        raise HTTPException(
+            status_code=400,
+            detail=f"No exchange rate available to convert {normalize_currency(currency)} to {normalize_currency(profile.currency)}"
+        )
+
+def validate_transaction_date(value: Optional[str]):
+    """Reject dates that are not YYYY-MM-DD, optionally followed by a time.
+
+    Budgets, exchange rates and date-range filters all read the first ten
+    characters as the day, so anything else is refused before it is stored.
+    """
+    if value is None:
+        return
+    try:
+        if len(value) < 10 or value[4] != "-" or value[7] != "-":
+            raise ValueError(value)
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date {value!r}, expected YYYY-MM-DD with an optional time")
+
+def amount_minor_expression(currency: str):
+    """Aggregation expression for a transaction's amount in minor units.
+
+    Falls back to the legacy float ``amount`` for rows not yet migrated.
+    """
+    factor = 10 ** currency_exponent(currency)
+    return {"$ifNull": [
+        "$amount_minor",
+        {"$toLong": {"$round": [{"$multiply": ["$amount", factor]}, 0]}}
+    ]}
+
+RECURRING_RULE_FIELDS = ("frequency", "interval", "start_date", "end_date", "day_of_month")
+RECURRING_TRANSACTION_FIELDS = (
+    "amount", "currency", "transaction_type", "category_id", "person_name", "payment_mode", "bank_app", "description"
+)
+
+def recurring_to_mongo(template: RecurringTransaction, currency: str):
+    """Store the rule and the transaction body as separate subdocuments"""
+    data = template.dict()
+    rule = {field: data.pop(field) for field in RECURRING_RULE_FIELDS}
+    body = transaction_to_mongo({field: data.pop(field) for field in RECURRING_TRANSACTION_FIELDS}, currency)
+    data = prepare_for_mongo(data)
+    data.update(rule=rule, transaction=body, next_index=0, lease_until=None)
+    return data
+
+def recurring_from_mongo(data):
+    body = transaction_from_mongo(dict(data["transaction"]))
+    fields = {field: data[field] for field in ("id", "profile_id", "user_id", "active", "next_run_date", "created_at")}
+    return {
+        **fields,
+        **data["rule"],
+        **{field: body.get(field) for field in RECURRING_TRANSACTION_FIELDS}
+    }
+
+def parse_iso_date(value: str, field: str):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {field}, expected YYYY-MM-DD")
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -243,8 +734,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await user_from_token(credentials.credentials)
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+async def user_from_token(token: str):
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
@@ -252,7 +751,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     
-    user = await db.users.find_one({"id": user_id})
+    user = await repos.users.get(user_id)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     return User(**user)
@@ -261,23 +760,24 @@ async def get_master_profile(user: User):
     """Get the master profile for a user or their family"""
     if user.is_family_member and user.master_user_id:
         # This is a family member, get the master profile
-        master_profile = await db.profiles.find_one({"user_id": user.master_user_id})
-        return Profile(**master_profile) if master_profile else None
+        master_profile = await repos.profiles.get_by_user(user.master_user_id)
+        return Profile(**profile_from_mongo(master_profile)) if master_profile else None
     else:
         # This is a master user, get their own profile
-        profile = await db.profiles.find_one({"user_id": user.id})
-        return Profile(**profile) if profile else None
+        profile = await repos.profiles.get_by_user(user.id)
+        return Profile(**profile_from_mongo(profile)) if profile else None
 
 async def get_all_family_members(profile_id: str):
     """Get all family members (including master) for a profile"""
-    profile = await db.profiles.find_one({"id": profile_id})
+    reader = MongoRepositories(db.reader(profile_id))
+    profile = await reader.profiles.get(profile_id)
     if not profile:
         return []
     
     members = []
     
     # Add the master user
-    master_user = await db.users.find_one({"id": profile["user_id"]})
+    master_user = await reader.users.get(profile["user_id"])
     if master_user:
         members.append({
             "id": master_user["id"],
@@ -287,21 +787,225 @@ async def get_all_family_members(profile_id: str):
             "is_master": True
         })
     
-    # Add family members who are registered
-    for family_member in profile.get("family_members", []):
-        if family_member.get("is_registered") and family_member.get("user_id"):
-            member_user = await db.users.find_one({"id": family_member["user_id"]})
-            if member_user:
-                members.append({
-                    "id": member_user["id"],
-                    "name": f"{member_user['first_name']} {member_user['last_name']}",
-                    "email": member_user["email"],
-                    "relation": family_member["relation"],
-                    "is_master": False
-                })
+    # Add family members who are registered, with one batched lookup
+    registered = await db.reader(profile_id).family_memberships.find(
+        {"master_profile_id": profile_id, "is_registered": True, "user_id": {"$ne": None}},
+        {"_id": 0, "user_id": 1, "relation": 1}
+    ).sort("created_at", 1).to_list(length=None)
+    member_users = await reader.users.get_many(
+        [family_member["user_id"] for family_member in registered]
+    )
+    users_by_id = {member_user["id"]: member_user for member_user in member_users}
+    for family_member in registered:
+        member_user = users_by_id.get(family_member["user_id"])
+        if member_user:
+            members.append({
+                "id": member_user["id"],
+                "name": f"{member_user['first_name']} {member_user['last_name']}",
+                "email": member_user["email"],
+                "relation": family_member["relation"],
+                "is_master": False
+            })
     
     return members
 
+async def coalesced(key: tuple, compute):
+    """Run ``compute()`` once for all concurrent requests with the same key"""
+    try:
+        return await request_flights.do(key, compute)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out computing the response")
+
+async def on_transaction_written(profile: Profile, before: Optional[dict], after: Optional[dict], user: User,
+                                 seq: Optional[int] = None, release: bool = True):
+    """Keep state derived from the ledger in step with one transaction write.
+
+    ``before``/``after`` are the stored documents around the write (None for
+    a create/delete respectively). ``seq`` is the sync number of a delete;
+    writes carry theirs on ``after``. Batch writers pass ``release=False``
+    and release their allocation once every row has been through here.
+    """
+    db.note_write(profile.id)
+    if seq is None and after is not None:
+        seq = after.get("seq")
+    if after is None and seq is not None:
+        await sync_log.tombstone(profile.id, before["id"], seq)
+    await audit_log.record(profile.id, "transaction", (after or before)["id"], user.id, before, after)
+    # Straight to Mongo: the version bump and the sync release are one update, and the
+    # counter generation is read after it so a concurrent rebuild either sees this write
+    # or swaps in a generation that gets its increment
+    bumped = await db.profiles.find_one_and_update(
+        {"id": profile.id},
+        {"$inc": {"ledger_version": 1}, **(sync.release_update(seq) if release else {})},
+        projection={"_id": 0, "budget_generation": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    await update_budget_counters(profile, before, after, user, (bumped or {}).get("budget_generation"))
+    if EVENTS_SOURCE == events.ROUTES and event_broker.has_subscribers(profile.id):
+        action = "created" if before is None else "deleted" if after is None else "updated"
+        await publish_transaction_event(profile, action, before, after)
+
+async def month_totals(profile: Profile, month: str):
+    month_start, month_end = month_bounds(month)
+    try:
+        grouped = await aggregate_ledger(
+            db.primary, profile, {"date": {"$gte": month_start, "$lt": month_end}},
+            {"transaction_type": "$transaction_type"}
+        )
+    except HTTPException:
+        return None
+    income = grouped.get((TransactionType.INCOME.value,), Decimal(0))
+    expenses = grouped.get((TransactionType.EXPENSE.value,), Decimal(0))
+    return {
+        "month": month,
+        "total_income": float(income),
+        "total_expenses": float(expenses),
+        "balance": float(income - expenses)
+    }
+
+async def publish_transaction_event(profile: Profile, action: str, before: Optional[dict], after: Optional[dict]):
+    """Broadcast a transaction delta and the refreshed totals of the months it touched"""
+    transaction = after or before
+    category_map = await category_map_for(profile)
+    
+    months = sorted({document["date"][:7] for document in (before, after) if document})
+    totals = [await month_totals(profile, month) for month in months]
+    event_broker.publish(profile.id, {
+        "type": f"transaction.{action}",
+        "transaction": ledger_row(dict(after), category_map) if after else {"id": transaction["id"]},
+        "month_totals": [month_total for month_total in totals if month_total]
+    })
+
+async def publish_change(action: str, before: Optional[dict], after: Optional[dict]):
+    """Change stream handler: publish writes made by any worker"""
+    profile_id = (after or before)["profile_id"]
+    if not event_broker.has_subscribers(profile_id):
+        return
+    profile_data = await repos.profiles.get(profile_id)
+    if profile_data:
+        await publish_transaction_event(Profile(**profile_from_mongo(profile_data)), action, before, after)
+
+transaction_change_feed = events.ChangeStreamFeed(db, publish_change, transaction_store.collection_name)
+
+async def update_budget_counters(profile: Profile, before: Optional[dict], after: Optional[dict], user: User,
+                                 generation: Optional[str]):
+    rate_table = get_rate_table()
+    category_map = await category_map_for(profile)
+    deltas = {}
+    for transaction, sign in ((before, -1), (after, 1)):
+        if not transaction:
+            continue
+        category = category_map.get(transaction["category_id"])
+        category_type = CategoryType(category["type"]).value if category else None
+        for month_key, amount in budgets.contributions(transaction, category_type, profile.currency, rate_table).items():
+            deltas[month_key] = deltas.get(month_key, 0) + sign * amount
+    
+    changes = await budgets.apply_deltas(db, profile.id, deltas, generation)
+    
+    limits = budget_limits_to_mongo(profile.budget_limits.dict(), profile.currency)
+    limit_by_key = {budgets.category_key(category_id): limit for category_id, limit in limits["category_limits_minor"].items()}
+    limit_by_key.update({budgets.type_key(category_type): limit for category_type, limit in limits["type_limits_minor"].items()})
+    
+    transaction_id = (after or before)["id"]
+    for (month, key), (spent_before, spent_after) in changes.items():
+        limit = limit_by_key.get(key)
+        if limit is None:
+            continue
+        crossed = budgets.crossed_thresholds(spent_before, spent_after, limit, limits["alert_thresholds"])
+        if crossed:
+            await budgets.record_alerts(db, profile.id, month, key, crossed, limit, spent_after, user.id, transaction_id)
+
+async def materialize_recurring(template: dict, dates: List[date]) -> int:
+    """Insert the occurrences of a recurring template on ``dates`` in one batch.
+
+    Occurrence ids are deterministic, so occurrences that already exist (a
+    pass that died before advancing the template) fail on the unique id
+    index and are skipped. Returns the number of rows actually inserted.
+    """
+    profile_data = await repos.profiles.get(template["profile_id"])
+    user_data = await repos.users.get(template["user_id"])
+    if not profile_data or not user_data:
+        return 0
+    profile = Profile(**profile_from_mongo(profile_data))
+    user = User(**user_data)
+    
+    body = template["transaction"]
+    search_tokens = await transaction_search_tokens(body, profile)
+    created_at = datetime.now(timezone.utc).isoformat()
+    documents = [
+        {
+            **body,
+            "id": recurring.occurrence_id(template["id"], when.isoformat()),
+            "profile_id": template["profile_id"],
+            "user_id": template["user_id"],
+            "date": when.isoformat(),
+            "recurring_id": template["id"],
+            "search_tokens": search_tokens,
+            "created_at": created_at
+        }
+        for when in dates
+    ]
+    first_seq = await sync_log.allocate(profile.id, len(documents))
+    for offset, document in enumerate(documents):
+        sync.stamp(document, first_seq + offset)
+    inserted = await repos.transactions.create_many(documents)
+    for document in inserted:
+        await on_transaction_written(profile, None, document, user, release=False)
+    # Released once every row is counted; skipped occurrences never reach on_transaction_written
+    await sync_log.release(profile.id, first_seq)
+    return len(inserted)
+
+# Materializes due recurring transactions in the background (started in the lifespan)
+recurring_scheduler = recurring.RecurringScheduler(db, materialize_recurring, RECURRING_INTERVAL_SECONDS)
+
+# Background jobs (workers started in the lifespan, or run by worker.py)
+job_queue = jobs.JobQueue(db, concurrency=JOB_WORKERS or 1, poll_interval=JOB_POLL_INTERVAL_SECONDS)
+
+# Job types a master account may start for its own profile
+PROFILE_JOB_TYPES = {"rebuild_budget_counters", "rebuild_search_tokens", "archive_transactions"}
+
+@job_queue.register("rebuild_budget_counters")
+async def rebuild_budget_counters_job(job: dict, progress):
+    profile = await repos.profiles.get(job["profile_id"])
+    if not profile:
+        raise ValueError("Profile not found")
+    await progress(0, 1, "Rebuilding budget counters")
+    currency = normalize_currency(profile.get("currency"))
+    rate_table = get_rate_table()
+    archived_totals = await archive.budget_totals(
+        db, job["profile_id"], currency, profile.get("archived_before"), rate_table
+    )
+    
+    async def ledger_state():
+        """Fields every ledger write changes, once no write is in flight"""
+        current = await db.profiles.find_one(
+            {"id": job["profile_id"]}, {"_id": 0, "sync_seq": 1, "sync_pending": 1, "ledger_version": 1}
+        )
+        if sync_log.settled_seq(current) != current.get("sync_seq", 0):
+            return None
+        return {"sync_seq": current.get("sync_seq"), "ledger_version": current.get("ledger_version")}
+    
+    counters = await budgets.rebuild_counters(
+        db, job["profile_id"], currency, rate_table, profile.get("archived_before"), archived_totals, ledger_state
+    )
+    await progress(1, 1, None)
+    return {"counters": counters}
+
+@job_queue.register("archive_transactions")
+async def archive_transactions_job(job: dict, progress):
+    profile = await repos.profiles.get(job["profile_id"])
+    if not profile:
+        raise ValueError("Profile not found")
+    horizon_months = int(job["params"].get("horizon_months", ARCHIVE_HORIZON_MONTHS))
+    if horizon_months < 1:
+        raise ValueError("horizon_months must be at least 1")
+    cutoff = archive.horizon_cutoff(datetime.now(timezone.utc).date(), horizon_months)
+    return await archive.archive_profile(db, profile, cutoff, get_rate_table(), progress=progress)
+
+@job_queue.register("rebuild_search_tokens")
+async def rebuild_search_tokens_job(job: dict, progress):
+    return await migrate_search_tokens(db, profile_id=job["profile_id"], progress=progress)
+
 # Initialize default categories
 DEFAULT_CATEGORIES = [
     # Needs
@@ -334,17 +1038,17 @@ DEFAULT_CATEGORIES = [
 
 async def initialize_categories():
     """Initialize default categories if they don't exist"""
-    existing_categories = await db.categories.count_documents({})
+    existing_categories = await repos.categories.count()
     if existing_categories == 0:
         category_objects = [Category(**cat, is_custom=False) for cat in DEFAULT_CATEGORIES]
-        categories_dict = [prepare_for_mongo(cat.dict()) for cat in category_objects]
-        await db.categories.insert_many(categories_dict)
+        for category in category_objects:
+            await repos.categories.create(prepare_for_mongo(category.dict()))
 
 # Authentication Routes
 @api_router.post("/signup", response_model=Token)
 async def signup(user_data: UserSignup):
     # Check if user already exists
-    existing_user = await db.users.find_one({"email": user_data.email})
+    existing_user = await repos.users.get_by_email(user_data.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -358,7 +1062,7 @@ async def signup(user_data: UserSignup):
     )
     
     user_dict = prepare_for_mongo(user.dict())
-    await db.users.insert_one(user_dict)
+    await repos.users.create(user_dict)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -379,7 +1083,7 @@ async def signup(user_data: UserSignup):
 
 @api_router.post("/login", response_model=Token)
 async def login(user_data: UserLogin):
-    user = await db.users.find_one({"email": user_data.email})
+    user = await repos.users.get_by_email(user_data.email)
     if not user or not verify_password(user_data.password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
@@ -410,17 +1114,12 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 async def update_current_user(user_update: UserUpdate, current_user: User = Depends(get_current_user)):
     # Check if email is being changed and if it's already taken
     if user_update.email != current_user.email:
-        existing_user = await db.users.find_one({"email": user_update.email})
+        existing_user = await repos.users.get_by_email(user_update.email)
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already registered")
     
     update_data = prepare_for_mongo(user_update.dict())
-    await db.users.update_one(
-        {"id": current_user.id},
-        {"$set": update_data}
-    )
-    
-    updated_user = await db.users.find_one({"id": current_user.id})
+    updated_user = await repos.users.update(current_user.id, update_data)
     return User(**updated_user)
 
 @api_router.post("/change-password")
@@ -431,9 +1130,8 @@ async def change_password(password_data: ChangePassword, current_user: User = De
     
     # Hash new password and update
     new_hashed_password = get_password_hash(password_data.new_password)
-    await db.users.update_one(
-        {"id": current_user.id},
-        {"$set": {"hashed_password": new_hashed_password, "must_change_password": False}}
+    await repos.users.update(
+        current_user.id, {"hashed_password": new_hashed_password, "must_change_password": False}
     )
     
     return {"message": "Password changed successfully"}
@@ -446,7 +1144,7 @@ async def add_family_member(member_data: AddFamilyMember, current_user: User = D
         raise HTTPException(status_code=403, detail="Only master accounts can add family members")
     
     # Check if user's profile exists and is family type
-    profile = await db.profiles.find_one({"user_id": current_user.id})
+    profile = await repos.profiles.get_by_user(current_user.id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
@@ -454,14 +1152,15 @@ async def add_family_member(member_data: AddFamilyMember, current_user: User = D
         raise HTTPException(status_code=400, detail="Profile must be set to family mode to add family members")
     
     # Check if email is already registered as a user
-    existing_user = await db.users.find_one({"email": member_data.email})
+    existing_user = await repos.users.get_by_email(member_data.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Check if email is already added as a family member
-    for existing_member in profile.get("family_members", []):
-        if existing_member["email"] == member_data.email:
-            raise HTTPException(status_code=400, detail="Family member already added")
+    if await db.family_memberships.find_one(
+        {"master_profile_id": profile["id"], "email": member_data.email}, {"_id": 1}
+    ):
+        raise HTTPException(status_code=400, detail="Family member already added")
     
     # Create user account for family member with default password
     hashed_password = get_password_hash(DEFAULT_FAMILY_PASSWORD)
@@ -477,10 +1176,11 @@ async def add_family_member(member_data: AddFamilyMember, current_user: User = D
     )
     
     user_dict = prepare_for_mongo(family_user.dict())
-    await db.users.insert_one(user_dict)
+    await repos.users.create(user_dict)
     
-    # Create family member record and add to profile
+    # Create the family membership of the master profile
     family_member = FamilyMember(
+        master_profile_id=profile["id"],
         user_id=family_user.id,
         email=member_data.email,
         first_name=member_data.first_name,
@@ -489,11 +1189,18 @@ async def add_family_member(member_data: AddFamilyMember, current_user: User = D
         is_registered=True
     )
     
-    # Add family member to profile
-    await db.profiles.update_one(
-        {"user_id": current_user.id},
-        {"$push": {"family_members": prepare_for_mongo(family_member.dict())}}
-    )
+    family_member_dict = prepare_for_mongo(family_member.dict())
+    try:
+        await db.family_memberships.insert_one(family_member_dict)
+    except DuplicateKeyError:
+        # Added concurrently by another request
+        await repos.users.delete(family_user.id)
+        raise HTTPException(status_code=400, detail="Family member already added")
+    family_member_dict.pop("_id", None)
+    # New member lists must not join a computation that started before the insert
+    await repos.profiles.increment(profile["id"], "members_version")
+    db.note_write(profile["id"])
+    await audit_log.record(profile["id"], "family_member", family_user.id, current_user.id, None, family_member_dict)
     
     return {
         "message": "Family member added successfully",
@@ -512,7 +1219,10 @@ async def get_family_members(current_user: User = Depends(get_current_user)):
     if not master_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    return await get_all_family_members(master_profile.id)
+    return await coalesced(
+        ("family-members", master_profile.id, master_profile.members_version),
+        lambda: get_all_family_members(master_profile.id)
+    )
 
 @api_router.get("/profile/family-status")
 async def get_family_status(current_user: User = Depends(get_current_user)):
@@ -534,7 +1244,7 @@ async def get_family_status(current_user: User = Depends(get_current_user)):
 @api_router.post("/profile", response_model=Profile)
 async def create_profile(profile_data: ProfileCreate, current_user: User = Depends(get_current_user)):
     # Check if user already has a profile
-    existing_profile = await db.profiles.find_one({"user_id": current_user.id})
+    existing_profile = await repos.profiles.get_by_user(current_user.id)
     if existing_profile:
         raise HTTPException(status_code=400, detail="Profile already exists")
     
@@ -543,20 +1253,21 @@ async def create_profile(profile_data: ProfileCreate, current_user: User = Depen
         email=current_user.email,
         **profile_data.dict()
     )
-    profile_dict = prepare_for_mongo(profile.dict())
-    await db.profiles.insert_one(profile_dict)
+    profile_dict = profile_to_mongo(profile.dict())
+    await repos.profiles.create(profile_dict)
+    await audit_log.record(profile.master_profile_id or profile.id, "profile", profile.id, current_user.id, None, profile_dict)
     return profile
 
 @api_router.get("/profile", response_model=Profile)
 async def get_my_profile(current_user: User = Depends(get_current_user)):
     if current_user.is_family_member and current_user.master_user_id:
         # Family member should get their own profile if it exists, otherwise create one linked to master
-        existing_profile = await db.profiles.find_one({"user_id": current_user.id})
+        existing_profile = await repos.profiles.get_by_user(current_user.id)
         if existing_profile:
-            return Profile(**existing_profile)
+            return Profile(**profile_from_mongo(existing_profile))
         
         # Get master profile to copy settings
-        master_profile = await db.profiles.find_one({"user_id": current_user.master_user_id})
+        master_profile = await repos.profiles.get_by_user(current_user.master_user_id)
         if not master_profile:
             raise HTTPException(status_code=404, detail="Master profile not found")
         
@@ -571,22 +1282,21 @@ async def get_my_profile(current_user: User = Depends(get_current_user)):
             account_type=AccountType.FAMILY,
             is_master=False,
             master_profile_id=master_profile["id"],
-            family_members=[],
             monthly_income=None
         )
         
-        profile_dict = prepare_for_mongo(family_profile.dict())
-        await db.profiles.insert_one(profile_dict)
+        profile_dict = profile_to_mongo(family_profile.dict())
+        await repos.profiles.create(profile_dict)
         return family_profile
     else:
-        profile = await db.profiles.find_one({"user_id": current_user.id})
+        profile = await repos.profiles.get_by_user(current_user.id)
         if not profile:
             raise HTTPException(status_code=404, detail="Profile not found")
-        return Profile(**profile)
+        return Profile(**profile_from_mongo(profile))
 
 @api_router.put("/profile", response_model=Profile)
 async def update_profile(profile_data: ProfileUpdate, current_user: User = Depends(get_current_user)):
-    existing_profile = await db.profiles.find_one({"user_id": current_user.id})
+    existing_profile = await repos.profiles.get_by_user(current_user.id)
     if not existing_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
@@ -594,28 +1304,174 @@ async def update_profile(profile_data: ProfileUpdate, current_user: User = Depen
     if current_user.is_family_member and profile_data.account_type == AccountType.INDIVIDUAL:
         raise HTTPException(status_code=403, detail="Family members cannot change account type to individual")
     
-    update_data = prepare_for_mongo(profile_data.dict())
-    await db.profiles.update_one(
-        {"user_id": current_user.id},
-        {"$set": update_data}
+    update_data = profile_to_mongo(profile_data.dict())
+    old_currency = normalize_currency(existing_profile.get("currency"))
+    currency_changed = normalize_currency(update_data.get("currency")) != old_currency
+    if currency_changed:
+        # Stored limits are minor units of the old currency, re-express them in the new one
+        rate_table = get_rate_table()
+        today = datetime.now(timezone.utc).date().isoformat()
+        if existing_profile.get("budget_limits"):
+            update_data["budget_limits"] = budgets.convert_limits(
+                existing_profile["budget_limits"], old_currency, update_data["currency"], rate_table, today
+            )
+        fallback_income_minor = (existing_profile.get("cfr_policy") or {}).get("fallback_income_minor")
+        if fallback_income_minor is not None:
+            update_data["cfr_policy"] = {
+                **existing_profile["cfr_policy"],
+                "fallback_income_minor": budgets.convert_amount_minor(
+                    fallback_income_minor, old_currency, update_data["currency"], rate_table, today
+                )
+            }
+    updated_profile = await repos.profiles.update(existing_profile["id"], update_data)
+    if currency_changed and existing_profile.get("is_master", True):
+        # Counters are kept in the profile currency too
+        await job_queue.enqueue("rebuild_budget_counters", {}, existing_profile["id"], current_user.id)
+    await audit_log.record(
+        existing_profile.get("master_profile_id") or existing_profile["id"], "profile", existing_profile["id"],
+        current_user.id, existing_profile, updated_profile
     )
+    return Profile(**profile_from_mongo(updated_profile))
+
+@api_router.get("/profile/cfr-policy", response_model=CFRPolicy)
+async def get_cfr_policy(current_user: User = Depends(get_current_user)):
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return master_profile.cfr_policy
+
+@api_router.put("/profile/cfr-policy", response_model=CFRPolicy)
+async def update_cfr_policy(policy: CFRPolicy, current_user: User = Depends(get_current_user)):
+    if current_user.is_family_member:
+        raise HTTPException(status_code=403, detail="Only master accounts can change the CFR policy")
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
     
-    updated_profile = await db.profiles.find_one({"user_id": current_user.id})
-    return Profile(**updated_profile)
+    if set(policy.ratios) != set(CategoryType):
+        raise HTTPException(status_code=400, detail="Ratios are required for needs, wants and savings")
+    if any(ratio < 0 for ratio in policy.ratios.values()) or sum(policy.ratios.values()) > 100:
+        raise HTTPException(status_code=400, detail="Ratios must be non-negative and add up to at most 100")
+    if policy.tolerance_percentage < 0:
+        raise HTTPException(status_code=400, detail="Tolerance must not be negative")
+    if policy.fallback_income is not None and policy.fallback_income < 0:
+        raise HTTPException(status_code=400, detail="Fallback income must not be negative")
+    
+    cfr_policy_data = cfr_policy_to_mongo(policy.dict(), master_profile.currency)
+    await repos.profiles.update(master_profile.id, {"cfr_policy": cfr_policy_data})
+    await audit_log.record(
+        master_profile.id, "profile", master_profile.id, current_user.id,
+        {"cfr_policy": cfr_policy_to_mongo(master_profile.cfr_policy.dict(), master_profile.currency)},
+        {"cfr_policy": cfr_policy_data}
+    )
+    return policy
 
 # Category Routes
 @api_router.get("/categories", response_model=List[Category])
-async def get_categories():
-    categories = await db.categories.find().to_list(length=None)
-    return [Category(**category) for category in categories]
+async def get_categories(current_user: User = Depends(get_current_user)):
+    """The default categories plus the custom ones of the user's family"""
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        return [Category(**category) for category in await repos.categories.list()]
+    return [Category(**category) for category in (await category_map_for(master_profile)).values()]
 
 @api_router.post("/categories", response_model=Category)
 async def create_category(name: str, category_type: CategoryType, current_user: User = Depends(get_current_user)):
-    category = Category(name=name, type=category_type, is_custom=True)
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found. Please create a profile first.")
+    
+    category = Category(name=name, type=category_type, is_custom=True, profile_id=master_profile.id)
     category_dict = prepare_for_mongo(category.dict())
-    await db.categories.insert_one(category_dict)
+    await repos.categories.create(category_dict)
+    await repos.profiles.increment(master_profile.id, "categories_version")
+    await audit_log.record(master_profile.id, "category", category.id, current_user.id, None, category_dict)
     return category
 
+# Budget Routes
+@api_router.get("/budgets", response_model=BudgetLimits)
+async def get_budget_limits(current_user: User = Depends(get_current_user)):
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return master_profile.budget_limits
+
+@api_router.put("/budgets", response_model=BudgetLimits)
+async def update_budget_limits(limits: BudgetLimits, current_user: User = Depends(get_current_user)):
+    if current_user.is_family_member:
+        raise HTTPException(status_code=403, detail="Only master accounts can change budget limits")
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if any(limit <= 0 for limit in [*limits.category_limits.values(), *limits.type_limits.values()]):
+        raise HTTPException(status_code=400, detail="Budget limits must be positive")
+    if any(threshold <= 0 or threshold > 1000 for threshold in limits.alert_thresholds):
+        raise HTTPException(status_code=400, detail="Alert thresholds must be percentages between 0 and 1000")
+    if limits.category_limits:
+        if not set(limits.category_limits) <= (await category_map_for(master_profile)).keys():
+            raise HTTPException(status_code=400, detail="Unknown category in budget limits")
+    
+    budget_limits_data = budget_limits_to_mongo(limits.dict(), master_profile.currency)
+    await repos.profiles.update(master_profile.id, {"budget_limits": budget_limits_data})
+    await audit_log.record(
+        master_profile.id, "profile", master_profile.id, current_user.id,
+        {"budget_limits": budget_limits_to_mongo(master_profile.budget_limits.dict(), master_profile.currency)},
+        {"budget_limits": budget_limits_data}
+    )
+    return limits
+
+@api_router.get("/budgets/alerts")
+async def get_budget_alerts(current_user: User = Depends(get_current_user), month: Optional[str] = None):
+    """Spend against every limit for a month, plus the alerts triggered so far"""
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if not month:
+        month = datetime.now(timezone.utc).strftime("%Y-%m")
+    month_bounds(month)  # Validates the format
+    
+    limits = budget_limits_to_mongo(master_profile.budget_limits.dict(), master_profile.currency)
+    counters = await budgets.month_counters(db, master_profile.id, month, master_profile.budget_generation)
+    category_names = {category["id"]: category["name"] for category in (await category_map_for(master_profile)).values()}
+    
+    limit_entries = [
+        ("category", category_id, category_names.get(category_id, "Unknown"), budgets.category_key(category_id), limit)
+        for category_id, limit in limits["category_limits_minor"].items()
+    ] + [
+        ("type", category_type, category_type, budgets.type_key(category_type), limit)
+        for category_type, limit in limits["type_limits_minor"].items()
+    ]
+    
+    status = []
+    for scope, target, name, key, limit in limit_entries:
+        spent = counters.get(key, 0)
+        status.append({
+            "scope": scope,
+            "target": target,
+            "name": name,
+            "limit": from_minor_units(limit, master_profile.currency),
+            "spent": from_minor_units(spent, master_profile.currency),
+            "used_percentage": spent * 100 / limit,
+            "over_budget": spent > limit
+        })
+    
+    alerts = await db.budget_alerts.find(
+        {"profile_id": master_profile.id, "month": month}, {"_id": 0, "profile_id": 0}
+    ).sort("created_at", -1).to_list(length=None)
+    for alert in alerts:
+        alert["limit"] = from_minor_units(alert.pop("limit_minor"), master_profile.currency)
+        alert["spent"] = from_minor_units(alert.pop("spent_minor"), master_profile.currency)
+    
+    return {
+        "month": month,
+        "currency": normalize_currency(master_profile.currency),
+        "budgets": status,
+        "over_budget": [entry for entry in status if entry["over_budget"]],
+        "alerts": alerts
+    }
+
 # Transaction Routes
 @api_router.post("/transactions", response_model=Transaction)
 async def create_transaction(transaction_data: TransactionCreate, current_user: User = Depends(get_current_user)):
@@ -624,13 +1480,20 @@ async def create_transaction(transaction_data: TransactionCreate, current_user:
     if not master_profile:
         raise HTTPException(status_code=404, detail="Profile not found. Please create a profile first.")
     
+    validate_transaction_currency(transaction_data.currency, master_profile)
+    validate_transaction_date(transaction_data.date)
+    
     transaction = Transaction(
         profile_id=master_profile.id,  # Always use master profile for shared access
         user_id=current_user.id,      # Track who created the transaction
         **transaction_data.dict()
     )
-    transaction_dict = prepare_for_mongo(transaction.dict())
-    await db.transactions.insert_one(transaction_dict)
+    transaction_dict = transaction_to_mongo(transaction.dict(), master_profile.currency)
+    transaction.currency = transaction_dict["currency"]
+    transaction_dict["search_tokens"] = await transaction_search_tokens(transaction_dict, master_profile)
+    sync.stamp(transaction_dict, await sync_log.allocate(master_profile.id))
+    await repos.transactions.create(transaction_dict)
+    await on_transaction_written(master_profile, None, transaction_dict, current_user)
     return transaction
 
 @api_router.get("/transactions", response_model=List[Transaction])
@@ -639,9 +1502,12 @@ async def get_my_transactions(current_user: User = Depends(get_current_user)):
     if not master_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    # Get all transactions for the family (using master profile)
-    transactions = await db.transactions.find({"profile_id": master_profile.id}).to_list(length=None)
-    return [Transaction(**transaction) for transaction in transactions]
+    # Get all transactions for the family (using master profile), archived years included
+    transactions = await archive.find_documents(
+        db, master_profile.id, master_profile.archived_years, *archive.FULL_RANGE
+    )
+    # Returned as a response so the models are encoded once, by orjson
+    return ORJSONResponse([Transaction(**transaction_from_mongo(transaction)) for transaction in transactions])
 
 @api_router.get("/transactions/available-filters")
 async def get_available_filters(current_user: User = Depends(get_current_user)):
@@ -650,8 +1516,27 @@ async def get_available_filters(current_user: User = Depends(get_current_user)):
     if not master_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    # Get all transactions for the family
-    transactions = await db.transactions.find({"profile_id": master_profile.id}).to_list(length=None)
+    return await coalesced(
+        ("available-filters", master_profile.id, master_profile.ledger_version),
+        lambda: compute_available_filters(master_profile)
+    )
+
+async def compute_available_filters(master_profile: Profile):
+    # One row per distinct day of the live transactions, grouped in the database
+    reader = db.reader(master_profile.id)
+    transactions = await transaction_store.collection(reader).aggregate([
+        {"$match": {"profile_id": master_profile.id}},
+        {"$group": {"_id": {"$substrBytes": ["$date", 0, 10]}}},
+        {"$project": {"_id": 0, "date": "$_id"}}
+    ]).to_list(length=None)
+    
+    # Archived months are known from their summaries
+    summaries = await reader.monthly_summaries.find(
+        {"profile_id": master_profile.id, "count": {"$gt": 0}}, {"_id": 0, "month": 1, "days": 1}
+    ).to_list(length=None)
+    transactions += [
+        {"date": f"{summary['month']}-{day:02d}"} for summary in summaries for day in summary["days"]
+    ]
     
     available_years = set()
     available_months = {}  # year -> [months]
@@ -708,72 +1593,21 @@ async def get_filtered_transactions(
     if not master_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    # Get all transactions for the family
-    all_transactions = await db.transactions.find({"profile_id": master_profile.id}).to_list(length=None)
-    
-    # Get categories for mapping
-    categories = await db.categories.find().to_list(length=None)
-    category_map = {cat["id"]: cat for cat in categories}
+    range_start, range_end = filter_date_range(filter_type, year, month, week, day)
+    reader = db.reader(master_profile.id)
     
-    # Filter transactions based on criteria
-    filtered_transactions = []
+    # Only the requested range, straight off the (profile_id, date) index,
+    # plus the archive years the range reaches into
+    transactions = await archive.find_documents(
+        reader, master_profile.id, master_profile.archived_years, range_start, range_end
+    )
     
-    for transaction in all_transactions:
-        try:
-            # Handle date parsing safely - support both ISO format and date-only format
-            date_str = transaction["date"]
-            if 'T' in date_str:
-                date_str = date_str.split('T')[0]
-            transaction_date = datetime.fromisoformat(date_str)
-        except (ValueError, AttributeError):
-            # Skip invalid dates
-            continue
-        
-        # Check year
-        if transaction_date.year != year:
-            continue
-            
-        if filter_type == FilterType.MONTH and month:
-            if transaction_date.month != month:
-                continue
-        elif filter_type == FilterType.WEEK and week and month:
-            # Calculate week of month
-            if transaction_date.month != month:
-                continue
-            first_day = datetime(year, month, 1)
-            days_offset = (transaction_date - first_day).days
-            week_of_month = (days_offset // 7) + 1
-            if week_of_month != week:
-                continue
-        elif filter_type == FilterType.DAY and day and month:
-            if transaction_date.month != month or transaction_date.day != day:
-                continue
-        
-        # Create a clean transaction object for response
-        clean_transaction = {
-            "id": transaction["id"],
-            "amount": transaction["amount"],
-            "transaction_type": transaction["transaction_type"],
-            "category_id": transaction["category_id"],
-            "person_name": transaction.get("person_name", ""),
-            "payment_mode": transaction["payment_mode"],
-            "bank_app": transaction.get("bank_app", ""),
-            "description": transaction.get("description", ""),
-            "date": transaction["date"],
-            "created_at": transaction["created_at"]
-        }
-        
-        # Add category information
-        category = category_map.get(transaction["category_id"])
-        clean_transaction["category_name"] = category["name"] if category else "Unknown"
-        clean_transaction["category_type"] = category["type"] if category else "unknown"
-        
-        filtered_transactions.append(clean_transaction)
+    # Get categories for mapping
+    category_map = await category_map_for(master_profile)
     
-    # Sort by date descending
-    filtered_transactions.sort(key=lambda x: x["date"], reverse=True)
+    filtered_transactions = [ledger_row(transaction, category_map) for transaction in transactions]
     
-    return {
+    return ORJSONResponse({
         "transactions": filtered_transactions,
         "total_count": len(filtered_transactions),
         "filter_applied": {
@@ -783,6 +1617,112 @@ async def get_filtered_transactions(
             "week": week,
             "day": day
         }
+    })
+
+EXPORT_COLUMNS = [
+    "id", "date", "transaction_type", "category_name", "category_type", "amount", "currency",
+    "payment_mode", "bank_app", "person_name", "description", "user_id"
+]
+
+@api_router.get("/transactions/export")
+async def export_transactions(
+    current_user: User = Depends(get_current_user),
+    month: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """CSV of a period's transactions, oldest first, archived ones included"""
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    range_start, range_end = resolve_date_range(month, start_date, end_date)
+    reader = db.reader(master_profile.id)
+    category_map = await category_map_for(master_profile)
+    
+    async def rows():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        written = 0
+        async for transaction in archive.iterate_documents(
+            reader, master_profile.id, master_profile.archived_years, range_start, range_end
+        ):
+            row = ledger_row(transaction, category_map)
+            row["user_id"] = transaction.get("user_id")
+            writer.writerow({key: plain_value(value) for key, value in row.items()})
+            written += 1
+            # Flush in chunks rather than per row or all at once
+            if written % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    return StreamingResponse(
+        rows(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="transactions_{range_start}_{range_end}.csv"'}
+    )
+
+@api_router.get("/transactions/search")
+async def search_transactions(
+    q: str,
+    filter_type: Optional[FilterType] = None,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    week: Optional[int] = None,
+    day: Optional[int] = None,
+    page: int = 1,
+    page_size: int = 20,
+    current_user: User = Depends(get_current_user)
+):
+    """Prefix search over description, person, bank/app and category name"""
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    terms = query_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+    if page < 1 or page_size < 1 or page_size > 100:
+        raise HTTPException(status_code=400, detail="page must be >= 1 and page_size between 1 and 100")
+    
+    range_start, range_end = archive.FULL_RANGE
+    if year is None and any(value is not None for value in (filter_type, month, week, day)):
+        raise HTTPException(status_code=400, detail="filter_type, month, week and day require year")
+    if year is not None:
+        range_start, range_end = filter_date_range(filter_type or FilterType.MONTH, year, month, week, day)
+    
+    reader = db.reader(master_profile.id)
+    # Rank the most recent matches, archived years included; very broad queries
+    # are capped rather than fully scored
+    candidates = await archive.find_documents(
+        reader, master_profile.id, master_profile.archived_years, range_start, range_end,
+        projection={"search_tokens": 0},
+        match={"search_tokens": {"$all": terms}},
+        limit=SEARCH_CANDIDATE_LIMIT
+    )
+    
+    category_map = await category_map_for(master_profile)
+    
+    ranked = []
+    for transaction in candidates:
+        row = ledger_row(transaction, category_map)
+        row["score"] = search_score(transaction, row["category_name"], terms)
+        ranked.append(row)
+    # Stable sort keeps the date order among equal scores
+    ranked.sort(key=lambda row: row["score"], reverse=True)
+    
+    offset = (page - 1) * page_size
+    return {
+        "query": q,
+        "terms": terms,
+        "transactions": ranked[offset:offset + page_size],
+        "total_count": len(ranked),
+        "truncated": len(candidates) == SEARCH_CANDIDATE_LIMIT,
+        "page": page,
+        "page_size": page_size
     }
 
 @api_router.put("/transactions/{transaction_id}", response_model=Transaction)
@@ -796,25 +1736,39 @@ async def update_transaction(
     if not master_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    existing_transaction = await db.transactions.find_one({
-        "id": transaction_id,
-        "profile_id": master_profile.id
-    })
+    existing_transaction = await repos.transactions.get(transaction_id, master_profile.id)
     
     if not existing_transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
+    validate_transaction_date(transaction_data.date)
     # Update only provided fields
     update_data = {k: v for k, v in transaction_data.dict().items() if v is not None}
     update_data = prepare_for_mongo(update_data)
-    
-    await db.transactions.update_one(
-        {"id": transaction_id},
-        {"$set": update_data}
-    )
-    
-    updated_transaction = await db.transactions.find_one({"id": transaction_id})
-    return Transaction(**updated_transaction)
+    if "amount" in update_data or "currency" in update_data:
+        validate_transaction_currency(update_data.get("currency"), master_profile)
+        # Re-express the amount whenever the currency (and so its exponent) changes
+        amount = update_data.pop("amount", None)
+        if amount is None:
+            amount = transaction_from_mongo(existing_transaction)["amount"]
+        currency = normalize_currency(
+            update_data.get("currency") or existing_transaction.get("currency") or master_profile.currency
+        )
+        update_data["amount_minor"] = to_minor_units(amount, currency)
+        update_data["currency"] = currency
+    if update_data.keys() & {"description", "person_name", "bank_app", "category_id"}:
+        update_data["search_tokens"] = await transaction_search_tokens({**existing_transaction, **update_data}, master_profile)
+    
+    seq = await sync_log.allocate(master_profile.id)
+    sync.stamp(update_data, seq)
+    # Read the updated document back from the primary (one round trip in the documents layout)
+    updated_transaction = await repos.transactions.update(transaction_id, update_data, master_profile.id)
+    if not updated_transaction:
+        # Deleted in the meantime
+        await sync_log.release(master_profile.id, seq)
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    await on_transaction_written(master_profile, existing_transaction, updated_transaction, current_user)
+    return Transaction(**transaction_from_mongo(updated_transaction))
 
 @api_router.delete("/transactions/{transaction_id}")
 async def delete_transaction(transaction_id: str, current_user: User = Depends(get_current_user)):
@@ -823,126 +1777,642 @@ async def delete_transaction(transaction_id: str, current_user: User = Depends(g
     if not master_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    result = await db.transactions.delete_one({
-        "id": transaction_id,
-        "profile_id": master_profile.id
-    })
+    seq = await sync_log.allocate(master_profile.id)
+    deleted_transaction = await repos.transactions.delete(transaction_id, master_profile.id)
     
-    if result.deleted_count == 0:
+    if not deleted_transaction:
+        await sync_log.release(master_profile.id, seq)
         raise HTTPException(status_code=404, detail="Transaction not found")
     
+    await on_transaction_written(master_profile, deleted_transaction, None, current_user, seq=seq)
     return {"message": "Transaction deleted successfully"}
 
-# Dashboard Routes
-@api_router.get("/dashboard")
-async def get_dashboard_summary(current_user: User = Depends(get_current_user), month: Optional[str] = None):
+# Sync Routes
+@api_router.get("/sync")
+async def sync_transactions(
+    since: int = 0,
+    limit: int = SYNC_PAGE_SIZE,
+    page: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Transactions written and deleted after the cursor ``since``.
+
+    ``since`` 0 pages through the whole ledger; pass the returned ``page``
+    back until ``has_more`` is false, then keep ``cursor``. A 409 means the
+    client must start again from 0.
+    """
     master_profile = await get_master_profile(current_user)
     if not master_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
+    if since < 0 or limit < 1 or limit > SYNC_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"since must be >= 0 and limit between 1 and {SYNC_PAGE_SIZE}")
+    if page is not None and since != 0:
+        raise HTTPException(status_code=400, detail="page only continues a sync from 0")
     
-    if not month:
-        month = datetime.now(timezone.utc).strftime("%Y-%m")
-    
-    # Get transactions for the family
-    transactions = await db.transactions.find({"profile_id": master_profile.id}).to_list(length=None)
+    try:
+        changes = await sync_log.changes(master_profile.id, since, limit, page)
+    except sync.ResyncRequired as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    changes["transactions"] = [
+        Transaction(**transaction_from_mongo(transaction)) for transaction in changes["transactions"]
+    ]
+    return ORJSONResponse(changes)
+
+@api_router.post("/sync/push")
+async def push_transactions(push: SyncPush, current_user: User = Depends(get_current_user)):
+    """Create transactions recorded offline; ids already stored or deleted are skipped"""
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found. Please create a profile first.")
+    if len(push.transactions) > SYNC_PUSH_MAX_TRANSACTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {SYNC_PUSH_MAX_TRANSACTIONS} transactions per push")
     
-    # Filter transactions for the current month
-    month_transactions = []
-    for t in transactions:
+    ids = [transaction_data.id for transaction_data in push.transactions]
+    for transaction_id in ids:
         try:
-            # Handle both ISO datetime and date-only formats
-            date_str = t["date"]
-            if 'T' in date_str:
-                date_str = date_str.split('T')[0]
-            if date_str.startswith(month):
-                month_transactions.append(t)
-        except (ValueError, AttributeError):
+            uuid.UUID(transaction_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Transaction id {transaction_id!r} is not a UUID")
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Transaction ids must be unique within a push")
+    for transaction_data in push.transactions:
+        validate_transaction_currency(transaction_data.currency, master_profile)
+        validate_transaction_date(transaction_data.date)
+    
+    deleted = await sync_log.deleted_ids(master_profile.id, ids)
+    documents = []
+    for transaction_data in push.transactions:
+        if transaction_data.id in deleted:
             continue
+        transaction = Transaction(profile_id=master_profile.id, user_id=current_user.id, **transaction_data.dict())
+        transaction_dict = transaction_to_mongo(transaction.dict(), master_profile.currency)
+        transaction_dict["search_tokens"] = await transaction_search_tokens(transaction_dict, master_profile)
+        documents.append(transaction_dict)
+    
+    inserted = []
+    if documents:
+        first_seq = await sync_log.allocate(master_profile.id, len(documents))
+        for offset, document in enumerate(documents):
+            sync.stamp(document, first_seq + offset)
+        inserted = await repos.transactions.create_many(documents)
+        for document in inserted:
+            await on_transaction_written(master_profile, None, document, current_user, release=False)
+        await sync_log.release(master_profile.id, first_seq)
+    
+    created = {document["id"] for document in inserted}
+    return {
+        "created": [transaction_id for transaction_id in ids if transaction_id in created],
+        "existing": [transaction_id for transaction_id in ids if transaction_id not in created and transaction_id not in deleted],
+        "deleted": [transaction_id for transaction_id in ids if transaction_id in deleted]
+    }
+
+# Recurring Transaction Routes
+@api_router.post("/recurring-transactions", response_model=RecurringTransaction)
+async def create_recurring_transaction(
+    template_data: RecurringTransactionCreate,
+    current_user: User = Depends(get_current_user)
+):
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found. Please create a profile first.")
     
-    total_income = sum(t["amount"] for t in month_transactions if t["transaction_type"] == TransactionType.INCOME)
-    total_expenses = sum(t["amount"] for t in month_transactions if t["transaction_type"] == TransactionType.EXPENSE)
+    validate_transaction_currency(template_data.currency, master_profile)
+    start_date = parse_iso_date(template_data.start_date, "start_date")
+    if template_data.end_date and parse_iso_date(template_data.end_date, "end_date") < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if template_data.category_id not in await category_map_for(master_profile):
+        raise HTTPException(status_code=400, detail="Category not found")
     
-    # Calculate CFR analysis based on income percentages
-    monthly_income = master_profile.monthly_income or total_income or 10000  # Default fallback
+    template = RecurringTransaction(
+        profile_id=master_profile.id,
+        user_id=current_user.id,
+        **template_data.dict()
+    )
+    template_dict = recurring_to_mongo(template, master_profile.currency)
+    template.currency = template_dict["transaction"]["currency"]
+    template.next_run_date = template_dict["next_run_date"] = recurring.next_run_date(template_dict["rule"], 0)
+    template.active = template_dict["active"] = template.next_run_date is not None
+    await db.recurring_transactions.insert_one(template_dict)
+    
+    # Materialize anything already due (e.g. a start date in the past) right away
+    if template.active and RECURRING_SCHEDULER_ENABLED:
+        recurring_scheduler.wake()
+    return template
+
+@api_router.get("/recurring-transactions", response_model=List[RecurringTransaction])
+async def get_recurring_transactions(current_user: User = Depends(get_current_user)):
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        return []
     
-    # Ensure monthly_income is not None or 0
-    if not monthly_income or monthly_income <= 0:
-        monthly_income = 10000  # Default value
+    templates = await db.recurring_transactions.find(
+        {"profile_id": master_profile.id}, {"_id": 0}
+    ).sort("created_at", -1).to_list(length=None)
+    return [RecurringTransaction(**recurring_from_mongo(template)) for template in templates]
+
+@api_router.delete("/recurring-transactions/{template_id}")
+async def delete_recurring_transaction(template_id: str, current_user: User = Depends(get_current_user)):
+    """Stop a recurring transaction; occurrences already materialized are kept"""
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    result = await db.recurring_transactions.delete_one({"id": template_id, "profile_id": master_profile.id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Recurring transaction not found")
+    return {"message": "Recurring transaction deleted successfully"}
+
+# Job Routes
+@api_router.post("/jobs", response_model=Job)
+async def create_job(job_data: JobCreate, current_user: User = Depends(get_current_user)):
+    if current_user.is_family_member:
+        raise HTTPException(status_code=403, detail="Only master accounts can start jobs")
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if job_data.type not in PROFILE_JOB_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown job type: {job_data.type}")
+    
+    job = await job_queue.enqueue(job_data.type, job_data.params, master_profile.id, current_user.id)
+    return Job(**job)
+
+@api_router.get("/jobs", response_model=List[Job])
+async def get_jobs(current_user: User = Depends(get_current_user), limit: int = 20):
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        return []
+    
+    recent_jobs = await db.jobs.find(
+        {"profile_id": master_profile.id}, {"_id": 0}
+    ).sort("created_at", -1).limit(min(max(limit, 1), 100)).to_list(length=None)
+    return [Job(**job) for job in recent_jobs]
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    job = await db.jobs.find_one({"id": job_id, "profile_id": master_profile.id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return Job(**job)
+
+async def aggregate_ledger(reader, profile: Profile, match: dict, group_by: dict):
+    """Group a profile's transactions in Mongo and total them in the profile currency.
+
+    Returns ``{key: Decimal}`` where key is the tuple of ``group_by`` values.
+    Rows already in the profile currency are summed exactly by the database;
+    rows in other currencies are also grouped by day and converted at that
+    day's rate in one vectorized pass over the (few) resulting groups.
+    Ranges reaching back into archived years also read the archive.
+    """
+    currency = normalize_currency(profile.currency)
+    row_currency = {"$ifNull": ["$currency", currency]}
+    
+    def pipeline(source_match: dict):
+        return [
+            {"$match": {"profile_id": profile.id, **source_match}},
+            {"$group": {
+                "_id": {
+                    **group_by,
+                    "currency": row_currency,
+                    "day": {"$cond": [{"$eq": [row_currency, currency]}, None, {"$substrBytes": ["$date", 0, 10]}]}
+                },
+                "amount_minor": {"$sum": amount_minor_expression(currency)}
+            }}
+        ]
+    
+    sources = [(transaction_store.collection(reader), transaction_store.translate(match))]
+    archived_totals = {}
+    range_start, range_end = match.get("date", {}).get("$gte"), match.get("date", {}).get("$lt")
+    years = archive.years_in_range(profile.archived_years, range_start, range_end) if range_start and range_end else []
+    if years:
+        # Whole archived months are read from their summaries, anything
+        # else (partial months, rows still being moved) from the archive
+        archived_end = min(range_end, profile.archived_before or range_start)
+        if range_start < archived_end and archive.month_aligned(range_start) and archive.month_aligned(archived_end):
+            summarized = await archive.summary_totals(reader, profile.id, currency, range_start, archived_end, list(group_by))
+            if summarized is not None:
+                archived_totals = summarized
+                range_start = archived_end
+        archive_match = {**match, "date": {"$gte": range_start, "$lt": range_end}}
+        for year in archive.years_in_range(years, range_start, range_end):
+            sources.append((reader[archive.collection_name(year)], archive_match))
+    
+    results = await asyncio.gather(*(
+        collection.aggregate(pipeline(source_match)).to_list(length=None) for collection, source_match in sources
+    ))
+    groups = [group for result in results for group in result]
+    
+    foreign_groups = [group for group in groups if group["_id"]["currency"] != currency]
+    if foreign_groups:
+        try:
+            converted = get_rate_table().convert_minor_units(
+                [group["amount_minor"] for group in foreign_groups],
+                [group["_id"]["currency"] for group in foreign_groups],
+                [group["_id"]["day"] for group in foreign_groups],
+                currency
+            )
+        except MissingRateError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        for group, amount_minor in zip(foreign_groups, converted):
+            group["amount_minor"] = int(amount_minor)
+    
+    totals = dict(archived_totals)
+    for group in groups:
+        key = tuple(group["_id"].get(field) for field in group_by)
+        totals[key] = totals.get(key, 0) + group["amount_minor"]
+    return {key: minor_to_decimal(amount_minor, currency) for key, amount_minor in totals.items()}
+
+# Audit Routes
+@api_router.get("/audit")
+async def get_audit_log(
+    current_user: User = Depends(get_current_user),
+    entity: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50
+):
+    """Newest-first change history of the family; pass ``next_cursor`` back as ``cursor`` for older entries"""
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
     
-    cfr_budgets = {
-        CategoryType.NEEDS: monthly_income * 0.5,    # 50%
-        CategoryType.WANTS: monthly_income * 0.3,    # 30%
-        CategoryType.SAVINGS: monthly_income * 0.2   # 20%
+    limit = min(max(limit, 1), 200)
+    query = {"profile_id": master_profile.id}
+    if entity:
+        query["entity"] = entity
+    if entity_id:
+        query["entity_id"] = entity_id
+    if cursor:
+        # Keyset pagination on (at, id): stays an index range scan at any depth
+        at, _, last_id = cursor.partition("|")
+        query["$or"] = [{"at": {"$lt": at}}, {"at": at, "id": {"$lt": last_id}}]
+    
+    entries = await db.reader(master_profile.id).audit_log.find(query, {"_id": 0}).sort(
+        [("at", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(length=None)
+    
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    return {
+        "entries": entries,
+        "next_cursor": f"{entries[-1]['at']}|{entries[-1]['id']}" if has_more else None
     }
+
+# Live Event Routes
+@api_router.get("/events")
+async def stream_events(request: Request, token: str):
+    """Server-Sent Events for the family ledger.
+
+    EventSource cannot send headers, so the access token is a query parameter.
+    """
+    user = await user_from_token(token)
+    master_profile = await get_master_profile(user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    queue = event_broker.subscribe(master_profile.id)
+    
+    async def stream():
+        try:
+            yield events.format_sse("ready", {"profile_id": master_profile.id})
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line, keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield events.format_sse(event["type"], event)
+        finally:
+            event_broker.unsubscribe(master_profile.id, queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Dashboard Routes
+async def compute_dashboard_summary(profile: Profile, month: str, reader):
+    month_start, month_end = month_bounds(month)
+    
+    # Sum the month in the database, exactly, in integer minor units
+    grouped = await aggregate_ledger(
+        reader,
+        profile,
+        {"date": {"$gte": month_start, "$lt": month_end}},
+        {"transaction_type": "$transaction_type", "category_id": "$category_id"}
+    )
     
     # Get categories
-    categories = await db.categories.find().to_list(length=None)
-    category_map = {cat["id"]: cat for cat in categories}
+    category_map = await category_map_for(profile)
     
-    # Calculate actual spending by category type
-    actual_spending = {CategoryType.NEEDS: 0, CategoryType.WANTS: 0, CategoryType.SAVINGS: 0}
+    totals = {TransactionType.INCOME: Decimal(0), TransactionType.EXPENSE: Decimal(0)}
+    actual_spending = {category_type.value: Decimal(0) for category_type in CategoryType}
     category_wise_spending = {}
     
-    for transaction in month_transactions:
-        if transaction["transaction_type"] == TransactionType.EXPENSE:
-            category = category_map.get(transaction["category_id"])
+    for (transaction_type, category_id), amount in grouped.items():
+        transaction_type = TransactionType(transaction_type)
+        totals[transaction_type] += amount
+        
+        if transaction_type == TransactionType.EXPENSE:
+            category = category_map.get(category_id)
             if category:
-                category_type = CategoryType(category["type"])
-                actual_spending[category_type] += transaction["amount"]
+                actual_spending[CategoryType(category["type"]).value] += amount
                 
                 # Category-wise spending
                 cat_name = category["name"]
-                if cat_name not in category_wise_spending:
-                    category_wise_spending[cat_name] = 0
-                category_wise_spending[cat_name] += transaction["amount"]
-    
-    # Calculate CFR analysis
-    cfr_analysis = []
-    for category_type, budgeted in cfr_budgets.items():
-        actual = actual_spending[category_type]
-        
-        if budgeted > 0:
-            deviation_percentage = ((actual - budgeted) / budgeted) * 100
-        else:
-            deviation_percentage = 0
-        
-        if category_type == CategoryType.NEEDS:
-            recommended_percentage = 50
-        elif category_type == CategoryType.WANTS:
-            recommended_percentage = 30
-        else:
-            recommended_percentage = 20
-        
-        if abs(deviation_percentage) <= 5:
-            status = "within_tolerance"
-        elif deviation_percentage > 0:
-            status = "overshoot"
-        else:
-            status = "undershoot"
-        
-        cfr_analysis.append(CFRAnalysis(
-            category_type=category_type,
-            budgeted_amount=budgeted,
-            actual_amount=actual,
-            deviation_percentage=deviation_percentage,
-            status=status,
-            recommended_percentage=recommended_percentage
-        ))
+                category_wise_spending[cat_name] = category_wise_spending.get(cat_name, Decimal(0)) + amount
+    
+    # Calculate CFR analysis with the household's policy
+    profile_income = Decimal(str(profile.monthly_income)) if profile.monthly_income else None
+    monthly_income, cfr_analysis = compiled_cfr_policy(profile).evaluate(
+        actual_spending, profile_income, totals[TransactionType.INCOME]
+    )
     
+    # Exact sums above, floats only at the API boundary
     return {
-        "profile": master_profile.dict(),
         "month": month,
-        "total_income": total_income,
-        "total_expenses": total_expenses,
-        "balance": total_income - total_expenses,
-        "cfr_analysis": [analysis.dict() for analysis in cfr_analysis],
-        "category_wise_spending": category_wise_spending,
-        "monthly_income": monthly_income
+        "total_income": float(totals[TransactionType.INCOME]),
+        "total_expenses": float(totals[TransactionType.EXPENSE]),
+        "balance": float(totals[TransactionType.INCOME] - totals[TransactionType.EXPENSE]),
+        "cfr_analysis": [CFRAnalysis(**analysis).dict() for analysis in cfr_analysis],
+        "category_wise_spending": {name: float(amount) for name, amount in category_wise_spending.items()},
+        "monthly_income": float(monthly_income)
     }
 
+@api_router.get("/dashboard")
+async def get_dashboard_summary(current_user: User = Depends(get_current_user), month: Optional[str] = None):
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if not month:
+        month = datetime.now(timezone.utc).strftime("%Y-%m")
+    
+    # Valid for as long as neither the ledger nor the inputs of the policy change
+    stamp = (
+        master_profile.ledger_version,
+        master_profile.currency,
+        master_profile.monthly_income,
+        master_profile.cfr_policy.json()
+    )
+    summary = dashboard_cache.get((master_profile.id, month), stamp)
+    if summary is None:
+        async def compute():
+            # On the primary: the summary is cached under the ledger version read from it,
+            # and a lagging secondary could store pre-write totals under that version
+            summary = await compute_dashboard_summary(master_profile, month, db.primary)
+            dashboard_cache.set((master_profile.id, month), stamp, summary)
+            return summary
+        summary = await coalesced(("dashboard", master_profile.id, month, stamp), compute)
+    
+    return {"profile": master_profile.dict(), **summary}
+
+@api_router.get("/dashboard/trend")
+async def get_dashboard_trend(
+    current_user: User = Depends(get_current_user),
+    months: int = 6,
+    end_month: Optional[str] = None
+):
+    """Monthly income and expense totals, converted to the profile currency"""
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if months < 1 or months > 60:
+        raise HTTPException(status_code=400, detail="months must be between 1 and 60")
+    if not end_month:
+        end_month = datetime.now(timezone.utc).strftime("%Y-%m")
+    
+    _, range_end = month_bounds(end_month)
+    first_month = shift_month(datetime.strptime(end_month, "%Y-%m"), -(months - 1))
+    range_start = first_month.strftime("%Y-%m")
+    
+    grouped = await aggregate_ledger(
+        db.reader(master_profile.id),
+        master_profile,
+        {"date": {"$gte": range_start, "$lt": range_end}},
+        {"month": {"$substrBytes": ["$date", 0, 7]}, "transaction_type": "$transaction_type"}
+    )
+    
+    trend = []
+    for offset in range(months):
+        month = shift_month(first_month, offset).strftime("%Y-%m")
+        income = grouped.get((month, TransactionType.INCOME.value), Decimal(0))
+        expenses = grouped.get((month, TransactionType.EXPENSE.value), Decimal(0))
+        trend.append({
+            "month": month,
+            "total_income": float(income),
+            "total_expenses": float(expenses),
+            "balance": float(income - expenses)
+        })
+    
+    return {
+        "currency": normalize_currency(master_profile.currency),
+        "months": trend
+    }
+
+@api_router.get("/dashboard/breakdown")
+async def get_dashboard_breakdown(
+    current_user: User = Depends(get_current_user),
+    month: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    rolling_window: int = Query(7, ge=1, le=366)
+):
+    """CFR, category, member, payment mode and daily breakdowns for a period"""
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    range_start, range_end = resolve_date_range(month, start_date, end_date, max_days=BREAKDOWN_MAX_DAYS)
+    reader = db.reader(master_profile.id)
+    
+    transactions = await archive.find_documents(
+        reader, master_profile.id, master_profile.archived_years, range_start, range_end,
+        {"_id": 0, "amount_minor": 1, "amount": 1, "currency": 1, "transaction_type": 1,
+         "category_id": 1, "user_id": 1, "payment_mode": 1, "date": 1}
+    )
+    category_map = await category_map_for(master_profile)
+    
+    try:
+        frame = LedgerFrame.from_documents(transactions, category_map, master_profile.currency, get_rate_table())
+    except MissingRateError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    # The end bound of a month range is YYYY-MM, daily series need whole days
+    first_day = np.datetime64(range_start[:10] if len(range_start) > 7 else f"{range_start}-01", "D")
+    last_day = np.datetime64(range_end[:10] if len(range_end) > 7 else f"{range_end}-01", "D")
+    
+    return {
+        "currency": frame.currency,
+        "start": str(first_day),
+        "end": str(last_day - 1),
+        "transaction_count": len(frame),
+        "totals": frame.totals(),
+        "cfr_spending": frame.cfr_totals(),
+        "category_wise_spending": frame.by_category(),
+        "member_wise": frame.by_member(),
+        "payment_mode_wise_spending": frame.by_payment_mode(),
+        "daily_spending": frame.by_day(first_day, last_day),
+        "rolling_daily_average": frame.rolling_daily_average(rolling_window, first_day, last_day),
+        "expense_percentiles": frame.expense_percentiles()
+    }
+
+@api_router.get("/dashboard/members")
+async def get_dashboard_members(
+    current_user: User = Depends(get_current_user),
+    month: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """Spending per family member and category type for a month or date range"""
+    master_profile = await get_master_profile(current_user)
+    if not master_profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    range_start, range_end = resolve_date_range(month, start_date, end_date)
+    reader = db.reader(master_profile.id)
+    
+    # One aggregation for the whole family, grouped by who recorded each row
+    grouped = await aggregate_ledger(
+        reader,
+        master_profile,
+        {"date": {"$gte": range_start, "$lt": range_end}},
+        {"user_id": "$user_id", "transaction_type": "$transaction_type", "category_id": "$category_id"}
+    )
+    
+    category_map = await category_map_for(master_profile)
+    
+    members = {}
+    for (user_id, transaction_type, category_id), amount in grouped.items():
+        member = members.setdefault(user_id, {
+            "income": Decimal(0),
+            "expenses": Decimal(0),
+            "by_type": {category_type.value: Decimal(0) for category_type in CategoryType}
+        })
+        if TransactionType(transaction_type) == TransactionType.INCOME:
+            member["income"] += amount
+            continue
+        member["expenses"] += amount
+        category = category_map.get(category_id)
+        if category:
+            member["by_type"][CategoryType(category["type"]).value] += amount
+    
+    # Names for everyone in the result with a single batched lookup
+    users = await MongoRepositories(reader).users.get_many(members)
+    user_map = {user["id"]: user for user in users}
+    
+    result = []
+    for user_id, member in members.items():
+        user = user_map.get(user_id)
+        is_master = user_id == master_profile.user_id
+        result.append({
+            "user_id": user_id,
+            "name": f"{user['first_name']} {user['last_name']}" if user else "Unknown",
+            "email": user["email"] if user else None,
+            "relation": "master" if is_master else (user.get("family_relation") if user else None),
+            "is_master": is_master,
+            "total_income": float(member["income"]),
+            "total_expenses": float(member["expenses"]),
+            "spending_by_category_type": {name: float(amount) for name, amount in member["by_type"].items()}
+        })
+    result.sort(key=lambda member: member["total_expenses"], reverse=True)
+    
+    return {
+        "currency": normalize_currency(master_profile.currency),
+        "range": {"start": range_start, "end": range_end},
+        "members": result
+    }
+
+@api_router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiling_reports(path: Optional[str] = None, limit: int = 50):
+    """Most recent profiling reports, without their profiles"""
+    query = {"path": path} if path else {}
+    reports = await db.profiling_reports.find(
+        query, {"_id": 0, "profile": 0, "mongo_commands": 0}
+    ).sort("created_at", -1).limit(min(max(limit, 1), 500)).to_list(length=None)
+    return {"reports": reports}
+
+@api_router.get("/admin/profiles/{report_id}", dependencies=[Depends(require_admin)])
+async def get_profiling_report(report_id: str):
+    report = await db.profiling_reports.find_one({"id": report_id}, {"_id": 0})
+    if not report:
+        raise HTTPException(status_code=404, detail="Profiling report not found")
+    return report
+
+@api_router.get("/admin/slow-queries", dependencies=[Depends(require_admin)])
+async def get_slow_queries():
+    """Slow Mongo commands of this worker per call site, most total time first"""
+    return slow_query_log.stats()
+
+@api_router.get("/admin/stats", dependencies=[Depends(require_admin)])
+async def get_worker_stats():
+    """Saturation signals, caches and queues of this worker"""
+    compressor = health.middleware_instance(app, compression.CompressionMiddleware)
+    profiler = health.middleware_instance(app, profiling.ProfilingMiddleware)
+    return {
+        "pid": os.getpid(),
+        "started_at": app.state.started_at,
+        "requests": request_gauge.stats(),
+        "event_loop_lag": loop_lag.stats(),
+        "mongo_pools": pool_stats.stats(db.settings.max_pool_size),
+        "caches": {"dashboard": dashboard_cache.stats(), "categories": category_catalogue.stats()},
+        "events": {"subscribers": event_broker.subscriber_count(), "dropped": event_broker.dropped},
+        "audit_queue": {"size": audit_log.queue.qsize(), "written": audit_log.written},
+        "rate_limiter": rate_limiter.stats(),
+        "single_flight": request_flights.stats(),
+        "compression": compressor.stats() if compressor else None,
+        "profiling": profiler.stats() if profiler else None
+    }
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the worker is up and serving, nothing else is checked"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: startup finished and Mongo answers a ping"""
+    if not getattr(app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Starting up")
+    try:
+        await asyncio.wait_for(db.primary.command("ping"), READINESS_TIMEOUT_SECONDS)
+    except Exception as error:
+        logger.warning("Readiness check failed: %r", error)
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(
+    ratelimit.RateLimitMiddleware, limiter=rate_limiter, trusted_proxies=RATE_LIMIT_TRUSTED_PROXIES
+)
+app.add_middleware(querylog.CallSiteMiddleware)
+# Inside compression, so a profile covers the app's work only
+app.add_middleware(
+    profiling.ProfilingMiddleware,
+    db=db,
+    token=ADMIN_TOKEN,
+    sample_rate=PROFILING_SAMPLE_RATE,
+    profiler=PROFILER,
+    skip_paths=("/api/events",)
+)
+app.add_middleware(
+    compression.CompressionMiddleware,
+    minimum_size=COMPRESSION_MINIMUM_SIZE,
+    gzip_level=GZIP_LEVEL,
+    brotli_quality=BROTLI_QUALITY
+)
+app.add_middleware(health.InFlightMiddleware, gauge=request_gauge)
+# Added last so it wraps everything, including throttled responses
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -956,12 +2426,4 @@ logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
-logger = logging.getLogger(__name__)
-
-@app.on_event("startup")
-async def startup_event():
-    await initialize_categories()
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+logger = logging.getLogger(__name__)
\ No newline at end of file
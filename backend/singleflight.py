@@ -0,0 +1,71 @@
+"""Coalescing of concurrent identical reads.
+
+When several family members open the app together, each request would run
+the same aggregation for the same master profile. ``SingleFlight.do`` runs
+one computation per key and lets every request that arrives while it is in
+flight await that same result. Nothing is kept once it finishes; caching is
+the job of ``StampedLRUCache``.
+
+Keys start with a route name, which the metrics are counted under, and
+should include whatever version the result depends on (such as the
+profile's ledger version), so a request made after a write never joins a
+computation that started before it. Shared results must not be modified.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self.calls: Dict[Tuple[Hashable, ...], asyncio.Task] = {}
+        self.started: Dict[Hashable, int] = {}
+        self.coalesced: Dict[Hashable, int] = {}
+        self.timeouts: Dict[Hashable, int] = {}
+
+    async def do(self, key: Tuple[Hashable, ...], compute: Callable[[], Awaitable[Any]],
+                 timeout: Optional[float] = None) -> Any:
+        """Result of ``compute()``, shared with concurrent calls for the same key.
+
+        Waits at most ``timeout`` seconds (default: the instance timeout) and
+        then raises ``asyncio.TimeoutError``; a call that slow is also
+        forgotten, so later requests start afresh instead of joining it.
+        """
+        route = key[0]
+        task = self.calls.get(key)
+        if task is None:
+            self.started[route] = self.started.get(route, 0) + 1
+            task = asyncio.ensure_future(compute())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced[route] = self.coalesced.get(route, 0) + 1
+
+        try:
+            # Shielded: a waiter that goes away must not cancel everyone's call
+            return await asyncio.wait_for(asyncio.shield(task), timeout if timeout is not None else self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts[route] = self.timeouts.get(route, 0) + 1
+            self._forget(key, task)
+            raise
+
+    def _forget(self, key, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+
+    def _finished(self, key, task: asyncio.Task):
+        self._forget(key, task)
+        if not task.cancelled() and task.exception() is not None:
+            # Retrieved here too, for calls whose waiters all timed out
+            logger.debug("Coalesced call %s failed: %r", key[0], task.exception())
+
+    def stats(self):
+        return {
+            "in_flight": len(self.calls),
+            "started": dict(self.started),
+            "coalesced": dict(self.coalesced),
+            "timeouts": dict(self.timeouts)
+        }
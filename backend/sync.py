@@ -0,0 +1,237 @@
+"""Delta sync of a profile's transactions for offline-capable clients.
+
+Every transaction write takes the next number of the profile's ``sync_seq``
+and stamps it, with ``updated_at``, on the stored document; a delete leaves
+a tombstone carrying its number in ``transaction_tombstones``. A client
+keeps the cursor its last sync returned and asks only for what changed
+after it.
+
+Numbers are handed out before the write lands, so a later number can
+become visible before an earlier one. Each allocation is therefore listed
+in the profile's ``sync_pending`` until its write is done, and a sync only
+reports changes up to the number before the oldest pending one. An
+allocation whose writer died is disregarded after ``settle_seconds``.
+
+A first sync (``since`` 0) pages through the whole ledger, archive
+included, in ``(date, id)`` order. Its cursor is the number settled when the
+first page was read; the ``page`` token carries it to the following pages,
+and whatever changed meanwhile comes with the next incremental sync.
+
+Tombstones expire after ``retention_days`` (plus a day) through a TTL
+index. Each day's highest tombstone number is noted in ``sync_marks``; once
+that day's tombstones may be expiring it is folded into the profile's
+``sync_floor``, and a cursor below the floor could miss deletes, so it gets
+``ResyncRequired`` and the client starts again from 0.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import OperationFailure
+
+import archive
+
+logger = logging.getLogger(__name__)
+
+TOMBSTONES = "transaction_tombstones"
+MARKS = "sync_marks"
+DEFAULT_RETENTION_DAYS = 90
+
+# createIndex errors when an index exists with other options
+INDEX_OPTIONS_CONFLICT = 85
+
+
+class ResyncRequired(Exception):
+    """The cursor cannot be continued; the client must sync again from 0"""
+
+
+def page_token(seq: int, document: dict) -> str:
+    """Token for the first-sync page after ``document``"""
+    return f"{seq}:{document['date']}:{document['id']}"
+
+
+def parse_page_token(token: str) -> Tuple[int, Tuple[str, str]]:
+    """``(cursor, (date, id))`` of a page token; ValueError when malformed"""
+    # Dates may be full ISO timestamps with colons of their own; ids have none
+    seq, rest = token.split(":", 1)
+    date, transaction_id = rest.rsplit(":", 1)
+    if not date or not transaction_id:
+        raise ValueError(f"Malformed page token: {token!r}")
+    return int(seq), (date, transaction_id)
+
+
+def stamp(document: dict, seq: int) -> dict:
+    """Mark a stored transaction (or the changes to one) with its sync number, in place"""
+    document["seq"] = seq
+    document["updated_at"] = datetime.now(timezone.utc).isoformat()
+    return document
+
+
+def release_update(seq: Optional[int]) -> dict:
+    """Update operators ending a pending allocation, to merge into a profile update"""
+    return {"$pull": {"sync_pending": {"seq": seq}}} if seq is not None else {}
+
+
+def as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class SyncLog:
+    def __init__(self, db, store, settle_seconds: float = 60, retention_days: float = DEFAULT_RETENTION_DAYS):
+        self.db = db
+        self.store = store
+        self.settle_seconds = settle_seconds
+        self.retention_days = retention_days
+
+    async def ensure_indexes(self):
+        tombstones = self.db[TOMBSTONES]
+        await tombstones.create_index([("profile_id", ASCENDING), ("seq", ASCENDING)])
+        await tombstones.create_index([("profile_id", ASCENDING), ("id", ASCENDING)])
+        # A day longer than the retention, so a day's mark is folded before its tombstones go
+        expire_after = int((self.retention_days + 1) * 24 * 3600)
+        try:
+            await tombstones.create_index("deleted_at", expireAfterSeconds=expire_after)
+        except OperationFailure as error:
+            if error.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            await self.db.command(
+                "collMod", TOMBSTONES, index={"keyPattern": {"deleted_at": 1}, "expireAfterSeconds": expire_after}
+            )
+        await self.db[MARKS].create_index([("profile_id", ASCENDING), ("day", ASCENDING)], unique=True)
+
+    async def allocate(self, profile_id: str, count: int = 1) -> int:
+        """Reserve ``count`` consecutive numbers; returns the first"""
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=self.settle_seconds)
+        # One pipeline update, so the numbers and their pending entry appear together
+        profile = await self.db.profiles.find_one_and_update(
+            {"id": profile_id},
+            [
+                {"$set": {"sync_seq": {"$add": [{"$ifNull": ["$sync_seq", 0]}, count]}}},
+                {"$set": {"sync_pending": {"$concatArrays": [
+                    {"$filter": {
+                        "input": {"$ifNull": ["$sync_pending", []]},
+                        "as": "pending",
+                        "cond": {"$gte": ["$$pending.at", cutoff]}
+                    }},
+                    [{"seq": {"$subtract": ["$sync_seq", count - 1]}, "at": now}]
+                ]}}}
+            ],
+            projection={"_id": 0, "sync_seq": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return profile["sync_seq"] - count + 1
+
+    async def release(self, profile_id: str, seq: int):
+        """End an allocation outside of ``on_transaction_written``"""
+        await self.db.profiles.update_one({"id": profile_id}, release_update(seq))
+
+    async def tombstone(self, profile_id: str, transaction_id: str, seq: int):
+        now = datetime.now(timezone.utc)
+        # A BSON date, which the TTL index expires
+        await self.db[TOMBSTONES].insert_one({
+            "id": transaction_id,
+            "profile_id": profile_id,
+            "seq": seq,
+            "deleted_at": now
+        })
+        await self.db[MARKS].update_one(
+            {"profile_id": profile_id, "day": now.date().isoformat()}, {"$max": {"seq": seq}}, upsert=True
+        )
+
+    async def floor(self, profile: dict, profile_id: str) -> int:
+        """Lowest cursor that still sees every delete after it.
+
+        Folds the marks of days whose tombstones may be expiring into the
+        profile's ``sync_floor`` first.
+        """
+        horizon = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).date().isoformat()
+        marks = await self.db[MARKS].find(
+            {"profile_id": profile_id, "day": {"$lte": horizon}}, {"seq": 1}
+        ).to_list(length=None)
+        floor = profile.get("sync_floor", 0)
+        if marks:
+            floor = max(floor, *(mark["seq"] for mark in marks))
+            await self.db.profiles.update_one({"id": profile_id}, {"$max": {"sync_floor": floor}})
+            await self.db[MARKS].delete_many({"_id": {"$in": [mark["_id"] for mark in marks]}})
+        return floor
+
+    async def deleted_ids(self, profile_id: str, ids: List[str]) -> set:
+        tombstones = await self.db[TOMBSTONES].find(
+            {"profile_id": profile_id, "id": {"$in": ids}}, {"_id": 0, "id": 1}
+        ).to_list(length=None)
+        return {tombstone["id"] for tombstone in tombstones}
+
+    def settled_seq(self, profile: dict) -> int:
+        """Highest number whose write, and every earlier one, has landed"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.settle_seconds)
+        pending = [
+            entry["seq"] for entry in profile.get("sync_pending") or ()
+            if as_utc(entry["at"]) >= cutoff
+        ]
+        return min(pending) - 1 if pending else profile.get("sync_seq", 0)
+
+    async def changes(self, profile_id: str, since: int, limit: int, page: Optional[str] = None) -> Dict:
+        """Transactions written and ids deleted after ``since``, oldest first.
+
+        ``since`` 0 pages through the whole ledger instead, continued with
+        the returned ``page`` token. Raises ``ResyncRequired`` when ``since``
+        is ahead of the profile (not a cursor it handed out) or so old that
+        deletes after it may have expired; ValueError for a bad ``page``.
+        """
+        # Everything is read from the primary, so the pending list and the
+        # documents are one consistent view
+        profile = await self.db.profiles.find_one(
+            {"id": profile_id}, {"_id": 0, "sync_seq": 1, "sync_pending": 1, "sync_floor": 1, "archived_years": 1}
+        )
+        if since > profile.get("sync_seq", 0):
+            raise ResyncRequired("Unknown sync cursor, sync again from 0")
+
+        if since == 0:
+            if page is None:
+                cursor, after = self.settled_seq(profile), None
+            else:
+                cursor, after = parse_page_token(page)
+                if cursor > profile.get("sync_seq", 0):
+                    raise ValueError(f"Unknown page token: {page!r}")
+                if cursor < await self.floor(profile, profile_id):
+                    raise ResyncRequired("The first sync took too long, sync again from 0")
+            transactions = await archive.page_documents(
+                self.db, profile_id, profile.get("archived_years", []), after, limit + 1, {"search_tokens": 0}
+            )
+            has_more = len(transactions) > limit
+            transactions = transactions[:limit]
+            return {
+                "cursor": cursor,
+                "has_more": has_more,
+                "page": page_token(cursor, transactions[-1]) if has_more else None,
+                "transactions": transactions,
+                "deleted": []
+            }
+
+        if since < await self.floor(profile, profile_id):
+            raise ResyncRequired("Sync cursor expired, sync again from 0")
+        settled = self.settled_seq(profile)
+        window = {"profile_id": profile_id, "seq": {"$gt": since, "$lte": settled}}
+        written = await self.store.collection(self.db).find(
+            window, {"search_tokens": 0}
+        ).sort("seq", 1).limit(limit + 1).to_list(length=None)
+        deleted = await self.db[TOMBSTONES].find(
+            window, {"_id": 0, "id": 1, "seq": 1}
+        ).sort("seq", 1).limit(limit + 1).to_list(length=None)
+
+        merged = sorted(
+            [(document["seq"], "written", document) for document in written]
+            + [(tombstone["seq"], "deleted", tombstone) for tombstone in deleted],
+            key=lambda change: change[0]
+        )
+        has_more = len(merged) > limit
+        merged = merged[:limit]
+        return {
+            "cursor": merged[-1][0] if has_more else settled,
+            "has_more": has_more,
+            "page": None,
+            "transactions": [document for _, kind, document in merged if kind == "written"],
+            "deleted": [document for _, kind, document in merged if kind == "deleted"]
+        }
@@ -0,0 +1,170 @@
+"""Physical layout of the transactions collection.
+
+Routes never name the transactions collection themselves; they go through
+the active store (``TRANSACTION_STORAGE``):
+
+``documents``
+    The default. Ordinary documents in ``transactions`` with a unique ``id``
+    index and a (profile_id, date) index over the ``YYYY-MM-DD`` date string.
+
+``timeseries``
+    A MongoDB time-series collection ``transactions_ts`` with
+    ``timeField=ts`` (the transaction date as a BSON date) and
+    ``metaField=profile_id``, so one profile's rows for a period sit together
+    in a few compressed buckets. Needs MongoDB 7.0+ for arbitrary updates and
+    deletes. Time-series collections allow no unique secondary indexes, so
+    id uniqueness is enforced on insert, and change streams are unavailable
+    (``EVENTS_SOURCE=changestream`` needs the documents layout).
+
+Both keep the ``date`` string, so documents look the same to every reader;
+``translate`` rewrites date-range filters to ``ts`` ranges so time-series
+reads prune buckets.
+"""
+import os
+import logging
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS = "documents"
+TIMESERIES = "timeseries"
+
+
+class DocumentStore:
+    name = DOCUMENTS
+    collection_name = "transactions"
+
+    def collection(self, db):
+        return db[self.collection_name]
+
+    def prepare(self, document: dict) -> dict:
+        """Fill in fields the layout derives from the document, in place"""
+        return document
+
+    def translate(self, query: dict) -> dict:
+        return query
+
+    async def ensure_indexes(self, db):
+        transactions = self.collection(db)
+        await transactions.create_index("id", unique=True)
+        await transactions.create_index([("profile_id", ASCENDING), ("date", ASCENDING)])
+        await transactions.create_index([("profile_id", ASCENDING), ("search_tokens", ASCENDING)])
+        await transactions.create_index([("profile_id", ASCENDING), ("seq", ASCENDING)])
+
+    async def insert(self, db, document: dict):
+        await self.collection(db).insert_one(self.prepare(document))
+
+    async def insert_new(self, db, documents: List[dict]) -> List[dict]:
+        """Insert documents whose id is not stored yet; returns those inserted"""
+        for document in documents:
+            self.prepare(document)
+        try:
+            await self.collection(db).insert_many(documents, ordered=False)
+            return documents
+        except BulkWriteError as error:
+            write_errors = error.details.get("writeErrors", [])
+            if any(write_error["code"] != 11000 for write_error in write_errors):
+                raise
+            duplicates = {write_error["index"] for write_error in write_errors}
+            return [document for index, document in enumerate(documents) if index not in duplicates]
+
+    async def update(self, db, query: dict, changes: dict) -> Optional[dict]:
+        """``$set`` changes on the matching row and return it as updated"""
+        return await self.collection(db).find_one_and_update(
+            query, {"$set": self.prepare(changes)}, return_document=ReturnDocument.AFTER
+        )
+
+    async def delete(self, db, query: dict) -> Optional[dict]:
+        """Delete the matching row and return it"""
+        return await self.collection(db).find_one_and_delete(query)
+
+
+def parse_bound(value: str) -> datetime:
+    """YYYY, YYYY-MM, YYYY-MM-DD or a full ISO timestamp as a UTC datetime"""
+    if len(value) == 4:
+        value = f"{value}-01-01"
+    elif len(value) == 7:
+        value = f"{value}-01"
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value[:10])
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+
+
+class TimeSeriesStore(DocumentStore):
+    name = TIMESERIES
+    collection_name = "transactions_ts"
+
+    def prepare(self, document: dict) -> dict:
+        if document.get("date"):
+            document["ts"] = parse_bound(document["date"])
+        return document
+
+    def translate(self, query: dict) -> dict:
+        date_range = query.get("date")
+        if not isinstance(date_range, dict):
+            return query
+        query = dict(query)
+        query["ts"] = {operator: parse_bound(bound) for operator, bound in query.pop("date").items()}
+        return query
+
+    async def ensure_indexes(self, db):
+        try:
+            await db.create_collection(
+                self.collection_name,
+                timeseries={"timeField": "ts", "metaField": "profile_id", "granularity": "hours"}
+            )
+        except CollectionInvalid:
+            pass  # Already exists
+        transactions = self.collection(db)
+        await transactions.create_index([("profile_id", ASCENDING), ("ts", ASCENDING)])
+        await transactions.create_index("id")
+        await transactions.create_index([("profile_id", ASCENDING), ("search_tokens", ASCENDING)])
+        await transactions.create_index([("profile_id", ASCENDING), ("seq", ASCENDING)])
+
+    async def insert_new(self, db, documents: List[dict]) -> List[dict]:
+        ids = [document["id"] for document in documents]
+        existing = {
+            document["id"] for document in
+            await self.collection(db).find({"id": {"$in": ids}}, {"_id": 0, "id": 1}).to_list(length=None)
+        }
+        new_documents = [self.prepare(document) for document in documents if document["id"] not in existing]
+        if new_documents:
+            await self.collection(db).insert_many(new_documents, ordered=False)
+        return new_documents
+
+    async def update(self, db, query: dict, changes: dict) -> Optional[dict]:
+        # findAndModify is not available on time-series collections
+        transactions = self.collection(db)
+        result = await transactions.update_one(query, {"$set": self.prepare(changes)})
+        if not result.matched_count:
+            return None
+        return await transactions.find_one(query)
+
+    async def delete(self, db, query: dict) -> Optional[dict]:
+        transactions = self.collection(db)
+        document = await transactions.find_one(query)
+        if document is not None:
+            await transactions.delete_one({"_id": document["_id"]})
+        return document
+
+
+STORES = {DOCUMENTS: DocumentStore, TIMESERIES: TimeSeriesStore}
+
+
+def get_store(name: str) -> DocumentStore:
+    if name not in STORES:
+        raise ValueError(f"Unknown transaction storage: {name}")
+    return STORES[name]()
+
+
+@lru_cache(maxsize=1)
+def active_store() -> DocumentStore:
+    """The layout selected by TRANSACTION_STORAGE (``documents`` by default)"""
+    return get_store(os.environ.get('TRANSACTION_STORAGE', DOCUMENTS))
@@ -0,0 +1,47 @@
+"""Standalone background job worker.
+
+    python worker.py --concurrency 4
+
+Runs the same job handlers as the API workers without serving requests, so
+heavy jobs can be scaled separately. Start the API with ``JOB_WORKERS=0``
+to leave every job to these processes.
+"""
+import asyncio
+import logging
+import signal
+from pathlib import Path
+from typing import Optional
+
+import typer
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+def main(concurrency: Optional[int] = typer.Option(None, help="Concurrent jobs, defaults to JOB_WORKERS")):
+    from server import db, job_queue
+
+    async def run():
+        db.connect()
+        await db.ensure_indexes()
+        if concurrency:
+            job_queue.concurrency = concurrency
+        job_queue.start()
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopped.set)
+        typer.echo(f"Job worker {job_queue.worker_id} running {job_queue.concurrency} concurrent job(s)")
+        try:
+            await stopped.wait()
+        finally:
+            await job_queue.stop()
+            db.close()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    typer.run(main)
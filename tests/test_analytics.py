@@ -0,0 +1,90 @@
+"""Columnar breakdowns of a LedgerFrame and the breakdown date window."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from analytics import LedgerFrame, parse_days  # noqa: E402
+from server import BREAKDOWN_MAX_DAYS, resolve_date_range  # noqa: E402
+
+CATEGORIES = {
+    "rent": {"name": "Rent", "type": "needs"},
+    "movies": {"name": "Movies", "type": "wants"},
+    "salary": {"name": "Salary", "type": "income"},
+}
+
+
+def transaction(date, amount_minor, category_id, transaction_type="expense", **fields):
+    return {
+        "date": date, "amount_minor": amount_minor, "currency": "INR", "category_id": category_id,
+        "transaction_type": transaction_type, "user_id": "u1", "payment_mode": "upi", **fields
+    }
+
+
+def frame(documents):
+    return LedgerFrame.from_documents(documents, CATEGORIES, "INR")
+
+
+def test_parse_days_drops_time_and_marks_bad_dates():
+    days = parse_days(["2024-03-01T10:15:00", "not a date", "2024-03-02"])
+    assert str(days[0]) == "2024-03-01"
+    assert np.isnat(days[1])
+    assert str(days[2]) == "2024-03-02"
+
+
+def test_totals_and_breakdowns():
+    ledger = frame([
+        transaction("2024-03-01", 50000, "salary", "income"),
+        transaction("2024-03-01", 12050, "rent"),
+        transaction("2024-03-02", 2000, "movies", user_id="u2", payment_mode="card"),
+        transaction("2024-03-03", 999, "gone"),
+    ])
+    assert ledger.totals() == {"income": 500.0, "expense": 150.49}
+    assert ledger.cfr_totals() == {"needs": 120.5, "wants": 20.0, "savings": 0.0}
+    assert ledger.by_category() == {"Rent": 120.5, "Movies": 20.0, "Unknown": 9.99}
+    assert ledger.by_member()["u2"] == {"income": 0.0, "expense": 20.0}
+    assert ledger.by_payment_mode() == {"upi": 130.49, "card": 20.0}
+
+
+def test_rows_with_unparseable_dates_are_dropped():
+    ledger = frame([transaction("2024-03-01", 100, "rent"), transaction("someday", 100, "rent")])
+    assert len(ledger) == 1
+
+
+def test_foreign_rows_need_a_rate_table():
+    with pytest.raises(ValueError):
+        frame([transaction("2024-03-01", 100, "rent", currency="USD")])
+
+
+def test_by_day_zero_fills_the_window():
+    ledger = frame([transaction("2024-03-01", 100, "rent"), transaction("2024-03-03", 300, "rent")])
+    assert ledger.by_day() == {"2024-03-01": 1.0, "2024-03-02": 0.0, "2024-03-03": 3.0}
+
+
+def test_rolling_daily_average_uses_a_trailing_window():
+    ledger = frame([transaction("2024-03-01", 100, "rent"), transaction("2024-03-03", 400, "rent")])
+    assert ledger.rolling_daily_average(window=2) == {"2024-03-01": 1.0, "2024-03-02": 0.5, "2024-03-03": 2.0}
+
+
+@pytest.mark.parametrize("window", [0, -3])
+def test_rolling_daily_average_rejects_empty_windows(window):
+    with pytest.raises(ValueError):
+        frame([]).rolling_daily_average(window=window)
+
+
+def test_breakdown_range_is_capped():
+    assert resolve_date_range(None, "2024-01-01", "2024-01-31", max_days=BREAKDOWN_MAX_DAYS) == ("2024-01-01", "2024-02-01")
+    with pytest.raises(HTTPException) as raised:
+        resolve_date_range(None, "2000-01-01", "2024-12-31", max_days=BREAKDOWN_MAX_DAYS)
+    assert raised.value.status_code == 400
+
+
+@pytest.mark.parametrize("start_date, end_date", [("2024-01-01", None), ("2024-02-01", "2024-01-01"), ("2024-13-01", "2024-12-01")])
+def test_breakdown_range_rejects_bad_bounds(start_date, end_date):
+    with pytest.raises(HTTPException) as raised:
+        resolve_date_range(None, start_date, end_date, max_days=BREAKDOWN_MAX_DAYS)
+    assert raised.value.status_code == 400
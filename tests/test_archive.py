@@ -0,0 +1,113 @@
+"""Archive horizons, range helpers, moving rows and monthly summaries.
+
+The move runs against a scratch database when TEST_MONGO_URL is set and is
+skipped otherwise.
+"""
+import os
+import sys
+import uuid
+import asyncio
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import archive  # noqa: E402
+from archive import horizon_cutoff, month_aligned, next_month, years_in_range  # noqa: E402
+
+
+@pytest.mark.parametrize("today, months, cutoff", [
+    (date(2024, 3, 15), 24, "2022-03-01"),
+    (date(2024, 3, 15), 3, "2023-12-01"),
+    (date(2024, 1, 1), 1, "2023-12-01"),
+    (date(2024, 12, 31), 0, "2024-12-01"),
+])
+def test_horizon_cutoff(today, months, cutoff):
+    assert horizon_cutoff(today, months) == cutoff
+
+
+@pytest.mark.parametrize("month, following", [("2024-01", "2024-02"), ("2024-12", "2025-01")])
+def test_next_month(month, following):
+    assert next_month(month) == following
+
+
+@pytest.mark.parametrize("bound, aligned", [("2024", True), ("2024-03", True), ("2024-03-01", True), ("2024-03-15", False)])
+def test_month_aligned(bound, aligned):
+    assert month_aligned(bound) is aligned
+
+
+def test_years_in_range():
+    years = [2020, 2021, 2022]
+    assert years_in_range(years, "2021-06-01", "2021-12-01") == [2021]
+    assert years_in_range(years, "2021-12-31", "2022-01-02") == [2021, 2022]
+    assert years_in_range(years, *archive.FULL_RANGE) == years
+    assert years_in_range(years, "2023", "2024") == []
+
+
+def transaction(profile_id, date, amount_minor, transaction_type="expense", category_id="rent", user_id="u1"):
+    return {
+        "id": str(uuid.uuid4()), "profile_id": profile_id, "user_id": user_id, "date": date,
+        "amount_minor": amount_minor, "currency": "INR", "transaction_type": transaction_type,
+        "category_id": category_id, "description": "row",
+    }
+
+
+@pytest.mark.skipif("TEST_MONGO_URL" not in os.environ, reason="TEST_MONGO_URL not set")
+def test_archive_profile_moves_rows_and_summarizes_months():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ["TEST_MONGO_URL"])
+        db = client[f"archive_{uuid.uuid4().hex[:8]}"]
+        try:
+            profile = {"id": "p1", "currency": "INR", "archived_years": []}
+            await db.profiles.insert_one(dict(profile))
+            await db.categories.insert_one({"id": "rent", "profile_id": None, "type": "needs", "name": "Rent"})
+            await archive.active_store().ensure_indexes(db)
+            await archive.active_store().collection(db).insert_many([
+                transaction("p1", "2021-12-30", 100),
+                transaction("p1", "2022-01-05", 200),
+                transaction("p1", "2022-01-20", 300, user_id="u2"),
+                transaction("p1", "2022-01-21", 5000, "income", "salary"),
+                transaction("p1", "2023-06-01", 700),
+                transaction("p2", "2021-01-01", 900),
+            ])
+
+            result = await archive.archive_profile(db, profile, "2023-01-01", rate_table=None, batch_size=2)
+            assert result == {"moved": 4, "months": 2}
+
+            hot = archive.active_store().collection(db)
+            assert [row["date"] for row in await hot.find({"profile_id": "p1"}).to_list(length=None)] == ["2023-06-01"]
+            assert await hot.count_documents({"profile_id": "p2"}) == 1
+            assert await db[archive.collection_name(2021)].count_documents({}) == 1
+            assert await db[archive.collection_name(2022)].count_documents({}) == 3
+
+            stored = await db.profiles.find_one({"id": "p1"})
+            assert stored["archived_before"] == "2023-01-01"
+            assert stored["archived_years"] == [2021, 2022]
+
+            january = await db.monthly_summaries.find_one({"profile_id": "p1", "month": "2022-01"})
+            assert january["currency"] == "INR"
+            assert january["count"] == 3
+            assert january["days"] == [5, 20, 21]
+            groups = {(group["transaction_type"], group["user_id"]): group for group in january["groups"]}
+            assert groups[("expense", "u1")]["amount_minor"] == 200
+            assert groups[("expense", "u1")]["category_type"] == "needs"
+            assert groups[("income", "u1")]["amount_minor"] == 5000
+
+            totals = await archive.summary_totals(db, "p1", "INR", "2021", "2023", ["transaction_type"])
+            assert totals == {("expense",): 600, ("income",): 5000}
+            assert await archive.summary_totals(db, "p1", "USD", "2021", "2023", ["month"]) is None
+
+            documents = await archive.find_documents(db, "p1", stored["archived_years"], *archive.FULL_RANGE)
+            assert [row["date"] for row in documents] == ["2023-06-01", "2022-01-21", "2022-01-20", "2022-01-05", "2021-12-30"]
+
+            # A re-run has nothing left to move
+            assert await archive.archive_profile(db, stored, "2023-01-01", rate_table=None) == {"moved": 0, "months": 0}
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    asyncio.run(main())
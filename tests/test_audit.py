@@ -0,0 +1,104 @@
+"""Audit entry diffs and batched writes."""
+import sys
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from audit import AuditLog, action_for, diff, flatten  # noqa: E402
+
+
+class RecordingCollection:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def insert_many(self, documents, ordered=True):
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.batches.append(list(documents))
+
+
+def audit_log(collection, **options):
+    return AuditLog(SimpleNamespace(audit_log=collection), **options)
+
+
+def test_flatten_uses_dotted_paths_and_skips_internal_fields():
+    assert flatten({"_id": 1, "seq": 9, "amount": 5, "split": {"a": 1, "b": {"c": 2}}, "tags": {}}) == {
+        "amount": 5, "split.a": 1, "split.b.c": 2, "tags": {}
+    }
+
+
+def test_diff_names_every_changed_field():
+    before = {"amount": 5, "description": "tea", "meta": {"note": "x"}, "search_tokens": ["t"]}
+    after = {"amount": 7, "description": "tea", "meta": {"note": "y"}, "person_name": "Ravi", "search_tokens": ["c"]}
+    assert diff(before, after) == {
+        "amount": {"from": 5, "to": 7},
+        "meta.note": {"from": "x", "to": "y"},
+        "person_name": {"from": None, "to": "Ravi"},
+    }
+
+
+def test_diff_of_a_create_and_a_delete():
+    assert diff(None, {"amount": 5}) == {"amount": {"from": None, "to": 5}}
+    assert diff({"amount": 5}, None) == {"amount": {"from": 5, "to": None}}
+
+
+def test_action_for():
+    assert action_for(None, {}) == "created"
+    assert action_for({}, None) == "deleted"
+    assert action_for({}, {}) == "updated"
+
+
+def test_record_skips_writes_that_changed_nothing():
+    async def run():
+        log = audit_log(RecordingCollection())
+        await log.record("p1", "transaction", "t1", "u1", {"amount": 5, "seq": 1}, {"amount": 5, "seq": 2})
+        await log.record("p1", "transaction", "t1", "u1", {"amount": 5}, {"amount": 6})
+        return log.drain()
+
+    entries = asyncio.run(run())
+    assert len(entries) == 1
+    assert entries[0]["action"] == "updated"
+    assert entries[0]["actor_id"] == "u1"
+    assert entries[0]["changes"] == {"amount": {"from": 5, "to": 6}}
+
+
+def test_writer_batches_queued_entries():
+    async def run():
+        collection = RecordingCollection()
+        log = audit_log(collection, batch_size=3, flush_interval=0.01)
+        log.start()
+        for amount in range(7):
+            await log.record("p1", "transaction", f"t{amount}", "u1", None, {"amount": amount})
+        await asyncio.sleep(0.1)
+        await log.stop()
+        return collection, log
+
+    collection, log = asyncio.run(run())
+    assert [len(batch) for batch in collection.batches] == [3, 3, 1]
+    assert log.written == 7
+
+
+def test_stop_flushes_what_is_still_queued():
+    async def run():
+        collection = RecordingCollection()
+        log = audit_log(collection, flush_interval=60)
+        log.start()
+        await log.record("p1", "profile", "p1", "u1", {"name": "a"}, {"name": "b"})
+        await log.record("p1", "profile", "p1", "u1", {"name": "b"}, {"name": "c"})
+        await asyncio.sleep(0)
+        await log.stop()
+        return collection
+
+    assert sum(len(batch) for batch in asyncio.run(run()).batches) == 2
+
+
+def test_failed_writes_are_logged_not_raised():
+    async def run():
+        log = audit_log(RecordingCollection(fail=True))
+        await log.write([{"id": "e1"}])
+        return log.written
+
+    assert asyncio.run(run()) == 0
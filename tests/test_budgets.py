@@ -0,0 +1,73 @@
+"""Budget threshold crossing, counter contributions, limit conversion and transaction dates."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from budgets import (  # noqa: E402
+    category_key, contributions, convert_amount_minor, convert_limits, crossed_thresholds, type_key
+)
+from fx import RateTable  # noqa: E402
+from server import validate_transaction_date  # noqa: E402
+
+
+def rate_table():
+    dates = np.array(["2024-01-01"], dtype="datetime64[D]")
+    return RateTable("USD", {"INR": (dates, np.array([80.0])), "JPY": (dates, np.array([160.0]))})
+
+
+def test_crossed_thresholds():
+    assert crossed_thresholds(0, 8000, 10000, [80.0, 100.0]) == [80.0]
+    assert crossed_thresholds(7999, 10000, 10000, [80.0, 100.0]) == [80.0, 100.0]
+    # Already past 80%: only moving up through a threshold counts
+    assert crossed_thresholds(8000, 9000, 10000, [80.0, 100.0]) == []
+    assert crossed_thresholds(9000, 8000, 10000, [80.0]) == []
+    assert crossed_thresholds(0, 100, 0, [80.0]) == []
+    # Exact at fractional percentages
+    assert crossed_thresholds(0, 3333, 10000, [33.33]) == [33.33]
+    assert crossed_thresholds(0, 3332, 10000, [33.33]) == []
+
+
+def test_contributions():
+    expense = {"transaction_type": "expense", "category_id": "c1", "amount_minor": 500, "currency": "INR", "date": "2024-03-05"}
+    assert contributions(expense, "needs", "INR", rate_table()) == {
+        ("2024-03", category_key("c1")): 500, ("2024-03", type_key("needs")): 500
+    }
+    assert contributions(expense, None, "INR", rate_table()) == {("2024-03", category_key("c1")): 500}
+    assert contributions({**expense, "transaction_type": "income"}, "needs", "INR", rate_table()) == {}
+    assert contributions(None, "needs", "INR", rate_table()) == {}
+    # 1.00 USD at 80 INR per dollar
+    dollars = {**expense, "amount_minor": 100, "currency": "USD"}
+    assert contributions(dollars, None, "INR", rate_table()) == {("2024-03", category_key("c1")): 8000}
+
+
+def test_convert_amount_minor():
+    table = rate_table()
+    assert convert_amount_minor(8000, "INR", "INR", table, "2024-06-01") == 8000
+    # 80.00 INR is 160 JPY, which has no minor unit
+    assert convert_amount_minor(8000, "INR", "JPY", table, "2024-06-01") == 160
+    # Without rates the nominal amount is kept with the new exponent
+    assert convert_amount_minor(8000, "INR", "KWD", table, "2024-06-01") == 80000
+
+
+def test_convert_limits():
+    limits = {"category_limits_minor": {"c1": 8000}, "type_limits_minor": {"needs": 16000}, "alert_thresholds": [80.0]}
+    assert convert_limits(limits, "INR", "JPY", rate_table(), "2024-06-01") == {
+        "category_limits_minor": {"c1": 160}, "type_limits_minor": {"needs": 320}, "alert_thresholds": [80.0]
+    }
+
+
+@pytest.mark.parametrize("value", ["2024-03-15", "2024-03-15T10:30:00", "2024-03-15 10:30", "2024-03-15T10:30:00+05:30", None])
+def test_transaction_dates_accepted(value):
+    validate_transaction_date(value)
+
+
+@pytest.mark.parametrize("value", ["", "15/03/2024", "20240315", "2024-3-15", "2024-02-30", "2024-03-15 later"])
+def test_transaction_dates_rejected(value):
+    with pytest.raises(HTTPException) as raised:
+        validate_transaction_date(value)
+    assert raised.value.status_code == 400
@@ -0,0 +1,55 @@
+"""Compiled CFR policies."""
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from cfr import (  # noqa: E402
+    ACTUAL_ONLY, DEFAULT_RATIOS, PROFILE_ONLY, PROFILE_THEN_ACTUAL, compile_policy
+)
+
+RATIOS = tuple(DEFAULT_RATIOS.items())
+
+
+def test_compile_policy_is_cached():
+    assert compile_policy(RATIOS, 5.0, PROFILE_THEN_ACTUAL, 10000.0) is compile_policy(RATIOS, 5.0, PROFILE_THEN_ACTUAL, 10000.0)
+    assert compile_policy(RATIOS, 5.0, PROFILE_THEN_ACTUAL, 10000.0) is not compile_policy(RATIOS, 10.0, PROFILE_THEN_ACTUAL, 10000.0)
+
+
+@pytest.mark.parametrize("income_source, profile_income, actual_income, expected", [
+    (PROFILE_THEN_ACTUAL, Decimal(800), Decimal(500), Decimal(800)),
+    (PROFILE_THEN_ACTUAL, None, Decimal(500), Decimal(500)),
+    (PROFILE_THEN_ACTUAL, Decimal(0), Decimal(0), Decimal(10000)),
+    (PROFILE_ONLY, None, Decimal(500), Decimal(10000)),
+    (ACTUAL_ONLY, Decimal(800), Decimal(500), Decimal(500)),
+])
+def test_monthly_income_follows_the_source(income_source, profile_income, actual_income, expected):
+    policy = compile_policy(RATIOS, 5.0, income_source, 10000.0)
+    assert policy.monthly_income(profile_income, actual_income) == expected
+
+
+def test_missing_fallback_income_is_zero():
+    assert compile_policy(RATIOS, 5.0, PROFILE_ONLY, None).monthly_income(None, Decimal(0)) == 0
+
+
+def test_evaluate_splits_income_and_flags_drift():
+    policy = compile_policy(RATIOS, 5.0, PROFILE_ONLY, None)
+    income, analysis = policy.evaluate(
+        {"needs": Decimal(500), "wants": Decimal(400), "savings": Decimal(100)}, Decimal(1000), Decimal(0)
+    )
+    assert income == 1000
+    rows = {row["category_type"]: row for row in analysis}
+    assert rows["needs"]["budgeted_amount"] == 500.0
+    assert rows["needs"]["status"] == "within_tolerance"
+    assert rows["wants"]["status"] == "overshoot"
+    assert rows["savings"]["status"] == "undershoot"
+    assert rows["savings"]["deviation_percentage"] == -50.0
+    assert rows["wants"]["recommended_percentage"] == 30.0
+
+
+def test_zero_income_has_no_deviation():
+    _, analysis = compile_policy(RATIOS, 5.0, PROFILE_ONLY, None).evaluate({"needs": Decimal(10)}, None, Decimal(0))
+    assert all(row["deviation_percentage"] == 0.0 for row in analysis)
@@ -0,0 +1,83 @@
+"""Response compression middleware."""
+import sys
+import gzip
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import compression  # noqa: E402
+from compression import CompressionMiddleware, accepted_encodings  # noqa: E402
+
+BODY = b'{"rows": [' + b'{"amount": 12.5},' * 200 + b"]}"
+
+
+def app_sending(*bodies, content_type=b"application/json", headers=()):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", content_type), *headers]})
+        for index, body in enumerate(bodies):
+            await send({"type": "http.response.body", "body": body, "more_body": index < len(bodies) - 1})
+    return app
+
+
+def call(middleware, accept_encoding="gzip"):
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, None, send))
+    return dict(messages[0]["headers"]), b"".join(message.get("body", b"") for message in messages[1:])
+
+
+@pytest.fixture
+def gzip_only(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+
+
+def test_accepted_encodings_drop_refused_codings():
+    scope = {"headers": [(b"accept-encoding", b"GZIP;q=0.8, br;q=0, deflate")]}
+    assert accepted_encodings(scope) == {"gzip", "deflate"}
+    assert accepted_encodings({"headers": []}) == set()
+
+
+def test_large_responses_are_gzipped(gzip_only):
+    middleware = CompressionMiddleware(app_sending(BODY))
+    headers, body = call(middleware)
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"content-length"] == str(len(body)).encode()
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert gzip.decompress(body) == BODY
+    assert middleware.stats()["compressed"]["gzip"] == 1
+    assert middleware.stats()["bytes_in"] == len(BODY)
+
+
+def test_existing_vary_is_extended(gzip_only):
+    headers, _ = call(CompressionMiddleware(app_sending(BODY, headers=[(b"vary", b"Origin")])))
+    assert headers[b"vary"] == b"Origin, Accept-Encoding"
+
+
+def test_brotli_is_preferred_when_available():
+    if compression.brotli is None:
+        pytest.skip("brotli not installed")
+    headers, body = call(CompressionMiddleware(app_sending(BODY)), "gzip, br")
+    assert headers[b"content-encoding"] == b"br"
+    assert compression.brotli.decompress(body) == BODY
+
+
+@pytest.mark.parametrize("app, accept_encoding", [
+    (app_sending(b"small"), "gzip"),
+    (app_sending(BODY), "identity"),
+    (app_sending(BODY[:2000], BODY[2000:]), "gzip"),
+    (app_sending(BODY, content_type=b"text/event-stream"), "gzip"),
+    (app_sending(BODY, headers=[(b"content-encoding", b"gzip")]), "gzip"),
+], ids=["small", "not-accepted", "streaming", "event-stream", "already-encoded"])
+def test_passes_through(gzip_only, app, accept_encoding):
+    middleware = CompressionMiddleware(app)
+    headers, body = call(middleware, accept_encoding)
+    assert body == BODY or body == b"small"
+    assert headers.get(b"content-encoding") in (None, b"gzip") and middleware.stats()["compressed"]["gzip"] == 0
@@ -0,0 +1,63 @@
+"""In-process fan-out of live ledger events."""
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from events import EventBroker, format_sse  # noqa: E402
+
+
+def test_format_sse():
+    assert format_sse("transaction", {"id": "t1", "amount": 5}) == (
+        'event: transaction\ndata: {"id": "t1", "amount": 5}\n\n'
+    )
+
+
+def test_format_sse_serializes_anything():
+    payload = format_sse("ping", {"at": object})
+    assert json.loads(payload.split("data: ", 1)[1])["at"] == str(object)
+
+
+def test_publish_reaches_only_the_profile_subscribers():
+    async def run():
+        broker = EventBroker()
+        first, second, other = broker.subscribe("p1"), broker.subscribe("p1"), broker.subscribe("p2")
+        broker.publish("p1", {"type": "created"})
+        return first.get_nowait(), second.get_nowait(), other.empty(), broker.subscriber_count()
+
+    first, second, other_empty, count = asyncio.run(run())
+    assert first == second == {"type": "created"}
+    assert other_empty
+    assert count == 3
+
+
+def test_unsubscribe_forgets_empty_channels():
+    async def run():
+        broker = EventBroker()
+        queue = broker.subscribe("p1")
+        assert broker.has_subscribers("p1")
+        broker.unsubscribe("p1", queue)
+        broker.unsubscribe("p1", queue)
+        broker.publish("p1", {"type": "created"})
+        return broker.has_subscribers("p1"), broker.subscriber_count()
+
+    assert asyncio.run(run()) == (False, 0)
+
+
+def test_stalled_subscriber_is_told_to_resync():
+    async def run():
+        broker = EventBroker(queue_size=2)
+        stalled, fresh = broker.subscribe("p1"), broker.subscribe("p1")
+        broker.publish("p1", {"type": "created", "n": 1})
+        broker.publish("p1", {"type": "created", "n": 2})
+        fresh.get_nowait()
+        fresh.get_nowait()
+        broker.publish("p1", {"type": "created", "n": 3})
+        return [stalled.get_nowait() for _ in range(stalled.qsize())], fresh.get_nowait(), broker.dropped
+
+    stalled, fresh, dropped = asyncio.run(run())
+    assert stalled == [{"type": "resync"}]
+    assert fresh == {"type": "created", "n": 3}
+    assert dropped == 1
@@ -0,0 +1,57 @@
+"""Exchange rate lookups and conversions of the rate table."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fx import MissingRateError, RateTable  # noqa: E402
+
+RATES = """# date,currency,rate
+date,currency,rate
+2024-01-01,INR,80
+2024-02-01,INR,82
+2024-01-01,EUR,0.5
+2024-01-01,JPY,150
+"""
+
+
+@pytest.fixture
+def table(tmp_path):
+    path = tmp_path / "rates.csv"
+    path.write_text(RATES)
+    return RateTable.from_csv(path, base="usd")
+
+
+def test_supports(table):
+    assert table.supports("USD")
+    assert table.supports("inr")
+    assert not table.supports("GBP")
+
+
+def test_rates_use_the_latest_rate_on_or_before_the_day(table):
+    dates = np.array(["2023-06-01", "2024-01-01", "2024-01-31", "2024-02-01", "2025-01-01"], dtype="datetime64[D]")
+    assert table.rates_at("INR", dates).tolist() == [80, 80, 80, 82, 82]
+    assert table.rates_at("USD", dates).tolist() == [1, 1, 1, 1, 1]
+
+
+def test_missing_rate(table):
+    with pytest.raises(MissingRateError):
+        table.rates_at("GBP", np.array(["2024-01-01"], dtype="datetime64[D]"))
+
+
+def test_convert_minor_units(table):
+    converted = table.convert_minor_units(
+        [8000, 8200, 100, 150, 1000],
+        ["INR", "INR", "USD", "JPY", "EUR"],
+        ["2024-01-15", "2024-02-15", "2024-01-15", "2024-01-15", "2024-01-15"],
+        "USD"
+    )
+    # 80.00 INR and 82.00 INR are one dollar each at their dates; 150 JPY has no minor unit
+    assert converted.tolist() == [100, 100, 100, 100, 2000]
+
+
+def test_convert_into_zero_exponent_currency(table):
+    assert table.convert_minor_units([100], ["USD"], ["2024-01-01"], "JPY").tolist() == [150]
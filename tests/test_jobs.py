@@ -0,0 +1,12 @@
+"""Retry backoff of background jobs."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from jobs import BACKOFF_MAX_SECONDS, backoff_seconds  # noqa: E402
+
+
+def test_backoff_doubles_up_to_the_cap():
+    assert [backoff_seconds(attempts) for attempts in (1, 2, 3)] == [5, 10, 20]
+    assert backoff_seconds(50) == BACKOFF_MAX_SECONDS
@@ -0,0 +1,49 @@
+"""Minor-unit conversions of money amounts."""
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from money import (  # noqa: E402
+    currency_exponent, from_minor_units, minor_to_decimal, normalize_currency, to_minor_units
+)
+
+
+def test_normalize_currency():
+    assert normalize_currency(" usd ") == "USD"
+    assert normalize_currency(None) == "INR"
+    assert normalize_currency("") == "INR"
+
+
+@pytest.mark.parametrize("currency, exponent", [("INR", 2), ("usd", 2), ("JPY", 0), ("KWD", 3), ("XYZ", 2), (None, 2)])
+def test_currency_exponent(currency, exponent):
+    assert currency_exponent(currency) == exponent
+
+
+@pytest.mark.parametrize("amount, currency, minor", [
+    (100.1, "INR", 10010),
+    ("19.99", "USD", 1999),
+    (Decimal("0.005"), "INR", 1),
+    (0.004, "INR", 0),
+    (-2.345, "INR", -235),
+    (1234.5, "JPY", 1235),
+    (1.2345, "KWD", 1235),
+    (0, "INR", 0),
+])
+def test_to_minor_units_rounds_half_up(amount, currency, minor):
+    assert to_minor_units(amount, currency) == minor
+
+
+def test_round_trip():
+    for amount in (0.01, 0.1, 0.3, 100.1, 999999.99, 12345678.9):
+        assert from_minor_units(to_minor_units(amount, "INR"), "INR") == amount
+
+
+def test_from_minor_units():
+    assert from_minor_units(None, "INR") is None
+    assert from_minor_units(1999, "USD") == 19.99
+    assert from_minor_units(1999, "JPY") == 1999.0
+    assert minor_to_decimal(1235, "KWD") == Decimal("1.235")
@@ -0,0 +1,61 @@
+"""Filter shapes, returned counts and explain summaries of the slow-query log."""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from querylog import explain_summary, filter_shape, returned_count, shape  # noqa: E402
+
+
+def test_shape_hides_values_but_keeps_operators():
+    assert shape({"profile_id": "p1", "date": {"$gte": "2024-01", "$lt": "2024-02"}, "id": {"$in": ["a", "b"]}}) == {
+        "profile_id": 1, "date": {"$gte": 1, "$lt": 1}, "id": {"$in": 1}
+    }
+    assert shape({"$or": [{"a": 1}, {"b": "x"}]}) == {"$or": [{"a": 1}, {"b": 1}]}
+
+
+@pytest.mark.parametrize("command_name, command, expected", [
+    ("find", {"find": "transactions", "filter": {"profile_id": "p1"}}, {"profile_id": 1}),
+    ("find", {"find": "transactions"}, {}),
+    ("count", {"count": "transactions", "query": {"seq": {"$gt": 5}}}, {"seq": {"$gt": 1}}),
+    ("findAndModify", {"query": {"id": "t1"}, "update": {"$set": {"a": 2}}}, {"id": 1}),
+    ("update", {"updates": [{"q": {"id": "t1"}, "u": {}}, {"q": {"other": 1}}]}, {"id": 1}),
+    ("delete", {"deletes": []}, None),
+    ("insert", {"documents": [{"id": "t1"}]}, None),
+])
+def test_filter_shape(command_name, command, expected):
+    assert filter_shape(command_name, command) == expected
+
+
+def test_filter_shape_of_an_aggregate():
+    pipeline = [{"$match": {"profile_id": "p1", "date": {"$gte": "2024"}}}, {"$group": {"_id": "$date"}}, {"$sort": {"_id": 1}}]
+    assert filter_shape("aggregate", {"pipeline": pipeline}) == {
+        "match": {"profile_id": 1, "date": {"$gte": 1}}, "stages": ["$match", "$group", "$sort"]
+    }
+    assert filter_shape("aggregate", {"pipeline": [{"$group": {"_id": None}}]}) == {"match": None, "stages": ["$group"]}
+
+
+@pytest.mark.parametrize("command_name, reply, count", [
+    ("find", {"cursor": {"firstBatch": [{}, {}]}}, 2),
+    ("getMore", {"cursor": {"nextBatch": [{}]}}, 1),
+    ("update", {"n": 3}, 3),
+    ("distinct", {"values": ["a", "b"]}, 2),
+    ("findAndModify", {"value": None}, 0),
+    ("ping", {"ok": 1}, None),
+])
+def test_returned_count(command_name, reply, count):
+    assert returned_count(command_name, reply) == count
+
+
+def test_explain_summary_flags_collection_scans():
+    explain = {
+        "queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "profile_id_1_date_1"}}},
+        "executionStats": {"totalDocsExamined": 10, "totalKeysExamined": 12, "nReturned": 10},
+    }
+    assert explain_summary(explain) == {
+        "docs_examined": 10, "keys_examined": 12, "returned": 10, "plan": ["FETCH", "IXSCAN profile_id_1_date_1"]
+    }
+    nested = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}}]}
+    assert explain_summary(nested)["plan"] == ["COLLSCAN"]
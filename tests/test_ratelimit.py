@@ -0,0 +1,82 @@
+"""Token buckets and client identification of the credential throttle."""
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from ratelimit import (  # noqa: E402
+    EMAIL, IP, MemoryBucketStore, RateLimiter, Rule, client_ip, submitted_email
+)
+
+
+def take(store, key, rule, now):
+    return asyncio.run(store.take(key, rule, now))
+
+
+def test_bucket_allows_a_burst_then_refills():
+    store = MemoryBucketStore()
+    rule = Rule(IP, capacity=3, per_minute=60)
+    assert [take(store, "k", rule, 0)[0] for _ in range(4)] == [True, True, True, False]
+    # One token per second
+    assert take(store, "k", rule, 0.5)[0] is False
+    assert take(store, "k", rule, 1.6)[0] is True
+    assert take(store, "k", rule, 1.6)[0] is False
+    # Refill never exceeds the capacity
+    assert take(store, "k", rule, 1000) == (True, 2)
+
+
+def test_memory_store_drops_least_recently_used_buckets():
+    store = MemoryBucketStore(maxsize=2)
+    rule = Rule(IP, capacity=1, per_minute=1)
+    take(store, "a", rule, 0)
+    take(store, "b", rule, 0)
+    take(store, "c", rule, 0)
+    assert len(store) == 2
+    assert take(store, "a", rule, 0)[0] is True
+
+
+def test_unknown_scope():
+    with pytest.raises(ValueError):
+        Rule("user", 1, 1)
+
+
+def test_limiter_returns_retry_after_and_skips_missing_identities():
+    limiter = RateLimiter(MemoryBucketStore(), {"/api/login": [Rule(IP, 5, 60), Rule(EMAIL, 1, 6)]})
+    identities = {IP: "10.0.0.1", EMAIL: "a@example.com"}
+    assert asyncio.run(limiter.check("/api/login", identities)) is None
+    retry_after = asyncio.run(limiter.check("/api/login", identities))
+    assert retry_after == pytest.approx(10, abs=0.1)
+    assert asyncio.run(limiter.check("/api/login", {IP: "10.0.0.1", EMAIL: None})) is None
+    assert asyncio.run(limiter.check("/api/other", identities)) is None
+    assert limiter.stats()["rejected"] == {"/api/login email": 1}
+
+
+def scope(forwarded=None, peer="10.0.0.9"):
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded or ()]
+    return {"headers": headers, "client": (peer, 1234)}
+
+
+def test_client_ip_ignores_forwarded_for_without_trusted_proxies():
+    assert client_ip(scope(["1.1.1.1"])) == "10.0.0.9"
+    assert client_ip({"headers": []}) is None
+
+
+def test_client_ip_skips_trusted_hops_from_the_right():
+    # The client wrote 6.6.6.6 itself; the ingress appended the address it saw
+    assert client_ip(scope(["6.6.6.6, 1.2.3.4"]), trusted_proxies=1) == "1.2.3.4"
+    assert client_ip(scope(["6.6.6.6, 1.2.3.4, 10.1.0.1"]), trusted_proxies=2) == "1.2.3.4"
+    # Repeated headers are one list
+    assert client_ip(scope(["6.6.6.6", "1.2.3.4"]), trusted_proxies=1) == "1.2.3.4"
+    assert client_ip(scope(["1.2.3.4"]), trusted_proxies=3) == "1.2.3.4"
+    assert client_ip(scope(), trusted_proxies=1) == "10.0.0.9"
+
+
+def test_submitted_email():
+    assert submitted_email(b'{"email": " A@Example.com "}') == "a@example.com"
+    assert submitted_email(b'{"email": 5}') is None
+    assert submitted_email(b"[1, 2]") is None
+    assert submitted_email(b"not json") is None
+    assert submitted_email(b"") is None
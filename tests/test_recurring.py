@@ -0,0 +1,63 @@
+"""Date math of recurring transaction rules."""
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from recurring import (  # noqa: E402
+    DAILY, MONTHLY, RETRY_MAX_SECONDS, WEEKLY, YEARLY,
+    add_months, due_occurrences, next_run_date, occurrence_date, occurrence_id, retry_delay
+)
+
+
+def rule(frequency, start_date, interval=1, **fields):
+    return {"frequency": frequency, "start_date": start_date, "interval": interval, **fields}
+
+
+def test_add_months_clamps_to_the_month_length():
+    assert add_months(date(2024, 1, 31), 1) == date(2024, 2, 29)
+    assert add_months(date(2023, 1, 31), 1) == date(2023, 2, 28)
+    assert add_months(date(2024, 11, 15), 3) == date(2025, 2, 15)
+    assert add_months(date(2024, 3, 31), -1) == date(2024, 2, 29)
+    assert add_months(date(2024, 2, 29), 1, day_of_month=31) == date(2024, 3, 31)
+
+
+def test_occurrence_dates():
+    assert occurrence_date(rule(DAILY, "2024-01-30", interval=2), 2) == date(2024, 2, 3)
+    assert occurrence_date(rule(WEEKLY, "2024-01-01"), 3) == date(2024, 1, 22)
+    # Monthly on the 31st stays on the last day in short months and returns to the 31st
+    monthly = rule(MONTHLY, "2024-01-31", day_of_month=31)
+    assert [occurrence_date(monthly, index) for index in range(4)] == [
+        date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)
+    ]
+    assert occurrence_date(rule(YEARLY, "2024-02-29"), 1) == date(2025, 2, 28)
+    with pytest.raises(ValueError):
+        occurrence_date(rule("hourly", "2024-01-01"), 1)
+
+
+def test_due_occurrences_stop_at_today_end_date_and_limit():
+    daily = rule(DAILY, "2024-01-01")
+    assert [index for index, _ in due_occurrences(daily, 0, date(2024, 1, 3))] == [0, 1, 2]
+    assert due_occurrences(daily, 3, date(2024, 1, 3)) == []
+    assert len(due_occurrences(rule(DAILY, "2024-01-01", end_date="2024-01-02"), 0, date(2024, 2, 1))) == 2
+    assert len(due_occurrences(daily, 0, date(2025, 1, 1), limit=10)) == 10
+
+
+def test_next_run_date():
+    assert next_run_date(rule(MONTHLY, "2024-01-15"), 2) == "2024-03-15"
+    assert next_run_date(rule(MONTHLY, "2024-01-15", end_date="2024-02-20"), 2) is None
+
+
+def test_occurrence_ids_are_deterministic():
+    assert occurrence_id("template", "2024-01-01") == occurrence_id("template", "2024-01-01")
+    assert occurrence_id("template", "2024-01-01") != occurrence_id("template", "2024-01-02")
+    assert occurrence_id("template", "2024-01-01") != occurrence_id("other", "2024-01-01")
+
+
+def test_retry_delay_grows_and_is_capped():
+    delays = [retry_delay(failures) for failures in range(1, 6)]
+    assert delays == sorted(delays) and delays[0] < delays[-1]
+    assert retry_delay(100) == RETRY_MAX_SECONDS
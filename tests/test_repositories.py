@@ -0,0 +1,245 @@
+"""Contract tests every repository backend must pass.
+
+The Mongo backend runs against a scratch database when TEST_MONGO_URL is
+set and is skipped otherwise.
+"""
+import os
+import sys
+import uuid
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from repositories import (  # noqa: E402
+    DuplicateIdError, MemoryRepositories, MongoRepositories, SqliteRepositories
+)
+
+
+async def open_memory(tmp_path):
+    return MemoryRepositories(), None
+
+
+async def open_sqlite(tmp_path):
+    return SqliteRepositories(str(tmp_path / "ledger.db")), None
+
+
+async def open_mongo(tmp_path):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["TEST_MONGO_URL"])
+    db = client[f"repository_contract_{uuid.uuid4().hex[:8]}"]
+    for name in ("users", "profiles", "categories", "transactions"):
+        await db[name].create_index("id", unique=True)
+
+    async def cleanup():
+        await client.drop_database(db.name)
+        client.close()
+    return MongoRepositories(db), cleanup
+
+
+BACKENDS = {
+    "memory": open_memory,
+    "sqlite": open_sqlite,
+    "mongo": pytest.param(
+        open_mongo, marks=pytest.mark.skipif("TEST_MONGO_URL" not in os.environ, reason="TEST_MONGO_URL not set")
+    ),
+}
+
+
+@pytest.fixture(params=list(BACKENDS.values()), ids=list(BACKENDS))
+def run(request, tmp_path):
+    """Runs ``scenario(repositories)`` on a fresh store of the backend"""
+    opener = request.param
+
+    def run_scenario(scenario):
+        async def main():
+            repositories, cleanup = await opener(tmp_path)
+            try:
+                await scenario(repositories)
+            finally:
+                await repositories.close()
+                if cleanup:
+                    await cleanup()
+        asyncio.run(main())
+    return run_scenario
+
+
+def user(email="a@example.com", **fields):
+    return {"id": str(uuid.uuid4()), "email": email, "first_name": "A", "last_name": "B", **fields}
+
+
+def transaction(profile_id, date, amount_minor, **fields):
+    return {
+        "id": str(uuid.uuid4()),
+        "profile_id": profile_id,
+        "user_id": "u1",
+        "date": date,
+        "amount_minor": amount_minor,
+        "currency": "INR",
+        "transaction_type": "expense",
+        "category_id": "c1",
+        **fields,
+    }
+
+
+def test_users(run):
+    async def scenario(repositories):
+        alice, bob = user("alice@example.com"), user("bob@example.com")
+        await repositories.users.create(alice)
+        await repositories.users.create(bob)
+
+        assert await repositories.users.get(alice["id"]) == alice
+        assert await repositories.users.get("missing") is None
+        assert await repositories.users.get_by_email("bob@example.com") == bob
+        assert await repositories.users.get_by_email("nobody@example.com") is None
+        found = await repositories.users.get_many([alice["id"], bob["id"], "missing"])
+        assert sorted(found, key=lambda document: document["email"]) == [alice, bob]
+        assert await repositories.users.get_many([]) == []
+
+        updated = await repositories.users.update(alice["id"], {"email": "alice@new.example.com", "must_change_password": False})
+        assert updated == {**alice, "email": "alice@new.example.com", "must_change_password": False}
+        assert await repositories.users.get_by_email("alice@new.example.com") == updated
+        assert await repositories.users.get_by_email("alice@example.com") is None
+        assert await repositories.users.update("missing", {"email": "x"}) is None
+
+        with pytest.raises(DuplicateIdError):
+            await repositories.users.create(alice)
+
+        assert await repositories.users.delete(bob["id"]) is True
+        assert await repositories.users.get(bob["id"]) is None
+        assert await repositories.users.get_by_email("bob@example.com") is None
+        assert await repositories.users.delete(bob["id"]) is False
+    run(scenario)
+
+
+def test_returned_documents_are_copies(run):
+    async def scenario(repositories):
+        alice = user(family={"relation": "spouse"})
+        await repositories.users.create(alice)
+        alice["first_name"] = "Changed"
+        stored = await repositories.users.get(alice["id"])
+        stored["family"]["relation"] = "changed"
+        assert (await repositories.users.get(alice["id"]))["first_name"] == "A"
+        assert (await repositories.users.get(alice["id"]))["family"] == {"relation": "spouse"}
+    run(scenario)
+
+
+def test_profiles(run):
+    async def scenario(repositories):
+        profile = {"id": "p1", "user_id": "u1", "currency": "INR", "family_members": [], "ledger_version": 0}
+        await repositories.profiles.create(profile)
+
+        assert await repositories.profiles.get("p1") == profile
+        assert await repositories.profiles.get_by_user("u1") == profile
+        assert await repositories.profiles.get_by_user("u2") is None
+
+        updated = await repositories.profiles.update("p1", {"family_members": [{"email": "b@example.com"}]})
+        assert updated["family_members"] == [{"email": "b@example.com"}]
+        assert updated["currency"] == "INR"
+
+        await repositories.profiles.increment("p1", "ledger_version")
+        await repositories.profiles.increment("p1", "ledger_version", 2)
+        await repositories.profiles.increment("p1", "archive_runs")
+        stored = await repositories.profiles.get("p1")
+        assert stored["ledger_version"] == 3
+        assert stored["archive_runs"] == 1
+
+        with pytest.raises(DuplicateIdError):
+            await repositories.profiles.create(profile)
+    run(scenario)
+
+
+def test_categories(run):
+    async def scenario(repositories):
+        assert await repositories.categories.count() == 0
+        defaults = [
+            {"id": f"c{index}", "name": f"Category {index}", "type": "needs", "is_custom": False, "profile_id": None}
+            for index in range(3)
+        ]
+        for category in defaults:
+            await repositories.categories.create(category)
+        own = {"id": "own", "name": "Pets", "type": "wants", "is_custom": True, "profile_id": "p1"}
+        other = {"id": "other", "name": "Boat", "type": "wants", "is_custom": True, "profile_id": "p2"}
+        # Custom categories from before they had an owner belong to nobody's catalogue
+        orphan = {"id": "orphan", "name": "Old", "type": "wants", "is_custom": True}
+        for category in (own, other, orphan):
+            await repositories.categories.create(category)
+
+        assert await repositories.categories.count() == 6
+        assert await repositories.categories.list() == defaults
+        assert await repositories.categories.list("p1") == [*defaults, own]
+        assert await repositories.categories.list("p3") == defaults
+        assert await repositories.categories.get("c1") == defaults[1]
+        assert await repositories.categories.get("missing") is None
+        with pytest.raises(DuplicateIdError):
+            await repositories.categories.create(own)
+    run(scenario)
+
+
+def test_transaction_writes(run):
+    async def scenario(repositories):
+        first = transaction("p1", "2024-05-03", 1500)
+        await repositories.transactions.create(first)
+        assert await repositories.transactions.get(first["id"]) == first
+        assert await repositories.transactions.get(first["id"], profile_id="p1") == first
+        assert await repositories.transactions.get(first["id"], profile_id="p2") is None
+        with pytest.raises(DuplicateIdError):
+            await repositories.transactions.create(first)
+
+        assert await repositories.transactions.update(first["id"], {"amount_minor": 9}, profile_id="p2") is None
+        updated = await repositories.transactions.update(first["id"], {"amount_minor": 2500, "date": "2024-06-01"})
+        assert updated == {**first, "amount_minor": 2500, "date": "2024-06-01"}
+        assert await repositories.transactions.list("p1", "2024-06", "2024-07") == [updated]
+        assert await repositories.transactions.list("p1", "2024-05", "2024-06") == []
+
+        assert await repositories.transactions.delete(first["id"], profile_id="p2") is None
+        assert await repositories.transactions.delete(first["id"], profile_id="p1") == updated
+        assert await repositories.transactions.get(first["id"]) is None
+        assert await repositories.transactions.delete(first["id"]) is None
+    run(scenario)
+
+
+def test_transaction_create_many_skips_existing_ids(run):
+    async def scenario(repositories):
+        existing = transaction("p1", "2024-05-01", 100)
+        await repositories.transactions.create(existing)
+        new = [transaction("p1", "2024-05-02", 200), transaction("p1", "2024-05-03", 300)]
+
+        inserted = await repositories.transactions.create_many([existing, *new])
+        assert sorted(document["id"] for document in inserted) == sorted(document["id"] for document in new)
+        assert len(await repositories.transactions.list("p1")) == 3
+        assert await repositories.transactions.create_many(new) == []
+    run(scenario)
+
+
+def test_transaction_range_reads(run):
+    async def scenario(repositories):
+        rows = [
+            transaction("p1", "2024-04-30", 100),
+            transaction("p1", "2024-05-01", 200, transaction_type="income"),
+            transaction("p1", "2024-05-15", 300, category_id="c2"),
+            transaction("p1", "2024-05-31", 400),
+            transaction("p1", "2024-06-01", 500),
+            transaction("p2", "2024-05-10", 600),
+        ]
+        await repositories.transactions.create_many(rows)
+
+        may = await repositories.transactions.list("p1", "2024-05", "2024-06")
+        assert [row["amount_minor"] for row in may] == [400, 300, 200]
+        assert len(await repositories.transactions.list("p1")) == 5
+        assert [row["amount_minor"] for row in await repositories.transactions.list("p1", start="2024-05-31")] == [500, 400]
+        assert [row["amount_minor"] for row in await repositories.transactions.list("p1", end="2024-05")] == [100]
+
+        assert await repositories.transactions.totals("p1", "2024-05", "2024-06", ["transaction_type", "category_id"]) == {
+            ("income", "c1"): 200,
+            ("expense", "c2"): 300,
+            ("expense", "c1"): 400,
+        }
+        assert await repositories.transactions.totals("p1", None, None, []) == {(): 1500}
+        assert await repositories.transactions.totals("p3", None, None, ["category_id"]) == {}
+        with pytest.raises(ValueError):
+            await repositories.transactions.totals("p1", None, None, ["amount_minor'); --"])
+    run(scenario)
@@ -0,0 +1,41 @@
+"""Prefix tokens, query terms and ranking of transaction search."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from search import MAX_PREFIX_LENGTH, build_search_tokens, query_terms, score  # noqa: E402
+
+
+def test_tokens_are_every_prefix_of_every_searchable_word():
+    tokens = build_search_tokens({"description": "Amazon refund", "amount": 12.5}, "Shopping")
+    assert tokens == sorted(set(tokens))
+    for word in ("amazon", "refund", "shopping"):
+        assert all(word[:length] in tokens for length in range(1, len(word) + 1))
+    assert "12" not in tokens
+
+
+def test_tokens_are_clipped_to_the_longest_prefix():
+    tokens = build_search_tokens({"person_name": "Supercalifragilistic"}, None)
+    assert max(map(len, tokens)) == MAX_PREFIX_LENGTH
+
+
+def test_tokens_ignore_case_and_punctuation():
+    assert build_search_tokens({"bank_app": "G-Pay"}, None) == ["g", "p", "pa", "pay"]
+
+
+def test_query_terms_dedupe_and_clip():
+    assert query_terms("Amaz  amaz, REF") == ["amaz", "ref"]
+    assert query_terms("x" * 40) == ["x" * MAX_PREFIX_LENGTH]
+    assert query_terms("  ") == []
+
+
+def test_exact_name_matches_outrank_description_prefixes():
+    person = {"person_name": "Ravi", "description": "dinner"}
+    described = {"person_name": "Asha", "description": "ravioli"}
+    assert score(person, None, ["ravi"]) > score(described, None, ["ravi"])
+
+
+def test_score_adds_up_every_term():
+    transaction = {"description": "amazon refund"}
+    assert score(transaction, "Shopping", ["amazon", "refund"]) > score(transaction, "Shopping", ["amazon"])
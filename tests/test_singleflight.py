@@ -0,0 +1,102 @@
+"""Coalescing of concurrent identical reads."""
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from singleflight import SingleFlight  # noqa: E402
+
+
+def test_concurrent_calls_share_one_computation():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return calls
+
+        waiters = [asyncio.create_task(flights.do(("route", 1), compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        assert await asyncio.gather(*waiters) == [1] * 5
+        assert flights.stats()["started"] == {"route": 1}
+        assert flights.stats()["coalesced"] == {"route": 4}
+        assert flights.stats()["in_flight"] == 0
+
+        # Nothing is kept once the call finished
+        assert await flights.do(("route", 1), compute) == 2
+    asyncio.run(scenario())
+
+
+def test_different_keys_do_not_share():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def compute(value):
+            await asyncio.sleep(0)
+            return value
+
+        results = await asyncio.gather(
+            flights.do(("route", 1), lambda: compute("a")), flights.do(("route", 2), lambda: compute("b"))
+        )
+        assert results == ["a", "b"]
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_waiter_and_are_not_kept():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(
+            flights.do(("route",), fail), flights.do(("route",), fail), return_exceptions=True
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flights.stats()["in_flight"] == 0
+    asyncio.run(scenario())
+
+
+def test_timeout_forgets_the_call_without_cancelling_it():
+    async def scenario():
+        flights = SingleFlight(timeout=0.01)
+        finished = asyncio.Event()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            finished.set()
+            return "late"
+
+        with pytest.raises(asyncio.TimeoutError):
+            await flights.do(("route",), slow)
+        assert flights.stats()["timeouts"] == {"route": 1}
+        assert flights.stats()["in_flight"] == 0
+        await asyncio.wait_for(finished.wait(), 1)
+    asyncio.run(scenario())
+
+
+def test_a_waiter_going_away_does_not_cancel_the_others():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flights.do(("route",), compute))
+        second = asyncio.create_task(flights.do(("route",), compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        assert await second == "done"
+    asyncio.run(scenario())
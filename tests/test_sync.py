@@ -0,0 +1,38 @@
+"""Sync cursors and first-sync page tokens."""
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from sync import SyncLog, page_token, parse_page_token, release_update  # noqa: E402
+
+
+def test_page_tokens_round_trip():
+    token = page_token(42, {"date": "2024-01-31T10:00:00", "id": "abc"})
+    assert parse_page_token(token) == (42, ("2024-01-31T10:00:00", "abc"))
+
+
+@pytest.mark.parametrize("token", ["", "42", "x:2024-01-01:abc", "42::abc", "42:2024-01-01:"])
+def test_malformed_page_tokens(token):
+    with pytest.raises(ValueError):
+        parse_page_token(token)
+
+
+def test_settled_seq_stops_before_the_oldest_live_pending_write():
+    log = SyncLog(db=None, store=None, settle_seconds=60)
+    now = datetime.now(timezone.utc)
+    assert log.settled_seq({"sync_seq": 10}) == 10
+    assert log.settled_seq({}) == 0
+    assert log.settled_seq({"sync_seq": 10, "sync_pending": [{"seq": 7, "at": now}, {"seq": 9, "at": now}]}) == 6
+    # A writer that died long ago is disregarded; naive datetimes from Mongo are UTC
+    stale = (now - timedelta(minutes=5)).replace(tzinfo=None)
+    assert log.settled_seq({"sync_seq": 10, "sync_pending": [{"seq": 7, "at": stale}]}) == 10
+
+
+def test_release_update():
+    assert release_update(None) == {}
+    assert release_update(5) == {"$pull": {"sync_pending": {"seq": 5}}}
+
@@ -0,0 +1,63 @@
+"""Date bounds and query translation of the transaction stores."""
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from transaction_storage import (  # noqa: E402
+    DocumentStore, TimeSeriesStore, get_store, parse_bound
+)
+
+
+def utc(*parts):
+    return datetime(*parts, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("value, parsed", [
+    ("2024", utc(2024, 1, 1)),
+    ("2024-03", utc(2024, 3, 1)),
+    ("2024-03-15", utc(2024, 3, 15)),
+    ("2024-03-15T10:30:00", utc(2024, 3, 15, 10, 30)),
+    ("2024-03-15T10:30:00+05:30", utc(2024, 3, 15, 5, 0)),
+    ("2024-03-15 garbage", utc(2024, 3, 15)),
+])
+def test_parse_bound(value, parsed):
+    assert parse_bound(value) == parsed
+
+
+def test_parse_bound_rejects_non_dates():
+    with pytest.raises(ValueError):
+        parse_bound("someday")
+
+
+def test_document_store_leaves_queries_alone():
+    query = {"profile_id": "p1", "date": {"$gte": "2024-01", "$lt": "2024-02"}}
+    assert DocumentStore().translate(query) is query
+    assert DocumentStore().prepare({"date": "2024-01-01"}) == {"date": "2024-01-01"}
+
+
+def test_timeseries_store_translates_date_ranges_to_ts():
+    query = {"profile_id": "p1", "date": {"$gte": "2024", "$lt": "2024-02-15"}}
+    assert TimeSeriesStore().translate(query) == {
+        "profile_id": "p1", "ts": {"$gte": utc(2024, 1, 1), "$lt": utc(2024, 2, 15)}
+    }
+    assert query["date"] == {"$gte": "2024", "$lt": "2024-02-15"}
+
+
+def test_timeseries_store_keeps_exact_dates():
+    query = {"profile_id": "p1", "date": "2024-01-01"}
+    assert TimeSeriesStore().translate(query) is query
+
+
+def test_timeseries_store_derives_ts():
+    assert TimeSeriesStore().prepare({"date": "2024-01-02"})["ts"] == utc(2024, 1, 2)
+    assert "ts" not in TimeSeriesStore().prepare({"amount_minor": 5})
+
+
+def test_get_store():
+    assert isinstance(get_store("timeseries"), TimeSeriesStore)
+    with pytest.raises(ValueError):
+        get_store("parquet")